@@ -0,0 +1,376 @@
+import argparse
+import json
+import os
+import platform
+import sys
+from hashlib import blake2b
+from random import Random
+from statistics import median
+from time import perf_counter_ns
+from typing import Callable, Dict, List, Optional, Tuple
+
+# the bots reveal their moves straight away while benchmarked
+os.environ.setdefault("BOREDGAMES_BOT_PACING", "instant")
+
+from checkers import Checkers
+from connect4 import Connect4
+from game import Player
+
+SEED = 2022
+POSITIONS = 500
+REPEAT = 7
+THRESHOLD = 0.10 # slowdown over the baseline, as a fraction, flagged as a regression
+
+def connect4_game(moves: List[int]) -> Connect4:
+    """
+    Replay a connect 4 game from the starting position
+
+    Args:
+        moves: columns played, in order
+
+    Returns:
+        the started game, with a dummy plug for the player to move
+    """
+
+    game = Connect4("benchmark")
+    game.started = True
+    game.used_player_numbers = [1, 2]
+    game.current_player = 1
+
+    for column in moves:
+        game.make_move(game.current_player, column)
+
+    game.dummy_plug = Player(game.current_player, "benchmark", None)
+    return game
+
+def checkers_game(moves: List[Tuple[Tuple[int,int],Tuple[int,int]]]) -> Checkers:
+    """
+    Replay a checkers game from the starting position
+
+    Args:
+        moves: (current position, next position) of the moves played, in order
+
+    Returns:
+        the started game, with a dummy plug for the player to move
+    """
+
+    game = Checkers("benchmark")
+    game.started = True
+    game.used_player_numbers = [1, 2]
+    game.current_player = 1
+
+    for current_position, next_position in moves:
+        game.make_move(game.current_player, current_position, next_position)
+
+    game.dummy_plug = Player(game.current_player, "benchmark", None)
+    return game
+
+def checkers_legal_moves(game: Checkers) -> List[Tuple[Tuple[int,int],Tuple[int,int]]]:
+    """
+    Get the moves the player to move can play, captures being compulsory
+
+    Args:
+        game: the instance of checkers game
+
+    Returns:
+        (current position, next position) of every move
+    """
+
+    moves = game.all_moves["moves_eat"][game.current_player] or game.all_moves["moves"][game.current_player]
+    return [(current_position, move["possible_move"]) for current_position in moves for move in moves[current_position]]
+
+def build_corpus(seed: int, positions: int) -> Dict[str,List[list]]:
+    """
+    Build the positions of the benchmarks by playing random games, the same way for a given seed
+
+    Args:
+        seed: seed of the random games
+        positions: number of positions of every game type
+
+    Returns:
+        dictionary mapping every game type to the moves leading to each of its positions, none of them over
+    """
+
+    rng = Random(seed)
+    corpus = {"connect-4": [], "checkers": []}
+
+    while len(corpus["connect-4"]) < positions:
+        game, moves = connect4_game([]), []
+
+        for _ in range(rng.randrange(0, 36)):
+            column = rng.choice([column for column in range(7) if game.position.can_play(column)])
+            game.make_move(game.current_player, column)
+
+            if game.is_over:
+                break
+
+            moves.append(column)
+
+        corpus["connect-4"].append(moves)
+
+    while len(corpus["checkers"]) < positions:
+        game, moves = checkers_game([]), []
+
+        for _ in range(rng.randrange(0, 60)):
+            move = rng.choice(checkers_legal_moves(game))
+            game.make_move(game.current_player, *move)
+
+            if game.is_over:
+                break
+
+            moves.append(move)
+
+        corpus["checkers"].append(moves)
+
+    return corpus
+
+def fingerprint(corpus: Dict[str,List[list]]) -> str:
+    """
+    Identify a corpus, so that results are only compared when measured on the same positions
+
+    Args:
+        corpus: corpus built by build_corpus
+
+    Returns:
+        hash of the corpus
+    """
+
+    return blake2b(json.dumps(corpus, sort_keys=True).encode(), digest_size=8).hexdigest()
+
+class Benchmark:
+    """
+    Class used to describe a benchmark of a hot path
+
+    Attributes:
+        name: name of the benchmark
+        prepare: function building the inputs of one measure from the corpus, which is not timed
+        run: function running the hot path over the inputs, which is timed, and returning the number of operations
+    """
+
+    def __init__(self, name: str, prepare: Callable[[Dict[str,List[list]]],object], run: Callable[[object],int]) -> None:
+        self.name = name
+        self.prepare = prepare
+        self.run = run
+
+def prepare_connect4(corpus: Dict[str,List[list]]) -> List[Connect4]:
+    return [connect4_game(moves) for moves in corpus["connect-4"]]
+
+def prepare_checkers(corpus: Dict[str,List[list]]) -> List[Checkers]:
+    return [checkers_game(moves) for moves in corpus["checkers"]]
+
+def prepare_connect4_moves(corpus: Dict[str,List[list]]) -> List[Tuple[Connect4,int]]:
+    rng = Random(SEED)
+    return [(game, rng.choice([column for column in range(7) if game.position.can_play(column)])) for game in prepare_connect4(corpus)]
+
+def prepare_checkers_moves(corpus: Dict[str,List[list]]) -> List[Tuple[Checkers,Tuple[int,int],Tuple[int,int]]]:
+    rng = Random(SEED)
+    return [(game, *rng.choice(checkers_legal_moves(game))) for game in prepare_checkers(corpus)]
+
+def prepare_checkers_candidates(corpus: Dict[str,List[list]]) -> List[Tuple[Checkers,Tuple[int,int],Tuple[int,int]]]:
+    # every diagonal step and jump of the pieces of the player to move, legal or not
+    candidates = []
+
+    for game in prepare_checkers(corpus):
+        for x, column in enumerate(game.board):
+            for y, piece in enumerate(column):
+                if piece and piece.owner == game.current_player:
+                    for dx, dy in ((1, 1), (1, -1), (-1, 1), (-1, -1), (2, 2), (2, -2), (-2, 2), (-2, -2)):
+                        if 0 <= x + dx < 8 and 0 <= y + dy < 8:
+                            candidates.append((game, (x, y), (x + dx, y + dy)))
+
+    return candidates
+
+def run_connect4_make_move(moves: List[Tuple[Connect4,int]]) -> int:
+    for game, column in moves:
+        game.make_move(game.current_player, column)
+
+    return len(moves)
+
+def run_count_all_consecutive(games: List[Connect4]) -> int:
+    operations = 0
+
+    for game in games:
+        for x in range(7):
+            for y in range(6):
+                game.count_all_consecutive(1, x, y)
+
+        operations += 42
+
+    return operations
+
+def run_board_is_full(games: List[Connect4]) -> int:
+    for game in games:
+        game.board_is_full()
+
+    return len(games)
+
+def run_calculate_all_moves(games: List[Checkers]) -> int:
+    for game in games:
+        game.calculate_all_moves()
+
+    return len(games)
+
+def run_is_valid_move(candidates: List[Tuple[Checkers,Tuple[int,int],Tuple[int,int]]]) -> int:
+    for game, current_position, next_position in candidates:
+        game.is_valid_move(current_position, next_position)
+
+    return len(candidates)
+
+def run_checkers_make_move(moves: List[Tuple[Checkers,Tuple[int,int],Tuple[int,int]]]) -> int:
+    for game, current_position, next_position in moves:
+        game.make_move(game.current_player, current_position, next_position)
+
+    return len(moves)
+
+def run_predict_connect4(games: List[Connect4]) -> int:
+    from main import predict_next_connect4_move
+
+    for game in games:
+        predict_next_connect4_move(game)
+
+    return len(games)
+
+def run_predict_checkers(games: List[Checkers]) -> int:
+    from main import predict_next_checkers_move
+
+    for game in games:
+        predict_next_checkers_move(game)
+
+    return len(games)
+
+BENCHMARKS = [
+    Benchmark("connect4.make_move", prepare_connect4_moves, run_connect4_make_move),
+    Benchmark("connect4.count_all_consecutive", prepare_connect4, run_count_all_consecutive),
+    Benchmark("connect4.board_is_full", prepare_connect4, run_board_is_full),
+    Benchmark("checkers.calculate_all_moves", prepare_checkers, run_calculate_all_moves),
+    Benchmark("checkers.is_valid_move", prepare_checkers_candidates, run_is_valid_move),
+    Benchmark("checkers.make_move", prepare_checkers_moves, run_checkers_make_move),
+    Benchmark("predict_next_connect4_move", prepare_connect4, run_predict_connect4),
+    Benchmark("predict_next_checkers_move", prepare_checkers, run_predict_checkers),
+]
+
+def measure(benchmark: Benchmark, corpus: Dict[str,List[list]], repeat: int) -> Dict[str,float]:
+    """
+    Time a benchmark several times, on fresh inputs every time
+
+    Args:
+        benchmark: benchmark to be timed
+        corpus: corpus built by build_corpus
+        repeat: number of measures
+
+    Returns:
+        number of operations of a measure, and best and median nanoseconds per operation
+    """
+
+    timings = []
+    operations = 0
+
+    for _ in range(repeat):
+        inputs = benchmark.prepare(corpus)
+        started = perf_counter_ns()
+        operations = benchmark.run(inputs)
+        timings.append((perf_counter_ns() - started)/max(operations, 1))
+
+    return {
+        "operations": operations,
+        "repeat": repeat,
+        "best_ns": min(timings),
+        "median_ns": median(timings)
+    }
+
+def run(seed: int, positions: int, repeat: int, only: Optional[str] = None) -> Dict[str,object]:
+    """
+    Run the benchmarks
+
+    Args:
+        seed: seed of the corpus
+        positions: number of positions of every game type
+        repeat: number of measures of every benchmark
+        only: substring of the names of the benchmarks to be run, all of them if None
+
+    Returns:
+        results as a valid JSON representation
+    """
+
+    corpus = build_corpus(seed, positions)
+    results = {}
+
+    for benchmark in BENCHMARKS:
+        if only is None or only in benchmark.name:
+            results[benchmark.name] = measure(benchmark, corpus, repeat)
+            print(f"{benchmark.name:32} {results[benchmark.name]['best_ns']:12.0f} ns/op", file=sys.stderr)
+
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "corpus": {"seed": seed, "positions": positions, "fingerprint": fingerprint(corpus)},
+        "benchmarks": results
+    }
+
+def compare(baseline: Dict[str,object], results: Dict[str,object], threshold: float) -> List[str]:
+    """
+    Compare results with a baseline, by the best time of every benchmark
+
+    Args:
+        baseline: results saved earlier
+        results: results to be compared
+        threshold: slowdown, as a fraction, above which a benchmark is flagged as a regression
+
+    Returns:
+        names of the benchmarks that regressed
+    """
+
+    if baseline["corpus"] != results["corpus"]:
+        print("warning: the results were measured on different corpora", file=sys.stderr)
+
+    regressions = []
+    print(f"{'benchmark':32} {'baseline':>12} {'current':>12} {'change':>8}")
+
+    for name, result in results["benchmarks"].items():
+        if name not in baseline["benchmarks"]:
+            continue
+
+        before, after = baseline["benchmarks"][name]["best_ns"], result["best_ns"]
+        change = after/before - 1
+        flag = ""
+
+        if change > threshold:
+            regressions.append(name)
+            flag = " REGRESSION"
+
+        print(f"{name:32} {before:10.0f}ns {after:10.0f}ns {change:+8.1%}{flag}")
+
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the game engines and the bots on a fixed corpus of positions")
+    parser.add_argument("--output", help="path of the JSON file the results are written to")
+    parser.add_argument("--baseline", help="path of saved results to compare with, exits with 1 if a benchmark regressed")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "RESULTS"), help="compare two saved results without running the benchmarks")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="slowdown flagged as a regression, as a fraction")
+    parser.add_argument("--seed", type=int, default=SEED, help="seed of the corpus of positions")
+    parser.add_argument("--positions", type=int, default=POSITIONS, help="number of positions of every game type")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="number of measures of every benchmark")
+    parser.add_argument("--only", help="only run the benchmarks whose name contains this")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as baseline_file, open(args.compare[1]) as results_file:
+            regressions = compare(json.load(baseline_file), json.load(results_file), args.threshold)
+
+        sys.exit(1 if regressions else 0)
+
+    results = run(args.seed, args.positions, args.repeat, args.only)
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(json.load(baseline_file), results, args.threshold)
+
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,382 @@
+import argparse
+import checkers_search
+import connect4_search
+import mmap
+import os
+import struct
+from checkers import Checkers, SQUARE_INDEXES, SQUARES
+from connect4 import Connect4, Connect4Position
+from copy import deepcopy
+from typing import Callable, Dict, List, Optional, Tuple
+
+# header of a book file: magic, version, key size, value size, padding, number of records
+HEADER = struct.Struct("<4sHHHHI")
+MAGIC = b"BGBK"
+VERSION = 1
+
+# size in bytes of the keys and values stored for each game
+CONNECT4_KEY_SIZE = 8
+CONNECT4_VALUE_SIZE = 1
+CHECKERS_KEY_SIZE = 12
+CHECKERS_VALUE_SIZE = 2
+
+class OpeningBook:
+    """
+    Class used to look up positions in a memory-mapped opening book file
+
+    The file is a fixed size header followed by fixed size records of (key, value) sorted by key. Keys are stored
+    big-endian so that comparing their bytes is the same as comparing their values, which allows the records to
+    be binary searched straight from the mapped pages without parsing the file.
+
+    Attributes:
+        path: path of the book file
+        key_size: size in bytes of the keys
+        value_size: size in bytes of the values
+        record_size: size in bytes of a record
+        count: number of records in the book
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Constructor to map a book file into memory
+
+        Args:
+            path: path of the book file
+        """
+
+        self.path = path
+
+        with open(path, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.key_size, self.value_size, _, self.count = HEADER.unpack_from(self.map, 0)
+
+        if magic != MAGIC or version != VERSION:
+            self.map.close()
+            raise RuntimeError(f"{path} is not a valid opening book")
+
+        self.record_size = self.key_size + self.value_size
+
+        if len(self.map) != HEADER.size + self.count * self.record_size:
+            self.map.close()
+            raise RuntimeError(f"{path} is truncated")
+
+    def __len__(self) -> int:
+        return self.count
+
+    def lookup(self, key: int) -> Optional[bytes]:
+        """
+        Binary search the value stored for a key
+
+        Args:
+            key: key of the position
+
+        Returns:
+            the value stored for the key, or None if the position is not in the book
+        """
+
+        target = key.to_bytes(self.key_size, "big")
+        low, high = 0, self.count
+
+        while low < high:
+            middle = (low + high) // 2
+            offset = HEADER.size + middle * self.record_size
+            current = self.map[offset:offset + self.key_size]
+
+            if current < target:
+                low = middle + 1
+            elif current > target:
+                high = middle
+            else:
+                return self.map[offset + self.key_size:offset + self.record_size]
+
+        return None
+
+    def close(self) -> None:
+        """
+        Unmap the book file
+        """
+
+        self.map.close()
+
+def load_book(path: str) -> Optional[OpeningBook]:
+    """
+    Map a book file if it exists
+
+    Args:
+        path: path of the book file
+
+    Returns:
+        OpeningBook instance, or None if there is no book at the path
+    """
+
+    if not os.path.isfile(path):
+        return None
+
+    return OpeningBook(path)
+
+def write_book(path: str, entries: Dict[int,bytes], key_size: int, value_size: int) -> None:
+    """
+    Write a book file. The file is written next to the destination then renamed, so servers mapping the previous
+    version of the book keep reading consistent pages
+
+    Args:
+        path: path of the book file
+        entries: dictionary mapping position keys to their values
+        key_size: size in bytes of the keys
+        value_size: size in bytes of the values
+    """
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    temporary = f"{path}.tmp"
+
+    with open(temporary, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, key_size, value_size, 0, len(entries)))
+
+        for key in sorted(entries):
+            value = entries[key]
+            if len(value) != value_size:
+                raise ValueError(f"Value of key {key} should be {value_size} bytes long")
+
+            file.write(key.to_bytes(key_size, "big"))
+            file.write(value)
+
+    os.replace(temporary, path)
+
+def rotate(bitboard: int) -> int:
+    """
+    Rotate a checkers bitboard by 180 degrees, which maps square i to square 31 - i
+
+    Args:
+        bitboard: bitboard to be rotated
+
+    Returns:
+        rotated bitboard
+    """
+
+    return int(f"{bitboard:032b}"[::-1], 2)
+
+def checkers_key(game: Checkers, player: int) -> int:
+    """
+    Get the key of a checkers position as seen by the player to move. The board is rotated for player 2 so that
+    both players share the same entries
+
+    Args:
+        game: the instance of checkers game
+        player: player number to move
+
+    Returns:
+        key made of the bitboards of the player's pieces, the opponent's pieces, and the kings
+    """
+
+    position = game.position
+    mine, theirs = position.pieces(player), position.pieces(3 - player)
+    kings = position.kings[1] | position.kings[2]
+
+    if player == 2:
+        mine, theirs, kings = rotate(mine), rotate(theirs), rotate(kings)
+
+    return (mine << 64) | (theirs << 32) | kings
+
+def checkers_moves(game: Checkers) -> List[Tuple[Tuple[int,int],Tuple[int,int]]]:
+    """
+    Get all the moves the player to move can currently play
+
+    Args:
+        game: the instance of checkers game
+
+    Returns:
+        list of (starting position, next position) tuples
+    """
+
+    moves = game.all_moves["moves_eat"][game.current_player] or game.all_moves["moves"][game.current_player]
+    return [(start, move["possible_move"]) for start in moves for move in moves[start]]
+
+def probe_connect4(book: Optional[OpeningBook], game: Connect4) -> Optional[int]:
+    """
+    Look up the move of the player to move in the connect 4 book
+
+    Args:
+        book: connect 4 opening book, or None if there is no book
+        game: the instance of connect 4 game
+
+    Returns:
+        column that should be played, or None if the position is not in the book
+    """
+
+    if book is None:
+        return None
+
+    value = book.lookup(game.position.key(game.current_player))
+
+    if value is None or not game.position.can_play(value[0]):
+        return None
+
+    return value[0]
+
+def probe_checkers(book: Optional[OpeningBook], game: Checkers) -> Optional[Tuple[Tuple[int,int],Tuple[int,int]]]:
+    """
+    Look up the move of the player to move in the checkers book
+
+    Args:
+        book: checkers opening book, or None if there is no book
+        game: the instance of checkers game
+
+    Returns:
+        tuple containing the starting position and the next position, or None if the position is not in the book
+    """
+
+    if book is None:
+        return None
+
+    player = game.current_player
+    value = book.lookup(checkers_key(game, player))
+
+    if value is None:
+        return None
+
+    start, end = value if player == 1 else (31 - value[0], 31 - value[1])
+    move = (SQUARES[start], SQUARES[end])
+
+    # the key does not record a pending multi-jump, so make sure the move is still legal
+    if move not in checkers_moves(game):
+        return None
+
+    return move
+
+def generate(game: object, plies: int, key: Callable, moves: Callable, choose: Callable, play: Callable) -> Dict[int,bytes]:
+    """
+    Build an opening book by walking the game tree from the starting position. Every move of the opponent is
+    expanded, while only the chosen move of the bot is followed
+
+    Args:
+        game: game instance at the starting position
+        plies: number of plies covered by the book
+        key: function returning the key of a game for the player to move
+        moves: function returning the moves the player to move can play
+        choose: function returning the encoded best move of the player to move
+        play: function returning a copy of the game with a move played
+
+    Returns:
+        dictionary mapping position keys to encoded moves
+    """
+
+    book = {}
+    visited = set()
+
+    def visit(game: object, ply: int, bot: int) -> None:
+        if ply >= plies or game.is_over:
+            return
+
+        position_key = key(game)
+        if (position_key, game.current_player == bot) in visited:
+            return
+        visited.add((position_key, game.current_player == bot))
+
+        if game.current_player == bot:
+            if position_key not in book:
+                book[position_key] = choose(game)
+            visit(play(game, book[position_key]), ply + 1, bot)
+        else:
+            for move in moves(game):
+                visit(play(game, move), ply + 1, bot)
+
+    # the bot can either be the first or the second player to move
+    for bot in (1, 2):
+        visit(game, 0, bot)
+
+    return book
+
+def generate_connect4(plies: int, node_limit: int) -> Dict[int,bytes]:
+    """
+    Build the connect 4 opening book
+
+    Args:
+        plies: number of plies covered by the book
+        node_limit: number of positions searched for every move of the bot
+
+    Returns:
+        dictionary mapping position keys to encoded moves
+    """
+
+    table = connect4_search.TranspositionTable(1 << 20)
+
+    def choose(game: Connect4) -> bytes:
+        searcher = connect4_search.Searcher(game.position, game.current_player, 0, node_limit, table, game.evaluator)
+        return bytes([searcher.search().move])
+
+    def play(game: Connect4, move: object) -> Connect4:
+        column = move[0] if isinstance(move, bytes) else move
+        child = deepcopy(game)
+        child.make_move(child.current_player, column)
+        return child
+
+    game = Connect4("book")
+    game.started = True
+
+    return generate(
+        game,
+        plies,
+        lambda game: game.position.key(game.current_player),
+        lambda game: [col for col in range(Connect4Position.WIDTH) if game.position.can_play(col)],
+        choose,
+        play
+    )
+
+def generate_checkers(plies: int, node_limit: int) -> Dict[int,bytes]:
+    """
+    Build the checkers opening book
+
+    Args:
+        plies: number of plies covered by the book
+        node_limit: number of positions searched for every move of the bot
+
+    Returns:
+        dictionary mapping position keys to encoded moves
+    """
+
+    table = checkers_search.TranspositionTable(1 << 18)
+
+    def choose(game: Checkers) -> bytes:
+        player = game.current_player
+        searcher = checkers_search.Searcher(game.position, player, checkers_search.pending_piece(game), 0, node_limit, table)
+        squares = [SQUARE_INDEXES[position] for position in searcher.search().move]
+        return bytes(squares if player == 1 else [31 - square for square in squares])
+
+    def play(game: Checkers, move: object) -> Checkers:
+        if isinstance(move, bytes):
+            squares = move if game.current_player == 1 else bytes(31 - square for square in move)
+            move = (SQUARES[squares[0]], SQUARES[squares[1]])
+
+        child = deepcopy(game)
+        child.make_move(child.current_player, *move)
+        return child
+
+    game = Checkers("book")
+    game.started = True
+    game.used_player_numbers = [1, 2]
+
+    return generate(
+        game,
+        plies,
+        lambda game: checkers_key(game, game.current_player),
+        checkers_moves,
+        choose,
+        play
+    )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate the opening book of a game")
+    parser.add_argument("game_type", choices=["connect-4", "checkers"], help="game the book is generated for")
+    parser.add_argument("output", help="path of the book file")
+    parser.add_argument("--plies", type=int, default=8, help="number of plies covered by the book")
+    parser.add_argument("--nodes", type=int, default=200000, help="positions searched for every move of the bot")
+    args = parser.parse_args()
+
+    if args.game_type == "connect-4":
+        write_book(args.output, generate_connect4(args.plies, args.nodes), CONNECT4_KEY_SIZE, CONNECT4_VALUE_SIZE)
+    else:
+        write_book(args.output, generate_checkers(args.plies, args.nodes), CHECKERS_KEY_SIZE, CHECKERS_VALUE_SIZE)
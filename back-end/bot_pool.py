@@ -0,0 +1,300 @@
+import asyncio
+import importlib
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from tracing import traced
+from typing import Callable, Deque, Dict, Optional, Set, Tuple
+
+def preload(modules: Tuple[str,...]) -> None:
+    """
+    Import the search engines when a worker starts, so that the first job does not pay for it
+
+    Args:
+        modules: names of the modules to be imported
+    """
+
+    for module in modules:
+        importlib.import_module(module)
+
+RETURN_MARGIN = 0.05 # seconds kept for the move to come back from the worker before the deadline
+
+class JobCancelled(Exception):
+    """
+    Raised to the coroutine waiting for a move when the room it was computed for has been removed
+    """
+
+class BotJob:
+    """
+    Class used to track a move computation, from the queue of the pool to its worker
+
+    Attributes:
+        room: room the move is computed for
+        function: function run by the worker, called with the snapshot and the budget of the search
+        snapshot: compact copy of the position the worker searches
+        time_limit: think-time budget of the search in seconds, 0 for unlimited
+        node_limit: node budget of the search, 0 for unlimited
+        deadline: event loop time after which the move is no longer wanted
+        result: future resolved with the move, or with None if the deadline passed first
+        future: future of the worker running the job, None while the job is queued
+        executor: process pool the job was handed to, None while the job is queued
+        timer: handle of the callback expiring the job at its deadline
+        cancelled: whether the room was removed before the move was computed
+    """
+
+    __slots__ = ("room", "function", "snapshot", "time_limit", "node_limit", "deadline", "result", "future", "executor", "timer", "cancelled")
+
+    def __init__(self, room: object, function: Callable, snapshot: tuple, time_limit: float, node_limit: int, deadline: float, result: asyncio.Future) -> None:
+        self.room = room
+        self.function = function
+        self.snapshot = snapshot
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+        self.deadline = deadline
+        self.result = result
+        self.future: Optional[Future] = None
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.cancelled = False
+
+class BotPool:
+    """
+    Class used to compute the moves of the bots in worker processes, so that searching never blocks the event loop
+
+    Jobs wait in a FIFO queue and are only handed to the executor when a worker is free, so a job whose room was
+    removed, or whose deadline passed while it was queued, never takes a worker. A job still running at its deadline
+    resolves to None straight away, and its worker is only reused once the search stops on its own budget.
+
+    Attributes:
+        workers: number of worker processes
+        modules: names of the modules imported by every worker when it starts
+        grace: seconds a job may spend queued on top of its think-time before it expires
+        executor: process pool running the searches, started on the first job
+        queue: jobs waiting for a free worker
+        running: number of jobs currently handed to the executor
+        rooms: dictionary mapping rooms to their queued and running jobs
+        expired: number of jobs that missed their deadline
+        cancelled: number of jobs cancelled because their room was removed
+    """
+
+    def __init__(self, workers: int = 0, grace: float = 1.0, modules: Tuple[str,...] = ()) -> None:
+        """
+        Constructor to instantiate an idle pool
+
+        Args:
+            workers: number of worker processes, 0 for one per CPU
+            grace: seconds a job may spend queued on top of its think-time before it expires
+            modules: names of the modules imported by every worker when it starts
+        """
+
+        self.workers = workers or os.cpu_count() or 1
+        self.modules = modules
+        self.grace = grace
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.queue: Deque[BotJob] = deque()
+        self.running = 0
+        self.rooms: Dict[object,Set[BotJob]] = {}
+        self.expired = 0
+        self.cancelled = 0
+
+    @traced("bot.compute")
+    async def compute(self, room: object, function: Callable, snapshot: tuple, time_limit: float, node_limit: int = 0) -> Optional[object]:
+        """
+        Queue a move computation and wait for its result
+
+        Args:
+            room: room the move is computed for
+            function: module level function run by the worker, called with (snapshot, time_limit, node_limit)
+            snapshot: compact, picklable copy of the position
+            time_limit: think-time budget of the search in seconds, 0 for unlimited
+            node_limit: node budget of the search, 0 for unlimited
+
+        Raises:
+            JobCancelled: the room was removed before the move was computed
+
+        Returns:
+            the move computed by the worker, or None if the deadline passed first
+        """
+
+        loop = asyncio.get_running_loop()
+        job = BotJob(room, function, snapshot, time_limit, node_limit, loop.time() + time_limit + self.grace, loop.create_future())
+        job.timer = loop.call_at(job.deadline, self.expire, job)
+
+        self.rooms.setdefault(room, set()).add(job)
+        self.queue.append(job)
+        self.dispatch()
+
+        try:
+            move = await job.result
+        finally:
+            self.discard(job)
+
+        if job.cancelled:
+            raise JobCancelled()
+
+        return move
+
+    def dispatch(self) -> None:
+        """
+        Hand the queued jobs to the executor while there are free workers
+        """
+
+        loop = asyncio.get_running_loop()
+
+        while self.queue and self.running < self.workers:
+            job = self.queue.popleft()
+
+            # skip the jobs cancelled or expired while they were queued
+            if job.result.done():
+                continue
+
+            # a job that waited longer than the grace only gets the time left before its deadline
+            time_limit = job.time_limit
+            if time_limit:
+                time_limit = min(time_limit, job.deadline - loop.time() - RETURN_MARGIN)
+                if time_limit <= 0:
+                    self.expire(job)
+                    continue
+
+            executor = self.start()
+
+            try:
+                job.future = executor.submit(job.function, job.snapshot, time_limit, job.node_limit)
+            except BrokenProcessPool:
+                # a worker died before the callbacks of its jobs ran, so start a new pool for the next jobs and let
+                # the bot fall back this time
+                self.drop(executor)
+                job.result.set_result(None)
+                continue
+
+            self.running += 1
+            job.executor = executor
+            job.future.add_done_callback(lambda _, job=job: loop.call_soon_threadsafe(self.finish, job))
+
+    def start(self) -> ProcessPoolExecutor:
+        """
+        Start the worker processes if they are not running yet
+
+        Returns:
+            the executor of the pool
+        """
+
+        if self.executor is None:
+            # spawn fresh interpreters rather than forking the server with its sockets and event loop
+            self.executor = ProcessPoolExecutor(self.workers, multiprocessing.get_context("spawn"), preload, (self.modules,))
+
+            # make every worker start and import the engines now, rather than when the first bot has to move
+            for _ in range(self.workers):
+                self.executor.submit(os.getpid)
+
+        return self.executor
+
+    def drop(self, executor: ProcessPoolExecutor) -> None:
+        """
+        Forget a process pool whose worker died, so that the next job starts a new one
+
+        Args:
+            executor: the broken pool, which may already have been replaced by the jobs that broke with it
+        """
+
+        if self.executor is executor:
+            self.executor = None
+            executor.shutdown(wait=False)
+
+    def finish(self, job: BotJob) -> None:
+        """
+        Resolve a job once its worker is done with it, and free the worker for the next job
+
+        Args:
+            job: job whose worker is done
+        """
+
+        self.running -= 1
+        future = job.future
+        broken = not future.cancelled() and isinstance(future.exception(), BrokenProcessPool)
+
+        # a worker died, so start a new pool for the next jobs, even if this job already expired
+        if broken:
+            self.drop(job.executor)
+
+        if not job.result.done():
+            if future.cancelled() or broken:
+                # let the bot fall back this time
+                job.result.set_result(None)
+            elif future.exception() is not None:
+                job.result.set_exception(future.exception())
+            else:
+                job.result.set_result(future.result())
+
+        job.timer.cancel()
+        self.dispatch()
+
+    def expire(self, job: BotJob) -> None:
+        """
+        Give up on a job that missed its deadline
+
+        Args:
+            job: job to be expired
+        """
+
+        if not job.result.done():
+            self.expired += 1
+            job.result.set_result(None)
+
+        if job.future is not None:
+            job.future.cancel()
+
+    def cancel(self, room: object) -> None:
+        """
+        Cancel all the jobs of a room, called when the room is removed
+
+        Args:
+            room: room whose jobs are cancelled
+        """
+
+        for job in self.rooms.pop(room, ()):
+            if not job.result.done():
+                self.cancelled += 1
+                job.cancelled = True
+                job.result.set_result(None)
+
+            if job.future is not None:
+                job.future.cancel()
+
+    def discard(self, job: BotJob) -> None:
+        """
+        Stop tracking a job once its result has been collected, or its waiter has gone
+
+        Args:
+            job: job to be discarded
+        """
+
+        if not job.result.done():
+            job.result.cancel()
+
+        if job.future is not None:
+            job.future.cancel()
+
+        job.timer.cancel()
+
+        jobs = self.rooms.get(job.room)
+        if jobs is not None:
+            jobs.discard(job)
+            if not jobs:
+                del self.rooms[job.room]
+
+    def shutdown(self) -> None:
+        """
+        Cancel every job and stop the worker processes
+        """
+
+        for room in list(self.rooms):
+            self.cancel(room)
+
+        self.queue.clear()
+
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
@@ -1,5 +1,6 @@
 from collections import defaultdict
 from game import BoardGame
+from tracing import traced
 from typing import Dict, List, Optional, Tuple, Union
 
 class Piece:
@@ -38,25 +39,314 @@ class Piece:
         self.owner = player
         self.is_king = False
 
+# the 32 dark squares are indexed row by row: square = 4*y + x//2
+FULL = 0xFFFFFFFF
+EVEN_ROWS = 0x0F0F0F0F
+ODD_ROWS = 0xF0F0F0F0
+LEFT_COLUMN = 0x11111111 # squares with x == 0 on even rows
+RIGHT_COLUMN = 0x88888888 # squares with x == 7 on odd rows
+PROMOTION_ROWS = 0xF000000F # squares with y == 0 or y == 7
+
+# coordinates of every square, and the square of every dark coordinate
+SQUARES = tuple((2*(square % 4) + (square // 4) % 2, square // 4) for square in range(32))
+SQUARE_INDEXES = {coordinates: square for square, coordinates in enumerate(SQUARES)}
+
+# diagonal directions: up right, up left, down right, down left. Opposite directions add up to 3
+UP_RIGHT, UP_LEFT, DOWN_RIGHT, DOWN_LEFT = range(4)
+
+# the square index step of a diagonal depends on the parity of the row, every direction is stored as
+# (shift for even rows, squares of even rows that can move, shift for odd rows, squares of odd rows that can move)
+DIRECTIONS = (
+    (4, EVEN_ROWS, 5, ODD_ROWS & ~RIGHT_COLUMN),
+    (3, EVEN_ROWS & ~LEFT_COLUMN, 4, ODD_ROWS),
+    (-4, EVEN_ROWS, -3, ODD_ROWS & ~RIGHT_COLUMN),
+    (-5, EVEN_ROWS & ~LEFT_COLUMN, -4, ODD_ROWS),
+)
+
+def shift(bitboard: int, direction: int) -> int:
+    """
+    Move every square of a bitboard one step in a diagonal direction, dropping the squares leaving the board
+
+    Args:
+        bitboard: bitboard to be moved
+        direction: one of UP_RIGHT, UP_LEFT, DOWN_RIGHT, DOWN_LEFT
+
+    Returns:
+        moved bitboard
+    """
+
+    even_shift, even_mask, odd_shift, odd_mask = DIRECTIONS[direction]
+
+    if even_shift > 0:
+        return (((bitboard & even_mask) << even_shift) | ((bitboard & odd_mask) << odd_shift)) & FULL
+
+    return ((bitboard & even_mask) >> -even_shift) | ((bitboard & odd_mask) >> -odd_shift)
+
+# neighbouring square of every square in every direction, -1 if it is off the board
+NEIGHBOURS = tuple(tuple(shift(1 << square, direction).bit_length() - 1 for square in range(32)) for direction in range(4))
+
+# directions the men of each player can move to, kings can move to all of them
+MEN_DIRECTIONS = {1: (UP_RIGHT, UP_LEFT), 2: (DOWN_RIGHT, DOWN_LEFT)}
+
+class CheckersPosition:
+    """
+    Bitboard representation of a checkers board, with one 32 bit bitboard of men and one of kings per player
+
+    Attributes:
+        men: bitboard of the men of each player, indexed by player number (index 0 is unused)
+        kings: bitboard of the kings of each player, indexed by player number (index 0 is unused)
+    """
+
+    __slots__ = ("men", "kings")
+
+    def __init__(self) -> None:
+        """
+        Constructor to instantiate an empty board
+        """
+
+        self.men = [0, 0, 0]
+        self.kings = [0, 0, 0]
+
+    @classmethod
+    def from_board(cls, board: List[List[Union[Piece,int]]]) -> "CheckersPosition":
+        """
+        Create the bitboards matching a board of Piece objects
+
+        Args:
+            board: board indexed by x then y, with Piece objects or 0 for empty squares
+
+        Returns:
+            new CheckersPosition instance
+        """
+
+        position = cls()
+
+        for square, (x, y) in enumerate(SQUARES):
+            piece = board[x][y]
+            if piece:
+                if piece.is_king:
+                    position.kings[piece.owner] |= 1 << square
+                else:
+                    position.men[piece.owner] |= 1 << square
+
+        return position
+
+    def copy(self) -> "CheckersPosition":
+        """
+        Create an independent copy of the position
+
+        Returns:
+            new CheckersPosition instance with the same pieces
+        """
+
+        position = CheckersPosition()
+        position.men = self.men[:]
+        position.kings = self.kings[:]
+
+        return position
+
+    def pieces(self, player: int) -> int:
+        """
+        Get the squares occupied by a player
+
+        Args:
+            player: player number
+
+        Returns:
+            bitboard of the men and kings of the player
+        """
+
+        return self.men[player] | self.kings[player]
+
+    def empty(self) -> int:
+        """
+        Get the empty squares
+
+        Returns:
+            bitboard of the squares without any piece
+        """
+
+        return FULL & ~(self.men[1] | self.men[2] | self.kings[1] | self.kings[2])
+
+    def movers(self, player: int, direction: int) -> int:
+        """
+        Get the pieces of a player that are allowed to move in a direction
+
+        Args:
+            player: player number
+            direction: one of UP_RIGHT, UP_LEFT, DOWN_RIGHT, DOWN_LEFT
+
+        Returns:
+            bitboard of the pieces
+        """
+
+        return self.kings[player] | (self.men[player] if direction in MEN_DIRECTIONS[player] else 0)
+
+    def captures(self, player: int, only: int = FULL) -> List[Tuple[int,int,int]]:
+        """
+        Generate the capturing moves of a player
+
+        Args:
+            player: player number
+            only: bitboard of the pieces allowed to capture, all of them by default
+
+        Returns:
+            list of (starting square, landing square, captured square) tuples
+        """
+
+        empty = self.empty()
+        enemies = self.pieces(3 - player)
+        moves = []
+
+        for direction in range(4):
+            back = 3 - direction
+
+            # pieces with an enemy next to them, and an empty square right behind that enemy
+            jumpers = self.movers(player, direction) & only & shift(enemies & shift(empty, back), back)
+
+            neighbours = NEIGHBOURS[direction]
+            while jumpers:
+                bit = jumpers & -jumpers
+                jumpers ^= bit
+                start = bit.bit_length() - 1
+                middle = neighbours[start]
+                moves.append((start, neighbours[middle], middle))
+
+        return moves
+
+    def quiet_moves(self, player: int) -> List[Tuple[int,int,int]]:
+        """
+        Generate the non-capturing moves of a player
+
+        Args:
+            player: player number
+
+        Returns:
+            list of (starting square, landing square, -1) tuples
+        """
+
+        empty = self.empty()
+        moves = []
+
+        for direction in range(4):
+            # pieces with an empty square next to them
+            steppers = self.movers(player, direction) & shift(empty, 3 - direction)
+
+            neighbours = NEIGHBOURS[direction]
+            while steppers:
+                bit = steppers & -steppers
+                steppers ^= bit
+                start = bit.bit_length() - 1
+                moves.append((start, neighbours[start], -1))
+
+        return moves
+
+    def can_capture(self, player: int, only: int = FULL) -> bool:
+        """
+        Check if a player has any capturing move
+
+        Args:
+            player: player number
+            only: bitboard of the pieces allowed to capture, all of them by default
+
+        Returns:
+            True if a capture is available, False otherwise
+        """
+
+        empty = self.empty()
+        enemies = self.pieces(3 - player)
+
+        for direction in range(4):
+            back = 3 - direction
+            if self.movers(player, direction) & only & shift(enemies & shift(empty, back), back):
+                return True
+
+        return False
+
+    def has_moves(self, player: int) -> bool:
+        """
+        Check if a player can make any move
+
+        Args:
+            player: player number
+
+        Returns:
+            True if the player has a capturing or a non-capturing move, False otherwise
+        """
+
+        empty = self.empty()
+
+        for direction in range(4):
+            if self.movers(player, direction) & shift(empty, 3 - direction):
+                return True
+
+        return self.can_capture(player)
+
+    def move(self, player: int, start: int, end: int, captured: int = -1) -> bool:
+        """
+        Move a piece, remove the captured piece, and crown the piece if it reaches the first or last row.
+        Assumes that the move is valid
+
+        Args:
+            player: player number making the move
+            start: starting square
+            end: landing square
+            captured: captured square, -1 if the move is not a capture
+
+        Returns:
+            True if the piece was crowned by the move, False otherwise
+        """
+
+        start_bit, end_bit = 1 << start, 1 << end
+        crowned = False
+
+        if self.kings[player] & start_bit:
+            self.kings[player] ^= start_bit | end_bit
+        else:
+            self.men[player] ^= start_bit
+
+            if end_bit & PROMOTION_ROWS:
+                self.kings[player] |= end_bit
+                crowned = True
+            else:
+                self.men[player] |= end_bit
+
+        if captured >= 0:
+            captured_bit = ~(1 << captured)
+            self.men[3 - player] &= captured_bit
+            self.kings[3 - player] &= captured_bit
+
+        return crowned
+
 class Checkers(BoardGame):
     """
     Class used create a new checkers game
 
     Attributes:
         all_moves: dictionary containing all the moves that can currently be played on the board
+        position: bitboard representation of the board, used to generate the moves
+        pending: position of the piece that has to continue a multi-jump, None if the player to move is free
+        version: version of the board, incremented every time the moves are recalculated
+        legal_moves_cache: (version, player to move, whether the game is over) the legal moves were listed for, and
+            the legal moves
     """
 
-    def __init__(self, room_id : str) -> None:
+    def __init__(self, room_id : str, setup: bool = True) -> None:
         """
         Constructor to instantiate an object of the class
 
         Args:
             room_id: id of the room being created
+            setup: whether to set up the pieces, False for a game whose board and moves are restored right after
         """
 
         super().__init__(room_id, 2, 8, 8) # call the superclass' constructor
 
-        self.init_board()
+        self.version = 0
+        self.legal_moves_cache: Tuple[Optional[Tuple[int,int,bool]],List[Tuple[int,int,int,int]]] = (None, [])
+
+        if setup:
+            self.init_board()
 
     def init_board(self) -> None:
         """
@@ -77,8 +367,40 @@ class Checkers(BoardGame):
             
             switch ^= 1 # bitwise XOR
 
+        self.position = CheckersPosition.from_board(self.board)
+        self.pending = None
         self.calculate_all_moves()
 
+    def snapshot(self) -> Dict[str,object]:
+        """
+        Get the latest state of the board as a message, so that a client that fell behind can catch up at once
+
+        Returns:
+            a valid JSON representation, with the pieces as [x, y, owner, is king] lists
+        """
+
+        return {
+            "event": "state",
+            "pieces": [[x, y, piece.owner, piece.is_king] for x, col in enumerate(self.board) for y, piece in enumerate(col) if piece],
+            "next": self.current_player,
+            "over": self.is_over,
+            "pending": self.pending,
+            "moves": self.legal_moves()
+        }
+
+    def players(self) -> Dict[object,object]:
+        """
+        Get the details of the players of the game as a message, along with the legal moves of the first player
+
+        Returns:
+            a valid JSON representation mapping every player number to its nickname
+        """
+
+        message = super().players()
+        message["moves"] = self.legal_moves()
+
+        return message
+
     def get_next_plauer(self) -> int:
         """
         Get the next player in line
@@ -106,6 +428,7 @@ class Checkers(BoardGame):
         
         return success
 
+    @traced("checkers.get_possible_moves")
     def get_possible_moves(self, player: int, current_position: Tuple[int,int]) -> List[Dict[str,Tuple[int,int]]]:
         """
             Get all the moves that can currently be played out on the board from the current position
@@ -125,6 +448,29 @@ class Checkers(BoardGame):
         except KeyError:
             return []
 
+    def legal_moves(self) -> List[Tuple[int,int,int,int]]:
+        """
+        Get every move the player to move can play, listed once per turn and cached until the board changes, so that
+        the broadcasts starting a turn can carry them and the clients do not have to ask for the moves of every piece
+
+        Returns:
+            the moves as (x, y, next x, next y), only the jumps when a jump is forced, none once the game is over
+        """
+
+        key = (self.version, self.current_player, self.is_over)
+
+        if self.legal_moves_cache[0] != key:
+            moves = []
+
+            if not self.is_over:
+                player_moves = self.all_moves["moves_eat"][self.current_player] or self.all_moves["moves"][self.current_player]
+                moves = [(x, y, *move["possible_move"]) for (x, y), piece_moves in player_moves.items() for move in piece_moves]
+
+            self.legal_moves_cache = (key, moves)
+
+        return self.legal_moves_cache[1]
+
+    @traced("checkers.calculate_all_moves")
     def calculate_all_moves(self, previous_was_eat: Optional[Tuple[int,int]] = None) -> None:
         """
             Calculate all the moves that can currently be played out on the board
@@ -133,66 +479,36 @@ class Checkers(BoardGame):
                 previous_was_eat: if the previous move was eat, then make sure the only availahle eat is the continuation of the previous eat
         """
 
-        # Reset the dictionary of moves that can be made on the current 
+        self.version += 1
+
+        # Reset the dictionary of moves that can be made on the current
         self.all_moves = {
             "moves_eat": {player: {} for player in [1,2]},
             "moves": {player: {} for player in [1,2]},
         }
 
-        # for every piece (square) on the board, get the player number owning the piece
-        for x, col in enumerate(self.board):
-            for y, piece in enumerate(col):
-                try:
-                    player = piece.owner
-                except AttributeError:
-                    continue
-                
-                current_position = (x,y)
-
-                self.find_valid_moves(player, current_position, Piece.moves_eat, "moves_eat")
-                self.find_valid_moves(player, current_position, Piece.moves, "moves")
-
-        if previous_was_eat and previous_was_eat in self.all_moves["moves_eat"][self.current_player]:
-            
-            new_dict = {key: self.all_moves["moves_eat"][self.current_player][key] for key in self.all_moves["moves_eat"][self.current_player] if key == previous_was_eat}
-            
-            self.all_moves["moves_eat"][self.current_player] = new_dict
-
-    def find_valid_moves(self, player: int, current_position: Tuple[int,int], lst: List[Tuple[int,int]], key: str) -> None:
-        """
-        Find all the valid moves that can be played out from the current_position
+        # generate the moves of every player from the bitboards, and convert the squares back to board coordinates
+        for player in [1,2]:
+            for key, moves in (("moves_eat", self.position.captures(player)), ("moves", self.position.quiet_moves(player))):
+                player_moves = self.all_moves[key][player]
 
-        Args:
-            player: player number making the move
-            current_position: position on the board of the chosen piece
-            lst: list of valid coordinates to be checked
-            key: name of the key in all_moves dictionary
-        
-        Returns:
-            True if there are valid moves False otherwise
-        """
+                for start, end, _ in moves:
+                    current_position = SQUARES[start]
 
-        x,y = current_position
+                    if current_position not in player_moves:
+                        player_moves[current_position] = []
 
-        # call the is_valid_move function for every possible moves
-        for x_displacement, y_displacement in lst:
-            future_position = (x+x_displacement, y+y_displacement)
+                    player_moves[current_position].append({
+                        "possible_move": SQUARES[end],
+                    })
 
-            is_valid, _ = self.is_valid_move(current_position, future_position)
-            
-            if is_valid:
+        if previous_was_eat and previous_was_eat in self.all_moves["moves_eat"][self.current_player]:
 
-                # create an empty list if it doesn't exist
-                if current_position not in self.all_moves[key][player]:
-                    self.all_moves[key][player][current_position] = []
+            new_dict = {key: self.all_moves["moves_eat"][self.current_player][key] for key in self.all_moves["moves_eat"][self.current_player] if key == previous_was_eat}
 
-                # append a new dictionary listing the possible moves
-                self.all_moves[key][player][current_position].append({
-                    "possible_move": future_position,
-                })
-        
-        return True if current_position in self.all_moves[key][player] else False
+            self.all_moves["moves_eat"][self.current_player] = new_dict
 
+    @traced("checkers.make_move")
     def make_move(self, player: int, current_position: Tuple[int,int], future_position: Tuple[int,int]) -> Tuple[Dict[str,object],int]:
         """
         Allow a player to make a move on the checkers board
@@ -211,33 +527,43 @@ class Checkers(BoardGame):
 
         if player != self.current_player:
             raise RuntimeError("It is not your turn yet")
-    
-        # check if move is valid
-        is_valid, eaten = self.is_valid_move(current_position, future_position, testing=False)
-        
-        if is_valid:
-            x1, y1 = current_position
-            x2, y2 = future_position
-            
-            # move the piece
-            self.board[x2][y2] = self.board[x1][y1]
-            self.board[x1][y1] = 0
-            
-            # if eaten, change the middle piece to 0
-            if eaten:
-                self.board[eaten[0]][eaten[1]] = 0
 
-        else:
+        # check if move is valid, prioritising force eats
+        moves = self.all_moves["moves_eat"][player] or self.all_moves["moves"][player]
+
+        if not any(future_position == move["possible_move"] for move in moves.get(current_position, [])):
             raise RuntimeError("This is not a valid move")
-        
+
+        x1, y1 = current_position
+        x2, y2 = future_position
+        eaten = None
+
+        # a move of 2 squares jumps over the piece in the middle
+        if abs(x1-x2) == 2:
+            eaten = ((x1+x2)//2, (y1+y2)//2)
+
+        crowned = self.position.move(player, SQUARE_INDEXES[current_position], SQUARE_INDEXES[future_position], SQUARE_INDEXES[eaten] if eaten else -1)
+
+        # move the piece
+        self.board[x2][y2] = self.board[x1][y1]
+        self.board[x1][y1] = 0
+
+        # if eaten, change the middle piece to 0
+        if eaten:
+            self.board[eaten[0]][eaten[1]] = 0
+
+        # upgrade the piece to king if it reached the first or last row
+        if crowned:
+            self.board[x2][y2].is_king = True
+
         # recalculate all the possible moves after the move was made
         self.calculate_all_moves(future_position)
-        
+
         # get all the players that can no longer make a move
         players_that_cannnot_make_moves = [i for i in self.used_player_numbers if len(self.all_moves["moves_eat"][i]) == 0 and len(self.all_moves["moves"][i]) == 0]
-        
+
         winner = 0
-        
+
         if len(players_that_cannnot_make_moves) > 0:
             # if no possible moves by a player, then the game is over
             self.is_over = True
@@ -253,6 +579,19 @@ class Checkers(BoardGame):
         # if there is no force eats, then change turn
         if (eaten and len(self.all_moves["moves_eat"][player]) == 0 or not eaten) and not self.is_over:
             self.current_player = self.get_next_plauer()
+            self.pending = None
+        elif not self.is_over and future_position in self.all_moves["moves_eat"][player]:
+            # the same piece keeps jumping
+            self.pending = future_position
+        else:
+            # the game is over, or the player keeps the turn to jump with another piece
+            self.pending = None
+
+        if self.log:
+            self.log.move(player, current_position, future_position)
+
+            if winner:
+                self.log.end(winner)
 
         return ({
             "previous_position": current_position,
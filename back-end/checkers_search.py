@@ -0,0 +1,513 @@
+from checkers import Checkers, CheckersPosition, PROMOTION_ROWS, SQUARE_INDEXES, SQUARES
+from random import Random
+from search import SearchResult, SearchTimeout
+from time import perf_counter
+from typing import List, Optional, Tuple
+
+WIN_SCORE = 100000 # score of a win, the number of plies before the win is subtracted to prefer faster wins
+MATE_BOUND = WIN_SCORE - 1000 # scores beyond this bound are wins or losses
+MAX_DEPTH = 64
+
+MAN_VALUE = 100
+KING_VALUE = 160
+ADVANCE_VALUE = 3 # bonus for every row a man has advanced towards the crowning row
+
+# flags of the transposition table entries
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+# zobrist keys of every (piece type, square), where the piece types are man and king of player 1 then player 2,
+# of player 2 being the player to move, and of the piece that has to continue a multi-jump
+_random = Random(0xB0A2D)
+PIECE_KEYS = tuple(tuple(_random.getrandbits(64) for _ in range(32)) for _ in range(4))
+SIDE_KEY = _random.getrandbits(64)
+PENDING_KEYS = tuple(_random.getrandbits(64) for _ in range(32))
+
+# score of a man on every square for each player, the further it has advanced the better
+MAN_SCORES = (
+    None,
+    tuple(MAN_VALUE + ADVANCE_VALUE * SQUARES[square][1] for square in range(32)),
+    tuple(MAN_VALUE + ADVANCE_VALUE * (7 - SQUARES[square][1]) for square in range(32)),
+)
+
+def piece_key(player: int, is_king: bool, square: int) -> int:
+    """
+    Get the zobrist key of a piece
+
+    Args:
+        player: player number owning the piece
+        is_king: whether the piece is a king
+        square: square of the piece
+
+    Returns:
+        64 bit zobrist key
+    """
+
+    return PIECE_KEYS[2*(player - 1) + is_king][square]
+
+def zobrist(position: CheckersPosition, player: int, pending: int = -1) -> int:
+    """
+    Compute the zobrist hash of a position from scratch
+
+    Args:
+        position: position to be hashed
+        player: player number to move
+        pending: square of the piece that has to continue a multi-jump, -1 if there is none
+
+    Returns:
+        64 bit hash of the position
+    """
+
+    key = SIDE_KEY if player == 2 else 0
+
+    if pending >= 0:
+        key ^= PENDING_KEYS[pending]
+
+    for owner in (1, 2):
+        for is_king, bitboard in ((False, position.men[owner]), (True, position.kings[owner])):
+            while bitboard:
+                bit = bitboard & -bitboard
+                bitboard ^= bit
+                key ^= piece_key(owner, is_king, bit.bit_length() - 1)
+
+    return key
+
+class TranspositionTable:
+    """
+    Fixed size hash table storing the results of previously searched positions
+
+    Every bucket holds 2 entries. The first one keeps the deepest result of the current search and is only replaced
+    by a result searched at least as deep or by any result once a new search started. The second one always takes
+    the results the first one refused, so recent positions are never lost.
+
+    Attributes:
+        size: number of buckets in the table, a power of 2
+        entries: list of (key, generation, depth, flag, score, move) tuples, or None for empty slots
+        generation: number of the current search
+    """
+
+    def __init__(self, size: int = 1 << 17) -> None:
+        """
+        Constructor to instantiate an empty table
+
+        Args:
+            size: number of buckets in the table, rounded down to a power of 2
+        """
+
+        self.size = 1 << (size.bit_length() - 1)
+        self.entries: List[Optional[Tuple[int,int,int,int,int,Tuple[int,int,int]]]] = [None] * (2 * self.size)
+        self.generation = 0
+
+    def new_search(self) -> None:
+        """
+        Mark the entries of the previous searches as replaceable
+        """
+
+        self.generation += 1
+
+    def get(self, key: int) -> Optional[Tuple[int,int,int,int,int,Tuple[int,int,int]]]:
+        """
+        Get the entry stored for a position
+
+        Args:
+            key: zobrist hash of the position
+
+        Returns:
+            the stored entry, or None if the position is not stored
+        """
+
+        index = 2 * (key & (self.size - 1))
+
+        for entry in (self.entries[index], self.entries[index + 1]):
+            if entry is not None and entry[0] == key:
+                return entry
+
+        return None
+
+    def put(self, key: int, depth: int, flag: int, score: int, move: Optional[Tuple[int,int,int]]) -> None:
+        """
+        Store the result of a searched position
+
+        Args:
+            key: zobrist hash of the position
+            depth: remaining depth the position was searched with
+            flag: whether the score is exact, a lower bound, or an upper bound
+            score: score of the position
+            move: best move found as a (starting square, landing square, captured square) tuple, None if there is none
+        """
+
+        index = 2 * (key & (self.size - 1))
+        entry = self.entries[index]
+
+        if entry is None or entry[0] == key or entry[1] != self.generation or entry[2] <= depth:
+            self.entries[index] = (key, self.generation, depth, flag, score, move)
+        else:
+            self.entries[index + 1] = (key, self.generation, depth, flag, score, move)
+
+# shared by all the searches of the process, the hashes describe the whole position so entries stay valid between games
+table = TranspositionTable()
+
+class Searcher:
+    """
+    Alpha-beta negamax search over a checkers position, deepened iteratively until the budget is used up. The search
+    keeps going past its depth while captures are forced, so positions are only evaluated once they are quiet
+
+    Attributes:
+        position: copy of the position being searched
+        player: player number to move at the root
+        pending: square of the piece that has to continue a multi-jump at the root, -1 if there is none
+        time_limit: maximum number of seconds the search can take, 0 for unlimited
+        node_limit: maximum number of positions the search can visit, 0 for unlimited
+        table: transposition table used by the search
+        nodes: number of positions visited so far
+    """
+
+    def __init__(self, position: CheckersPosition, player: int, pending: int = -1, time_limit: float = 0.5, node_limit: int = 0, table: TranspositionTable = table) -> None:
+        """
+        Constructor
+
+        Args:
+            position: position to be searched, it is copied so the original is never modified
+            player: player number to move
+            pending: square of the piece that has to continue a multi-jump, -1 if there is none
+            time_limit: maximum number of seconds the search can take, 0 for unlimited
+            node_limit: maximum number of positions the search can visit, 0 for unlimited
+            table: transposition table used by the search
+        """
+
+        self.position = position.copy()
+        self.player = player
+        self.pending = pending
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+        self.table = table
+        self.nodes = 0
+        self.deadline = 0.0
+        self.limited = False
+        self.root_move: Optional[Tuple[int,int,int]] = None
+
+    def search(self, max_depth: int = MAX_DEPTH) -> SearchResult:
+        """
+        Search the position with iterative deepening until the budget is used up or the result is proven
+
+        Args:
+            max_depth: maximum depth to be searched
+
+        Returns:
+            the best move found by the deepest completed iteration, as a (starting position, next position) tuple
+        """
+
+        start = perf_counter()
+        self.deadline = start + self.time_limit
+        self.table.new_search()
+
+        moves = self.generate_moves(self.player, self.pending)
+
+        if not moves:
+            raise RuntimeError("There are no moves to be played")
+
+        best_move, best_score, depth = moves[0], 0, 0
+
+        # play the only move straight away
+        if len(moves) > 1:
+            key = zobrist(self.position, self.player, self.pending)
+
+            for current_depth in range(1, max_depth + 1):
+                # the first iteration always completes so that there is always a move to play
+                self.limited = current_depth > 1
+
+                try:
+                    score = self.negamax(self.player, self.pending, key, current_depth, -WIN_SCORE, WIN_SCORE, 0)
+                except SearchTimeout:
+                    break
+
+                best_move, best_score, depth = self.root_move, score, current_depth
+
+                # stop once a win or a loss has been proven
+                if abs(best_score) > MATE_BOUND:
+                    break
+
+        return SearchResult((SQUARES[best_move[0]], SQUARES[best_move[1]]), best_score, depth, self.nodes, perf_counter() - start)
+
+    def generate_moves(self, player: int, pending: int) -> List[Tuple[int,int,int]]:
+        """
+        Generate the moves a player is allowed to play, captures being forced
+
+        Args:
+            player: player number to move
+            pending: square of the piece that has to continue a multi-jump, -1 if there is none
+
+        Returns:
+            list of (starting square, landing square, captured square) tuples
+        """
+
+        if pending >= 0:
+            return self.position.captures(player, 1 << pending)
+
+        return self.position.captures(player) or self.position.quiet_moves(player)
+
+    def negamax(self, player: int, pending: int, key: int, depth: int, alpha: int, beta: int, ply: int) -> int:
+        """
+        Score a position with alpha-beta pruning
+
+        Args:
+            player: player number to move
+            pending: square of the piece that has to continue a multi-jump, -1 if there is none
+            key: zobrist hash of the position
+            depth: remaining depth to be searched
+            alpha: score the player to move is already guaranteed
+            beta: score the opponent is already guaranteed
+            ply: number of moves played since the root
+
+        Returns:
+            score of the position from the point of view of the player to move
+        """
+
+        self.nodes += 1
+        if self.limited and not self.nodes & 1023:
+            self.check_budget()
+
+        position = self.position
+        moves = self.generate_moves(player, pending)
+
+        if not moves:
+            return -(WIN_SCORE - ply)
+
+        # quiescence: once the depth is used up, only keep searching while the captures are forced
+        if depth <= 0 and moves[0][2] < 0:
+            return self.evaluate(player)
+
+        alpha_original = alpha
+        entry = self.table.get(key)
+        hash_move = None
+
+        if entry is not None:
+            _, _, entry_depth, flag, score, hash_move = entry
+            if entry_depth >= depth and ply > 0:
+                score = score - ply if score > MATE_BOUND else score + ply if score < -MATE_BOUND else score
+
+                if flag == EXACT:
+                    return score
+                elif flag == LOWER:
+                    alpha = max(alpha, score)
+                else:
+                    beta = min(beta, score)
+
+                if alpha >= beta:
+                    return score
+
+        best_score, best_move = -WIN_SCORE - 1, None
+        opponent = 3 - player
+        men, kings = position.men, position.kings
+
+        for move in self.order_moves(player, moves, hash_move):
+            start, end, captured = move
+            saved = (men[1], men[2], kings[1], kings[2])
+
+            was_king = bool(kings[player] >> start & 1)
+            captured_king = captured >= 0 and bool(kings[opponent] >> captured & 1)
+            crowned = position.move(player, start, end, captured)
+
+            child_key = key ^ piece_key(player, was_king, start) ^ piece_key(player, was_king or crowned, end)
+            if pending >= 0:
+                child_key ^= PENDING_KEYS[pending]
+            if captured >= 0:
+                child_key ^= piece_key(opponent, captured_king, captured)
+
+            # the game is over as soon as a player cannot move
+            can_move, opponent_can_move = position.has_moves(player), position.has_moves(opponent)
+
+            if not can_move or not opponent_can_move:
+                if can_move:
+                    score = WIN_SCORE - ply - 1
+                elif opponent_can_move:
+                    score = -(WIN_SCORE - ply - 1)
+                else:
+                    score = 0
+
+            # the same player keeps capturing, with the same piece if it can
+            elif captured >= 0 and position.can_capture(player, 1 << end):
+                score = self.negamax(player, end, child_key ^ PENDING_KEYS[end], depth, alpha, beta, ply + 1)
+            elif captured >= 0 and position.can_capture(player):
+                score = self.negamax(player, -1, child_key, depth, alpha, beta, ply + 1)
+
+            else:
+                score = -self.negamax(opponent, -1, child_key ^ SIDE_KEY, depth - 1, -beta, -alpha, ply + 1)
+
+            men[1], men[2], kings[1], kings[2] = saved
+
+            if score > best_score:
+                best_score, best_move = score, move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+
+        if ply == 0:
+            self.root_move = best_move
+
+        if best_score <= alpha_original:
+            flag = UPPER
+        elif best_score >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+
+        stored = best_score + ply if best_score > MATE_BOUND else best_score - ply if best_score < -MATE_BOUND else best_score
+        self.table.put(key, depth, flag, stored, best_move)
+
+        return best_score
+
+    def order_moves(self, player: int, moves: List[Tuple[int,int,int]], hash_move: Optional[Tuple[int,int,int]]) -> List[Tuple[int,int,int]]:
+        """
+        Order the moves so that the ones most likely to be the best are searched first
+
+        Args:
+            player: player number to move
+            moves: moves to be ordered
+            hash_move: best move stored in the transposition table, None if there is none
+
+        Returns:
+            moves to be searched, in order
+        """
+
+        if len(moves) == 1:
+            return moves
+
+        men, kings = self.position.men[player], self.position.kings[3 - player]
+
+        def order(move: Tuple[int,int,int]) -> int:
+            start, end, captured = move
+
+            if move == hash_move:
+                return 0
+
+            # captures of kings, then crowning moves, then everything else
+            if captured >= 0 and kings >> captured & 1:
+                return 1
+            if men >> start & 1 and PROMOTION_ROWS >> end & 1:
+                return 2
+            return 3
+
+        return sorted(moves, key=order)
+
+    def evaluate(self, player: int) -> int:
+        """
+        Statically score a position from the material and the advancement of the men
+
+        Args:
+            player: player number to move
+
+        Returns:
+            score of the position from the point of view of the player to move
+        """
+
+        position = self.position
+        scores = [0, 0, 0]
+
+        for owner in (1, 2):
+            man_scores = MAN_SCORES[owner]
+            men = position.men[owner]
+
+            while men:
+                bit = men & -men
+                men ^= bit
+                scores[owner] += man_scores[bit.bit_length() - 1]
+
+            scores[owner] += KING_VALUE * bin(position.kings[owner]).count("1")
+
+        return scores[player] - scores[3 - player]
+
+    def check_budget(self) -> None:
+        """
+        Stop the search if the time or node budget has been used up
+
+        Raises:
+            SearchTimeout: the budget has been used up
+        """
+
+        if self.node_limit and self.nodes >= self.node_limit:
+            raise SearchTimeout()
+
+        if self.time_limit and perf_counter() >= self.deadline:
+            raise SearchTimeout()
+
+def pending_piece(game: Checkers) -> int:
+    """
+    Find the piece that has to continue a multi-jump in a checkers game
+
+    Args:
+        game: the instance of checkers game
+
+    Returns:
+        square of the piece, -1 if the player to move is free to choose the piece
+    """
+
+    return SQUARE_INDEXES[game.pending] if game.pending is not None else -1
+
+def search(game: Checkers, time_limit: float = 0.5, node_limit: int = 0, max_depth: int = MAX_DEPTH) -> SearchResult:
+    """
+    Search the best move for the player to move in a checkers game
+
+    Args:
+        game: the instance of checkers game the move should be calculated against
+        time_limit: maximum number of seconds the search can take, 0 for unlimited
+        node_limit: maximum number of positions the search can visit, 0 for unlimited
+        max_depth: maximum depth to be searched
+
+    Returns:
+        the result of the search
+    """
+
+    return Searcher(game.position, game.current_player, pending_piece(game), time_limit, node_limit).search(max_depth)
+
+def best_move(game: Checkers, time_limit: float = 0.5, node_limit: int = 0, max_depth: int = MAX_DEPTH) -> Tuple[Tuple[int,int],Tuple[int,int]]:
+    """
+    Get the best move for the player to move in a checkers game
+
+    Args:
+        game: the instance of checkers game the move should be calculated against
+        time_limit: maximum number of seconds the search can take, 0 for unlimited
+        node_limit: maximum number of positions the search can visit, 0 for unlimited
+        max_depth: maximum depth to be searched
+
+    Returns:
+        tuple containing the starting position and the next position
+    """
+
+    return search(game, time_limit, node_limit, max_depth).move
+
+def snapshot(game: Checkers) -> Tuple[int,int,int,int,int,int]:
+    """
+    Take a compact copy of a checkers game that can be sent to another process
+
+    Args:
+        game: the instance of checkers game
+
+    Returns:
+        tuple containing the men and kings bitboards of both players, the player to move, and the piece that has to
+        continue a multi-jump
+    """
+
+    position = game.position
+    return (position.men[1], position.men[2], position.kings[1], position.kings[2], game.current_player, pending_piece(game))
+
+def think(snapshot: Tuple[int,int,int,int,int,int], time_limit: float, node_limit: int) -> Tuple[Tuple[int,int],Tuple[int,int]]:
+    """
+    Get the best move for the player to move in a snapshot of a checkers game. Run by the workers of the bot pool,
+    which keep their own transposition table between moves
+
+    Args:
+        snapshot: snapshot of the game taken with snapshot()
+        time_limit: maximum number of seconds the search can take, 0 for unlimited
+        node_limit: maximum number of positions the search can visit, 0 for unlimited
+
+    Returns:
+        tuple containing the starting position and the next position
+    """
+
+    position = CheckersPosition()
+    position.men[1], position.men[2], position.kings[1], position.kings[2], player, pending = snapshot
+
+    return Searcher(position, player, pending, time_limit, node_limit).search().move
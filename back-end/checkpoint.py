@@ -0,0 +1,273 @@
+import gc
+import os
+import struct
+from checkers import Checkers, CheckersPosition, Piece, SQUARE_INDEXES, SQUARES
+from connect4 import Connect4, Connect4Position, ThreatEvaluator
+from game import BoardGame, Player
+from time import monotonic, time
+from typing import Iterable, List, Tuple
+
+# a checkpoint starts with a header, followed by one record per room: the state of the room and its board, the room ID,
+# then its players
+MAGIC = b"BGCK"
+VERSION = 1
+
+GAME_TYPES = ("connect-4", "checkers")
+
+# flags of the rooms
+PUBLIC = 1
+STARTED = 2
+OVER = 4
+
+HEADER = struct.Struct("<4sBdI") # magic, version, timestamp, number of rooms
+# both start with the game type, flags, current player, number of players, used player numbers, reset votes, sequence
+# and length of the room ID. Connect 4 rooms go on with the bitboards of both players and the number of moves played,
+# checkers rooms with the men and kings of both players and the square of the piece continuing a multi-jump or -1
+CONNECT4_ROOM = struct.Struct("<BBBBBBIHQQB")
+CHECKERS_ROOM = struct.Struct("<BBBBBBIHIIIIb")
+PLAYER = struct.Struct("<BBHH") # player number, whether it is the bot, length of the nickname, length of the session token
+
+Room = Tuple[str,bool,BoardGame]
+
+def mask(numbers: Iterable[int]) -> int:
+    """
+    Pack player numbers into a bit mask
+
+    Args:
+        numbers: player numbers
+
+    Returns:
+        mask with the bit of every player number set
+    """
+
+    bits = 0
+
+    for number in numbers:
+        bits |= 1 << number
+
+    return bits
+
+def numbers(bits: int) -> List[int]:
+    """
+    Unpack player numbers from a bit mask
+
+    Args:
+        bits: mask built by mask()
+
+    Returns:
+        player numbers, in increasing order
+    """
+
+    return [number for number in range(1, 8) if bits >> number & 1]
+
+def dump(rooms: Iterable[Room]) -> bytes:
+    """
+    Serialise the state of rooms in one pass
+
+    Args:
+        rooms: (game type, whether the room is public, Game instance) of every room
+
+    Returns:
+        the checkpoint
+    """
+
+    records = bytearray()
+    count = 0
+
+    for game_type, is_public, room in rooms:
+        room_id = room.room_id.encode()
+        flags = (PUBLIC if is_public else 0) | (STARTED if room.started else 0) | (OVER if room.is_over else 0)
+        used = mask(room.used_player_numbers)
+
+        # the bot votes for a rematch with its Player instance, the players with their player number
+        votes = mask(vote.id if isinstance(vote, Player) else vote for vote in room.vote_reset) if room.vote_reset else 0
+
+        # the room and its board are packed at once, the room ID follows them
+        if game_type == "connect-4":
+            position = room.position
+            records += CONNECT4_ROOM.pack(0, flags, room.current_player, len(room.connections), used, votes, room.sequence, len(room_id), position.bitboards[1], position.bitboards[2], position.moves)
+        else:
+            position = room.position
+            pending = SQUARE_INDEXES[room.pending] if room.pending else -1
+            records += CHECKERS_ROOM.pack(1, flags, room.current_player, len(room.connections), used, votes, room.sequence, len(room_id), position.men[1], position.men[2], position.kings[1], position.kings[2], pending)
+
+        records += room_id
+
+        for player in room.connections:
+            nickname, token = player.nickname.encode()[:0xFFFF], player.token.encode()
+            records += PLAYER.pack(player.id, player is room.dummy_plug, len(nickname), len(token))
+            records += nickname
+            records += token
+
+        count += 1
+
+    return HEADER.pack(MAGIC, VERSION, time(), count) + records
+
+def load(data: bytes) -> List[Room]:
+    """
+    Rebuild the rooms of a checkpoint. The players of the restored rooms are away until they reconnect with their
+    session token, except for the bots
+
+    Args:
+        data: checkpoint built by dump()
+
+    Raises:
+        ValueError: the data is not a checkpoint of this version
+
+    Returns:
+        (game type, whether the room is public, Game instance) of every room
+    """
+
+    if len(data) < HEADER.size:
+        raise ValueError("Not a checkpoint")
+
+    magic, version, _, count = HEADER.unpack_from(data)
+
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a checkpoint")
+
+    offset = HEADER.size
+    rooms = []
+    now = monotonic()
+
+    for _ in range(count):
+        game_type = GAME_TYPES[data[offset]]
+        layout = CONNECT4_ROOM if game_type == "connect-4" else CHECKERS_ROOM
+        _, flags, current_player, players, used, votes, sequence, length, *board = layout.unpack_from(data, offset)
+        offset += layout.size
+        room_id = data[offset:offset + length].decode()
+        offset += length
+        room = Connect4(room_id) if game_type == "connect-4" else Checkers(room_id, setup=False)
+
+        room.started = bool(flags & STARTED)
+        room.is_over = bool(flags & OVER)
+        room.current_player = current_player
+        room.sequence = sequence
+        room.used_player_numbers = numbers(used)
+        room.unused_player_numbers = [number for number in range(1, 3) if number not in room.used_player_numbers]
+
+        if game_type == "connect-4":
+            room.position.bitboards[1], room.position.bitboards[2], room.position.moves = board
+            restore_connect4(room)
+        else:
+            men1, men2, kings1, kings2, pending = board
+            restore_checkers(room, (0, men1, men2), (0, kings1, kings2), pending)
+
+        for _ in range(players):
+            number, is_bot, nickname_length, token_length = PLAYER.unpack_from(data, offset)
+            offset += PLAYER.size
+            nickname = data[offset:offset + nickname_length].decode()
+            offset += nickname_length
+            token = data[offset:offset + token_length].decode()
+            offset += token_length
+
+            player = Player(number, nickname, None, None, room_id, token)
+
+            if is_bot:
+                room.dummy_plug = player
+            else:
+                player.away = now
+                player.seen = sequence
+
+            room.connections.append(player)
+
+        room.vote_reset = {room.dummy_plug if room.dummy_plug and room.dummy_plug.id == number else number for number in numbers(votes)}
+        rooms.append((game_type, bool(flags & PUBLIC), room))
+
+    return rooms
+
+def restore_connect4(room: Connect4) -> None:
+    """
+    Rebuild the board and the evaluator of a connect 4 game from its bitboards
+
+    Args:
+        room: the instance of connect 4 game, whose position was restored
+    """
+
+    position = room.position
+    position.mask = position.bitboards[1] | position.bitboards[2]
+    room.evaluator = ThreatEvaluator.from_position(position)
+
+    for player in (1, 2):
+        bitboard = position.bitboards[player]
+
+        while bitboard:
+            move = bitboard & -bitboard
+            x, y = Connect4Position.to_coordinates(move)
+            room.board[x][y] = player
+            bitboard ^= move
+
+def restore_checkers(room: Checkers, men: Tuple[int,int,int], kings: Tuple[int,int,int], pending: int) -> None:
+    """
+    Rebuild the board and the moves of a checkers game from its bitboards
+
+    Args:
+        room: the instance of checkers game, created without setting up its pieces
+        men: bitboard of the men of each player, indexed by player number
+        kings: bitboard of the kings of each player, indexed by player number
+        pending: square of the piece that has to continue a multi-jump, -1 if there is none
+    """
+
+    for player in (1, 2):
+        pieces = men[player] | kings[player]
+
+        while pieces:
+            square = (pieces & -pieces).bit_length() - 1
+            x, y = SQUARES[square]
+            room.board[x][y] = Piece(player)
+            room.board[x][y].is_king = bool(kings[player] >> square & 1)
+            pieces &= pieces - 1
+
+    room.position = CheckersPosition()
+    room.position.men, room.position.kings = list(men), list(kings)
+    room.pending = SQUARES[pending] if pending >= 0 else None
+    room.calculate_all_moves(room.pending)
+
+def save(path: str, rooms: Iterable[Room]) -> int:
+    """
+    Write a checkpoint of rooms, replacing the previous one at once so that a crash never leaves half a checkpoint
+
+    Args:
+        path: path of the checkpoint file
+        rooms: (game type, whether the room is public, Game instance) of every room
+
+    Returns:
+        size of the checkpoint in bytes
+    """
+
+    data = dump(rooms)
+
+    with open(f"{path}.tmp", "wb") as checkpoint:
+        checkpoint.write(data)
+
+    os.replace(f"{path}.tmp", path)
+    return len(data)
+
+def restore(path: str) -> List[Room]:
+    """
+    Read the rooms of a checkpoint, and remove it so that the same rooms are not restored twice
+
+    Args:
+        path: path of the checkpoint file
+
+    Returns:
+        (game type, whether the room is public, Game instance) of every room, empty if there is no checkpoint
+    """
+
+    try:
+        with open(path, "rb") as checkpoint:
+            data = checkpoint.read()
+    except FileNotFoundError:
+        return []
+
+    os.remove(path)
+
+    # the rooms are only allocated while loading, so the collector would go through the growing heap for nothing
+    collecting = gc.isenabled()
+    gc.disable()
+
+    try:
+        return load(data)
+    finally:
+        if collecting:
+            gc.enable()
@@ -1,5 +1,414 @@
 from game import BoardGame, Player
-from typing import Tuple
+from tracing import traced
+from typing import List, Tuple
+
+# dimensions of the bitboard, every column uses HEIGHT+1 bits
+WIDTH = 7
+HEIGHT = 6
+H1 = HEIGHT + 1
+
+class Connect4Position:
+    """
+    Bitboard representation of a connect 4 board
+
+    Every column takes 7 bits of an integer: the bottom 6 bits are the squares of the column (bottom to top),
+    and the 7th bit is an always empty sentinel so that alignments can never wrap around to the next column.
+
+    Attributes:
+        WIDTH: number of columns in the board
+        HEIGHT: number of rows in the board
+        H1: number of bits used by each column (HEIGHT + sentinel)
+        BOTTOM_MASKS: bitboard of the bottom square of each column
+        BOTTOM_MASK: bitboard of the bottom square of all columns
+        TOP_MASKS: bitboard of the top square of each column
+        COLUMN_MASKS: bitboard of all the squares of each column
+        BOARD_MASK: bitboard of all the playable squares
+        bitboards: bitboard of the squares occupied by each player, indexed by player number (index 0 is unused)
+        mask: bitboard of all the occupied squares
+        moves: number of pieces played so far
+    """
+
+    WIDTH = WIDTH
+    HEIGHT = HEIGHT
+    H1 = H1
+
+    BOTTOM_MASKS = tuple(1 << (col*H1) for col in range(WIDTH))
+    BOTTOM_MASK = sum(BOTTOM_MASKS)
+    TOP_MASKS = tuple(1 << (HEIGHT-1 + col*H1) for col in range(WIDTH))
+    COLUMN_MASKS = tuple(((1 << HEIGHT) - 1) << (col*H1) for col in range(WIDTH))
+    BOARD_MASK = sum(COLUMN_MASKS)
+
+    __slots__ = ("bitboards", "mask", "moves")
+
+    def __init__(self) -> None:
+        """
+        Constructor to instantiate an empty board
+        """
+
+        self.bitboards = [0, 0, 0]
+        self.mask = 0
+        self.moves = 0
+
+    def can_play(self, column: int) -> bool:
+        """
+        Check if a piece can be dropped in the column
+
+        Args:
+            column: column the piece would be dropped in
+
+        Returns:
+            True if the column is not full, False otherwise
+        """
+
+        return not self.mask & Connect4Position.TOP_MASKS[column]
+
+    def play(self, player: int, column: int) -> int:
+        """
+        Drop a piece in the column. Assumes that the column can be played
+
+        Args:
+            player: player number dropping the piece
+            column: column the piece is dropped in
+
+        Returns:
+            bitboard with only the square of the dropped piece set
+        """
+
+        # adding the bottom bit to the column carries into the first empty square of the column
+        move = (self.mask + Connect4Position.BOTTOM_MASKS[column]) & Connect4Position.COLUMN_MASKS[column]
+
+        self.bitboards[player] |= move
+        self.mask |= move
+        self.moves += 1
+
+        return move
+
+    def undo(self, player: int, move: int) -> None:
+        """
+        Take back a piece previously dropped with play
+
+        Args:
+            player: player number who dropped the piece
+            move: bitboard returned by play
+        """
+
+        self.bitboards[player] ^= move
+        self.mask ^= move
+        self.moves -= 1
+
+    def is_winning(self, player: int) -> bool:
+        """
+        Check if the player has 4 connected pieces in any direction
+
+        Args:
+            player: player number to be checked
+
+        Returns:
+            True if the player has won, False otherwise
+        """
+
+        return Connect4Position.has_alignment(self.bitboards[player])
+
+    def is_full(self) -> bool:
+        """
+        Check if every square of the board is occupied
+
+        Returns:
+            True if the board is full, False otherwise
+        """
+
+        return self.mask == Connect4Position.BOARD_MASK
+
+    def key(self, player: int) -> int:
+        """
+        Get a unique key of the position as seen by the player to move
+
+        Args:
+            player: player number that is about to move
+
+        Returns:
+            integer that uniquely identifies the position and the player to move
+        """
+
+        return self.bitboards[player] + self.mask
+
+    def copy(self) -> "Connect4Position":
+        """
+        Create an independent copy of the position, so that it can be searched without touching the game
+
+        Returns:
+            new Connect4Position instance with the same pieces
+        """
+
+        position = Connect4Position()
+        position.bitboards = self.bitboards[:]
+        position.mask = self.mask
+        position.moves = self.moves
+
+        return position
+
+    def possible(self) -> int:
+        """
+        Get the squares where a piece can currently be dropped
+
+        Returns:
+            bitboard with the first empty square of every non-full column set
+        """
+
+        return (self.mask + Connect4Position.BOTTOM_MASK) & Connect4Position.BOARD_MASK
+
+    def winning_squares(self, player: int) -> int:
+        """
+        Get the empty squares that would complete 4 connected pieces for the player
+
+        Args:
+            player: player number to be checked
+
+        Returns:
+            bitboard of the winning squares, including the ones that cannot be played yet
+        """
+
+        return Connect4Position.find_winning_squares(self.bitboards[player], self.mask)
+
+    @staticmethod
+    def find_winning_squares(bitboard: int, mask: int) -> int:
+        """
+        Get the empty squares that would complete 4 aligned squares of a bitboard
+
+        Args:
+            bitboard: bitboard of the pieces of one player
+            mask: bitboard of all the occupied squares
+
+        Returns:
+            bitboard of the winning squares
+        """
+
+        # vertical alignments can only be completed from the top
+        squares = (bitboard << 1) & (bitboard << 2) & (bitboard << 3)
+
+        # horizontal, and both diagonals: the empty square can be at any of the 4 places of the alignment
+        for shift in (Connect4Position.H1, Connect4Position.H1-1, Connect4Position.H1+1):
+            pairs = (bitboard << shift) & (bitboard << 2*shift)
+            squares |= pairs & (bitboard << 3*shift)
+            squares |= pairs & (bitboard >> shift)
+            pairs = (bitboard >> shift) & (bitboard >> 2*shift)
+            squares |= pairs & (bitboard << shift)
+            squares |= pairs & (bitboard >> 3*shift)
+
+        return squares & (Connect4Position.BOARD_MASK ^ mask)
+
+    @staticmethod
+    def has_alignment(bitboard: int) -> bool:
+        """
+        Check if a bitboard contains 4 aligned squares
+
+        Args:
+            bitboard: bitboard to be checked
+
+        Returns:
+            True if 4 aligned squares are found, False otherwise
+        """
+
+        # vertical, horizontal, and both diagonals
+        for shift in (1, Connect4Position.H1, Connect4Position.H1-1, Connect4Position.H1+1):
+            pairs = bitboard & (bitboard >> shift)
+            if pairs & (pairs >> (2*shift)):
+                return True
+
+        return False
+
+    @staticmethod
+    def to_coordinates(move: int) -> Tuple[int,int]:
+        """
+        Convert a bitboard with a single square set to the (column, row) coordinates used by the board
+
+        Args:
+            move: bitboard returned by play
+
+        Returns:
+            the column, and the row counted from the top of the board
+        """
+
+        column, height = divmod(move.bit_length() - 1, Connect4Position.H1)
+        return (column, Connect4Position.HEIGHT - 1 - height)
+
+def find_windows() -> List[int]:
+    """
+    Find every line of 4 squares a player can connect on the bitboard
+
+    Returns:
+        list of bitboards with the 4 squares of each line set
+    """
+
+    windows = []
+
+    # vertical, horizontal, and both diagonals as (column step, height step)
+    for step_col, step_height in ((0,1), (1,0), (1,1), (1,-1)):
+        for col in range(WIDTH):
+            for height in range(HEIGHT):
+                squares = [(col + i*step_col, height + i*step_height) for i in range(4)]
+
+                if all(0 <= c < WIDTH and 0 <= h < HEIGHT for c, h in squares):
+                    windows.append(sum(1 << (c*H1 + h) for c, h in squares))
+
+    return windows
+
+# lines of 4 squares, and the indexes of the lines going through each bit of the bitboard
+WINDOWS = find_windows()
+SQUARE_WINDOWS = [tuple(i for i, window in enumerate(WINDOWS) if window >> bit & 1) for bit in range(WIDTH*H1)]
+
+class ThreatEvaluator:
+    """
+    Class used to score a connect 4 position from the lines of 4 squares that are still open for each player
+
+    A line is open for a player when the opponent has no piece in it. The number of open lines holding 2 and 3
+    pieces of each player is updated incrementally whenever a piece is added or removed, so only the lines going
+    through that square are visited and the score itself is read in constant time.
+
+    Attributes:
+        WINDOWS: bitboards of the 69 lines of 4 squares on the board
+        SQUARE_WINDOWS: indexes of the lines going through each bit of the bitboard
+        TWO_WEIGHT: score of an open line holding 2 pieces
+        THREE_WEIGHT: score of an open line holding 3 pieces
+        pieces: number of pieces of each player in every line, indexed by player number then line
+        twos: number of open lines holding 2 pieces, indexed by player number
+        threes: number of open lines holding 3 pieces, indexed by player number
+    """
+
+    WINDOWS = WINDOWS
+    SQUARE_WINDOWS = SQUARE_WINDOWS
+
+    TWO_WEIGHT = 1
+    THREE_WEIGHT = 4
+
+    __slots__ = ("pieces", "twos", "threes")
+
+    def __init__(self) -> None:
+        """
+        Constructor to instantiate an evaluator for an empty board
+        """
+
+        self.pieces = [[0]*len(ThreatEvaluator.WINDOWS) for _ in range(3)]
+        self.twos = [0, 0, 0]
+        self.threes = [0, 0, 0]
+
+    @classmethod
+    def from_position(cls, position: Connect4Position) -> "ThreatEvaluator":
+        """
+        Create an evaluator matching the pieces of a position
+
+        Args:
+            position: position to be evaluated
+
+        Returns:
+            new ThreatEvaluator instance
+        """
+
+        evaluator = cls()
+
+        for player in (1, 2):
+            bitboard = position.bitboards[player]
+            while bitboard:
+                move = bitboard & -bitboard
+                evaluator.add(player, move)
+                bitboard ^= move
+
+        return evaluator
+
+    def copy(self) -> "ThreatEvaluator":
+        """
+        Create an independent copy of the evaluator
+
+        Returns:
+            new ThreatEvaluator instance with the same counts
+        """
+
+        evaluator = ThreatEvaluator()
+        evaluator.pieces = [pieces[:] for pieces in self.pieces]
+        evaluator.twos = self.twos[:]
+        evaluator.threes = self.threes[:]
+
+        return evaluator
+
+    def add(self, player: int, move: int) -> None:
+        """
+        Update the counts after a piece was dropped
+
+        Args:
+            player: player number who dropped the piece
+            move: bitboard with only the square of the dropped piece set
+        """
+
+        mine, theirs = self.pieces[player], self.pieces[3 - player]
+
+        for window in ThreatEvaluator.SQUARE_WINDOWS[move.bit_length() - 1]:
+            count = mine[window]
+            mine[window] = count + 1
+
+            # the line was open for the opponent, and is now closed to them
+            if count == 0:
+                if theirs[window] == 2:
+                    self.twos[3 - player] -= 1
+                elif theirs[window] == 3:
+                    self.threes[3 - player] -= 1
+
+            # the line is still open for the player, move it to the next count
+            if theirs[window] == 0:
+                if count == 1:
+                    self.twos[player] += 1
+                elif count == 2:
+                    self.twos[player] -= 1
+                    self.threes[player] += 1
+                elif count == 3:
+                    self.threes[player] -= 1
+
+    def remove(self, player: int, move: int) -> None:
+        """
+        Update the counts after a piece was taken back
+
+        Args:
+            player: player number who dropped the piece
+            move: bitboard with only the square of the removed piece set
+        """
+
+        mine, theirs = self.pieces[player], self.pieces[3 - player]
+
+        for window in ThreatEvaluator.SQUARE_WINDOWS[move.bit_length() - 1]:
+            count = mine[window] - 1
+            mine[window] = count
+
+            # the line is open again for the opponent
+            if count == 0:
+                if theirs[window] == 2:
+                    self.twos[3 - player] += 1
+                elif theirs[window] == 3:
+                    self.threes[3 - player] += 1
+
+            # the line is still open for the player, move it back to the previous count
+            if theirs[window] == 0:
+                if count == 1:
+                    self.twos[player] -= 1
+                elif count == 2:
+                    self.twos[player] += 1
+                    self.threes[player] -= 1
+                elif count == 3:
+                    self.threes[player] += 1
+
+    def score(self, player: int) -> int:
+        """
+        Score the position from the open lines of both players
+
+        Args:
+            player: player number the score is computed for
+
+        Returns:
+            score of the position from the point of view of the player
+        """
+
+        opponent = 3 - player
+
+        return (ThreatEvaluator.THREE_WEIGHT * (self.threes[player] - self.threes[opponent])
+                + ThreatEvaluator.TWO_WEIGHT * (self.twos[player] - self.twos[opponent]))
 
 class Connect4(BoardGame):
     """
@@ -14,6 +423,8 @@ class Connect4(BoardGame):
         SOUTHWEST: relative coordinate to the adjacent square to the southwest
         NORTHEAST: relative coordinate to the adjacent square to the northeast
         SOUTHEAST: relative coordinate to the adjacent square to the southeast
+        position: bitboard representation of the board, used for move and win detection
+        evaluator: open line counts of the board, used by the bot to score positions
     """
 
     NORTH = (0,1)
@@ -28,13 +439,23 @@ class Connect4(BoardGame):
     def __init__(self, room_id : str) -> None:
         """
         Constructor
-        
+
         Args:
             room_id: ID of the game being created
         """
-        
+
         super().__init__(room_id, 2, 6, 7) # call the superclass' constructor
 
+    def create_board(self) -> None:
+        """
+            Create a fresh board initialised with 0's, and a matching empty bitboard and evaluator
+        """
+
+        super().create_board()
+        self.position = Connect4Position()
+        self.evaluator = ThreatEvaluator()
+
+    @traced("connect-4.make_move")
     def make_move(self, player: int, column: int) -> Tuple[int, Tuple[int,int]]:
         """
         Allow a player to make a move on the connect 4 board
@@ -52,29 +473,37 @@ class Connect4(BoardGame):
 
         if player != self.current_player:
             raise RuntimeError("It is not your turn yet")
-        
-        # loop through all squares in a column, find the first instance where it is 0 i.e. empty
-        for i in reversed(range(self.dimensions["row"])):
-            if self.board[column][i] == 0:
-                self.board[column][i] = self.current_player
-                coordinates = (column, i)
-                break
-        else:
-            # check if no zero were found
+
+        if not 0 <= column < self.dimensions["col"]:
+            raise RuntimeError("The selected column does not exist")
+
+        if not self.position.can_play(column):
             raise RuntimeError("The selected column is full")
 
+        # drop the piece on the bitboard, then mirror it on the evaluator and the board
+        move = self.position.play(player, column)
+        self.evaluator.add(player, move)
+        coordinates = Connect4Position.to_coordinates(move)
+        self.board[coordinates[0]][coordinates[1]] = player
+
         winner = 0
-        
+
         # set the winner and is_over if the move played was a winning move
-        if self.count_all_consecutive(player, coordinates[0], coordinates[1]) >= 3:
+        if self.position.is_winning(player):
             winner = self.current_player
             self.is_over = True
-        
+
         # otherwise, set winner as 3 i.e. draw and set is_over
-        elif self.board_is_full():
+        elif self.position.is_full():
             winner = 3
             self.is_over = True
-        
+
+        if self.log:
+            self.log.move(player, column)
+
+            if winner:
+                self.log.end(winner)
+
         self.next_turn() # change to next turn
 
         return (winner, coordinates)
@@ -94,7 +523,7 @@ class Connect4(BoardGame):
             True if the board is full, False otherwise
         """
 
-        return all(self.board[i][0] for i in range(self.dimensions["col"]))
+        return self.position.is_full()
 
     def count_all_consecutive(self, player: int, x: int, y: int) -> int:
         """
@@ -106,11 +535,11 @@ class Connect4(BoardGame):
         Returns:
             the count of the maximum consecutive connected pieces
         """
-        
+
         return max([
-            self.count_consecutive(player,x,y, Connect4.SOUTH) + self.count_consecutive(player,x,y, Connect4.NORTH), 
-            self.count_consecutive(player,x,y, Connect4.WEST) + self.count_consecutive(player,x,y, Connect4.EAST), 
-            self.count_consecutive(player,x,y, Connect4.SOUTHWEST) + self.count_consecutive(player,x,y, Connect4.NORTHEAST), 
+            self.count_consecutive(player,x,y, Connect4.SOUTH) + self.count_consecutive(player,x,y, Connect4.NORTH),
+            self.count_consecutive(player,x,y, Connect4.WEST) + self.count_consecutive(player,x,y, Connect4.EAST),
+            self.count_consecutive(player,x,y, Connect4.SOUTHWEST) + self.count_consecutive(player,x,y, Connect4.NORTHEAST),
             self.count_consecutive(player,x,y, Connect4.SOUTHEAST) + self.count_consecutive(player,x,y, Connect4.NORTHWEST)
             ])
 
@@ -127,19 +556,14 @@ class Connect4(BoardGame):
         Returns:
             count of all consecutive player numbers stemming from the first call
         """
-        
-        # find the new x and y to the specified direction
-        new_x = x + direction[0]
-        new_y = y + direction[1]
 
-        if new_x < 0 or new_y < 0: return 0
+        count = 0
+        col, row = self.dimensions["col"], self.dimensions["row"]
 
-        # if it is a valid coordinate and the square is the same as current player number, then check further
-        try:
-            if self.board[new_x][new_y] == player:
-                return 1 + self.count_consecutive(player, new_x,new_y,direction)
+        # walk towards the specified direction while the squares are on the board and match the player number
+        x, y = x + direction[0], y + direction[1]
+        while 0 <= x < col and 0 <= y < row and self.board[x][y] == player:
+            count += 1
+            x, y = x + direction[0], y + direction[1]
 
-        except IndexError:
-            pass
-        
-        return 0
\ No newline at end of file
+        return count
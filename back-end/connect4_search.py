@@ -0,0 +1,436 @@
+from connect4 import Connect4, Connect4Position, ThreatEvaluator
+from search import SearchResult, SearchTimeout
+from time import perf_counter
+from typing import List, Optional, Tuple
+
+WIN_SCORE = 10000 # score of a win, the number of moves played before the win is subtracted to prefer faster wins
+MAX_MOVES = Connect4Position.WIDTH * Connect4Position.HEIGHT
+CENTER_ORDER = (3, 2, 4, 1, 5, 0, 6) # columns closer to the center are usually better, so search them first
+
+# flags of the transposition table entries
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+def popcount(bitboard: int) -> int:
+    """
+    Count the number of squares set in a bitboard
+
+    Args:
+        bitboard: bitboard to be counted
+
+    Returns:
+        number of squares set
+    """
+
+    return bin(bitboard).count("1")
+
+class TranspositionTable:
+    """
+    Fixed size hash table storing the results of previously searched positions
+
+    Entries are indexed by the position key modulo the size of the table. On a collision the entry of the current
+    search is only replaced by an entry searched at least as deep, while entries of previous searches are always replaced.
+
+    Attributes:
+        size: number of entries the table can hold
+        entries: list of (key, generation, depth, flag, score, move) tuples, or None for empty slots
+        generation: number of the current search
+    """
+
+    def __init__(self, size: int = 1 << 18) -> None:
+        """
+        Constructor to instantiate an empty table
+
+        Args:
+            size: number of entries the table can hold
+        """
+
+        self.size = size
+        self.entries: List[Optional[Tuple[int,int,int,int,int,int]]] = [None] * size
+        self.generation = 0
+
+    def new_search(self) -> None:
+        """
+        Mark the entries of the previous searches as replaceable
+        """
+
+        self.generation += 1
+
+    def get(self, key: int) -> Optional[Tuple[int,int,int,int,int,int]]:
+        """
+        Get the entry stored for a position
+
+        Args:
+            key: key of the position
+
+        Returns:
+            the stored entry, or None if the position is not stored
+        """
+
+        entry = self.entries[key % self.size]
+        return entry if entry is not None and entry[0] == key else None
+
+    def put(self, key: int, depth: int, flag: int, score: int, move: int) -> None:
+        """
+        Store the result of a searched position
+
+        Args:
+            key: key of the position
+            depth: remaining depth the position was searched with
+            flag: whether the score is exact, a lower bound, or an upper bound
+            score: score of the position
+            move: best column found, -1 if there is none
+        """
+
+        index = key % self.size
+        entry = self.entries[index]
+
+        if entry is None or entry[0] == key or entry[1] != self.generation or entry[2] <= depth:
+            self.entries[index] = (key, self.generation, depth, flag, score, move)
+
+# shared by all the searches of the process, the scores only depend on the position so entries stay valid between games
+table = TranspositionTable()
+
+class Searcher:
+    """
+    Alpha-beta negamax search over a connect 4 position, deepened iteratively until the budget is used up
+
+    Attributes:
+        position: copy of the position being searched
+        evaluator: copy of the evaluator of the position, updated along with the position
+        player: player number to move at the root
+        time_limit: maximum number of seconds the search can take, 0 for unlimited
+        node_limit: maximum number of positions the search can visit, 0 for unlimited
+        table: transposition table used by the search
+        nodes: number of positions visited so far
+    """
+
+    def __init__(self, position: Connect4Position, player: int, time_limit: float = 0.25, node_limit: int = 0, table: TranspositionTable = table, evaluator: Optional[ThreatEvaluator] = None) -> None:
+        """
+        Constructor
+
+        Args:
+            position: position to be searched, it is copied so the original is never modified
+            player: player number to move
+            time_limit: maximum number of seconds the search can take, 0 for unlimited
+            node_limit: maximum number of positions the search can visit, 0 for unlimited
+            table: transposition table used by the search
+            evaluator: evaluator matching the position, it is copied so the original is never modified. Built from the position if not given
+        """
+
+        self.position = position.copy()
+        self.evaluator = evaluator.copy() if evaluator is not None else ThreatEvaluator.from_position(position)
+        self.player = player
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+        self.table = table
+        self.nodes = 0
+        self.deadline = 0.0
+        self.limited = False
+
+    def search(self, max_depth: int = MAX_MOVES) -> SearchResult:
+        """
+        Search the position with iterative deepening until the budget is used up or the result is proven
+
+        Args:
+            max_depth: maximum depth to be searched
+
+        Returns:
+            the best move found by the deepest completed iteration
+        """
+
+        start = perf_counter()
+        self.deadline = start + self.time_limit
+        self.table.new_search()
+
+        position = self.position
+        moves = [col for col in CENTER_ORDER if position.can_play(col)]
+
+        if not moves:
+            raise RuntimeError("The board is full")
+
+        # play the winning move straight away, and play the only move that does not lose immediately
+        wins = position.winning_squares(self.player) & position.possible()
+        threats = position.winning_squares(3 - self.player) & position.possible()
+        forced = wins or (threats if threats and not threats & (threats - 1) else 0)
+        if forced:
+            move = next(col for col in moves if forced & Connect4Position.COLUMN_MASKS[col])
+            return SearchResult(move, WIN_SCORE - position.moves - 1 if wins else 0, 0, 1, perf_counter() - start)
+
+        best_move, best_score, depth = moves[0], 0, 0
+
+        for current_depth in range(1, min(max_depth, MAX_MOVES - position.moves) + 1):
+            # the first iteration always completes so that there is always a move to play
+            self.limited = current_depth > 1
+
+            try:
+                score, move = self.search_root(moves, current_depth)
+            except SearchTimeout:
+                break
+
+            best_move, best_score, depth = move, score, current_depth
+
+            # search the best move first in the next iteration
+            moves.remove(move)
+            moves.insert(0, move)
+
+            # stop once a win or a loss has been proven
+            if abs(best_score) > WIN_SCORE - MAX_MOVES - 1:
+                break
+
+        return SearchResult(best_move, best_score, depth, self.nodes, perf_counter() - start)
+
+    def search_root(self, moves: List[int], depth: int) -> Tuple[int,int]:
+        """
+        Search every move at the root of the search
+
+        Args:
+            moves: columns that can be played, in the order they should be searched
+            depth: depth to be searched
+
+        Returns:
+            tuple containing the best score and the best column
+        """
+
+        position, evaluator = self.position, self.evaluator
+        player, opponent = self.player, 3 - self.player
+        alpha, beta = -WIN_SCORE, WIN_SCORE
+        best_score, best_move = -WIN_SCORE - 1, moves[0]
+
+        for col in moves:
+            move = position.play(player, col)
+            evaluator.add(player, move)
+            score = -self.negamax(opponent, depth - 1, -beta, -alpha)
+            evaluator.remove(player, move)
+            position.undo(player, move)
+
+            if score > best_score:
+                best_score, best_move = score, col
+                alpha = max(alpha, score)
+
+        return (best_score, best_move)
+
+    def negamax(self, player: int, depth: int, alpha: int, beta: int) -> int:
+        """
+        Score a position with alpha-beta pruning
+
+        Args:
+            player: player number to move
+            depth: remaining depth to be searched
+            alpha: score the player to move is already guaranteed
+            beta: score the opponent is already guaranteed
+
+        Returns:
+            score of the position from the point of view of the player to move
+        """
+
+        self.nodes += 1
+        if self.limited and not self.nodes & 1023:
+            self.check_budget()
+
+        position = self.position
+        opponent = 3 - player
+
+        if position.moves == MAX_MOVES:
+            return 0
+
+        possible = position.possible()
+
+        # the player to move wins by completing an alignment
+        if position.winning_squares(player) & possible:
+            return WIN_SCORE - position.moves - 1
+
+        # the player to move has to block the opponent, and loses if there are 2 squares to block
+        threats = position.winning_squares(opponent)
+        forced = threats & possible
+        if forced:
+            if forced & (forced - 1):
+                return -(WIN_SCORE - position.moves - 2)
+            candidates = forced
+        else:
+            # never play directly below a square the opponent wins with
+            candidates = possible & ~(threats >> 1)
+            if not candidates:
+                return -(WIN_SCORE - position.moves - 2)
+
+        if depth <= 0:
+            return self.evaluate(player)
+
+        alpha_original = alpha
+        key = position.key(player)
+        entry = self.table.get(key)
+        hash_move = -1
+
+        if entry is not None:
+            _, _, entry_depth, flag, score, hash_move = entry
+            if entry_depth >= depth:
+                if flag == EXACT:
+                    return score
+                elif flag == LOWER:
+                    alpha = max(alpha, score)
+                else:
+                    beta = min(beta, score)
+
+                if alpha >= beta:
+                    return score
+
+        best_score, best_move = -WIN_SCORE - 1, -1
+
+        evaluator = self.evaluator
+
+        for col in self.order_moves(player, candidates, hash_move):
+            move = position.play(player, col)
+            evaluator.add(player, move)
+            score = -self.negamax(opponent, depth - 1, -beta, -alpha)
+            evaluator.remove(player, move)
+            position.undo(player, move)
+
+            if score > best_score:
+                best_score, best_move = score, col
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+
+        if best_score <= alpha_original:
+            flag = UPPER
+        elif best_score >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+
+        self.table.put(key, depth, flag, best_score, best_move)
+
+        return best_score
+
+    def order_moves(self, player: int, candidates: int, hash_move: int) -> List[int]:
+        """
+        Order the moves so that the ones most likely to be the best are searched first
+
+        Args:
+            player: player number to move
+            candidates: bitboard of the squares that can be played
+            hash_move: best column stored in the transposition table, -1 if there is none
+
+        Returns:
+            columns to be searched, in order
+        """
+
+        position = self.position
+        bitboard = position.bitboards[player]
+        scored = []
+
+        for index, col in enumerate(CENTER_ORDER):
+            move = candidates & Connect4Position.COLUMN_MASKS[col]
+            if not move:
+                continue
+
+            if col == hash_move:
+                order = 1 << 10
+            else:
+                # prefer moves creating the most winning squares, then the most central ones
+                order = popcount(Connect4Position.find_winning_squares(bitboard | move, position.mask | move)) * 8 - index
+
+            scored.append((order, col))
+
+        scored.sort(reverse=True)
+
+        return [col for _, col in scored]
+
+    def evaluate(self, player: int) -> int:
+        """
+        Statically score a position at the end of the search
+
+        Args:
+            player: player number to move
+
+        Returns:
+            score of the position from the point of view of the player to move
+        """
+
+        position = self.position
+        center = Connect4Position.COLUMN_MASKS[3]
+        centers = popcount(position.bitboards[player] & center) - popcount(position.bitboards[3 - player] & center)
+
+        return self.evaluator.score(player) + centers
+
+    def check_budget(self) -> None:
+        """
+        Stop the search if the time or node budget has been used up
+
+        Raises:
+            SearchTimeout: the budget has been used up
+        """
+
+        if self.node_limit and self.nodes >= self.node_limit:
+            raise SearchTimeout()
+
+        if self.time_limit and perf_counter() >= self.deadline:
+            raise SearchTimeout()
+
+def search(game: Connect4, time_limit: float = 0.25, node_limit: int = 0, max_depth: int = MAX_MOVES) -> SearchResult:
+    """
+    Search the best move for the player to move in a connect 4 game
+
+    Args:
+        game: the instance of connect 4 game the move should be calculated against
+        time_limit: maximum number of seconds the search can take, 0 for unlimited
+        node_limit: maximum number of positions the search can visit, 0 for unlimited
+        max_depth: maximum depth to be searched
+
+    Returns:
+        the result of the search
+    """
+
+    return Searcher(game.position, game.current_player, time_limit, node_limit, evaluator=game.evaluator).search(max_depth)
+
+def best_move(game: Connect4, time_limit: float = 0.25, node_limit: int = 0, max_depth: int = MAX_MOVES) -> int:
+    """
+    Get the best column for the player to move in a connect 4 game
+
+    Args:
+        game: the instance of connect 4 game the move should be calculated against
+        time_limit: maximum number of seconds the search can take, 0 for unlimited
+        node_limit: maximum number of positions the search can visit, 0 for unlimited
+        max_depth: maximum depth to be searched
+
+    Returns:
+        column that should be played
+    """
+
+    return search(game, time_limit, node_limit, max_depth).move
+
+def snapshot(game: Connect4) -> Tuple[int,int,int,int]:
+    """
+    Take a compact copy of a connect 4 game that can be sent to another process
+
+    Args:
+        game: the instance of connect 4 game
+
+    Returns:
+        tuple containing the bitboards of both players, the number of moves played, and the player to move
+    """
+
+    position = game.position
+    return (position.bitboards[1], position.bitboards[2], position.moves, game.current_player)
+
+def think(snapshot: Tuple[int,int,int,int], time_limit: float, node_limit: int) -> int:
+    """
+    Get the best column for the player to move in a snapshot of a connect 4 game. Run by the workers of the bot pool,
+    which keep their own transposition table between moves
+
+    Args:
+        snapshot: snapshot of the game taken with snapshot()
+        time_limit: maximum number of seconds the search can take, 0 for unlimited
+        node_limit: maximum number of positions the search can visit, 0 for unlimited
+
+    Returns:
+        column that should be played
+    """
+
+    position = Connect4Position()
+    position.bitboards[1], position.bitboards[2], position.moves, player = snapshot
+    position.mask = position.bitboards[1] | position.bitboards[2]
+
+    return Searcher(position, player, time_limit, node_limit).search().move
@@ -0,0 +1,395 @@
+import metrics
+import queue
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from bisect import bisect
+from collections import OrderedDict
+from hashlib import blake2b
+from time import time
+from typing import Dict, List, Optional, Tuple
+
+REPLICAS = 160 # points of every worker on the hash ring, more points spread the rooms more evenly
+
+# seconds a read of the shared directory waits on a lock before giving up, the reads run on the event loop, and
+# seconds the writes wait, since they run on their own thread
+READ_TIMEOUT = 0.05
+WRITE_TIMEOUT = 5.0
+
+WRITE_ERRORS = metrics.REGISTRY.register(metrics.Counter("boredgames_directory_errors_total", "Batches of writes that could not be written to the directory"))
+
+Statement = Tuple[str,tuple]
+
+class Redirect(Exception):
+    """
+    Raised when a room lives in another worker, which the client has to connect to instead
+
+    Attributes:
+        worker: URL of the worker owning the room
+    """
+
+    def __init__(self, worker: str) -> None:
+        super().__init__(f"Room is served by {worker}")
+        self.worker = worker
+
+def ring_hash(key: str) -> int:
+    """
+    Hash a key onto the ring, the same way in every process
+
+    Args:
+        key: room ID or worker point
+
+    Returns:
+        64 bits position of the key on the ring
+    """
+
+    return int.from_bytes(blake2b(key.encode(), digest_size=8).digest(), "big")
+
+class HashRing:
+    """
+    Class used to assign rooms to workers by consistent hashing of their room ID
+
+    Every worker is placed at several points of a ring, and a room belongs to the first worker found clockwise from the
+    hash of its room ID. Adding or removing a worker only moves the rooms of its neighbouring points.
+
+    Attributes:
+        workers: URLs of the workers on the ring
+        points: sorted positions of the points on the ring
+        owners: worker of every point, in the same order as points
+    """
+
+    def __init__(self, workers: List[str], replicas: int = REPLICAS) -> None:
+        """
+        Constructor
+
+        Args:
+            workers: URLs of the workers on the ring
+            replicas: number of points of every worker
+        """
+
+        self.workers = list(workers)
+        ring = sorted((ring_hash(f"{worker}#{i}"), worker) for worker in self.workers for i in range(replicas))
+        self.points = [point for point, _ in ring]
+        self.owners = [worker for _, worker in ring]
+
+    def owner(self, room_id: str) -> str:
+        """
+        Get the worker a room belongs to
+
+        Args:
+            room_id: ID of the room
+
+        Returns:
+            URL of the worker
+        """
+
+        index = bisect(self.points, ring_hash(room_id)) % len(self.points)
+        return self.owners[index]
+
+class Directory(ABC):
+    """
+    Interface of the directory shared by the workers, which answers where a room lives and which public rooms are
+    open, and adds up the players online across the workers
+    """
+
+    @abstractmethod
+    def register(self, game_type: str, room_id: str, is_public: bool, worker: str) -> None:
+        """
+        Record a room created by a worker
+
+        Args:
+            game_type: type of game the room is for
+            room_id: ID of the room
+            is_public: whether the room is a public or private
+            worker: URL of the worker owning the room
+        """
+
+    @abstractmethod
+    def unregister(self, game_type: str, room_id: str) -> None:
+        """
+        Forget a room that was removed
+
+        Args:
+            game_type: type of game the room is for
+            room_id: ID of the room
+        """
+
+    @abstractmethod
+    def set_joinable(self, game_type: str, room_id: str, joinable: bool) -> None:
+        """
+        Record whether a public room is still waiting for players
+
+        Args:
+            game_type: type of game the room is for
+            room_id: ID of the room
+            joinable: whether the room can be joined
+        """
+
+    @abstractmethod
+    def locate(self, game_type: str, room_id: str) -> Optional[str]:
+        """
+        Find the worker a room lives in
+
+        Args:
+            game_type: type of game the room is for
+            room_id: ID of the room
+
+        Returns:
+            URL of the worker, None if the room does not exist
+        """
+
+    @abstractmethod
+    def open_room(self, game_type: str) -> Optional[Tuple[str,str]]:
+        """
+        Find the oldest public room waiting for players
+
+        Args:
+            game_type: type of game the room is for
+
+        Returns:
+            tuple containing the room ID and the URL of its worker, None if no public room is open
+        """
+
+    @abstractmethod
+    def report(self, worker: str, online: int) -> None:
+        """
+        Record the number of players connected to a worker
+
+        Args:
+            worker: URL of the worker
+            online: number of players connected to it
+        """
+
+    @abstractmethod
+    def total_online(self, excluded: str = "") -> int:
+        """
+        Add up the players connected to every worker
+
+        Args:
+            excluded: URL of a worker left out, whose players are counted by the caller
+
+        Returns:
+            number of players online
+        """
+
+    @abstractmethod
+    def clear(self, worker: str) -> None:
+        """
+        Forget every room of a worker, which just started and does not own any room yet
+
+        Args:
+            worker: URL of the worker
+        """
+
+    @abstractmethod
+    def close(self) -> None:
+        """
+        Finish the writes still pending, when the worker shuts down
+        """
+
+class MemoryDirectory(Directory):
+    """
+    Directory kept in the memory of a single process, used when the server runs as one worker and in tests
+
+    Attributes:
+        rooms: dictionary mapping (game type, room ID) to the worker of the room
+        joinable: dictionary mapping every game type to the room IDs of its open public rooms and their worker, oldest
+            first
+        online: dictionary mapping the workers to the number of players connected to them
+    """
+
+    def __init__(self) -> None:
+        self.rooms: Dict[Tuple[str,str],str] = {}
+        self.joinable: Dict[str,OrderedDict[str,str]] = {}
+        self.online: Dict[str,int] = {}
+
+    def register(self, game_type: str, room_id: str, is_public: bool, worker: str) -> None:
+        self.rooms[game_type, room_id] = worker
+
+        if is_public:
+            self.joinable.setdefault(game_type, OrderedDict())[room_id] = worker
+
+    def unregister(self, game_type: str, room_id: str) -> None:
+        self.rooms.pop((game_type, room_id), None)
+        self.joinable.get(game_type, {}).pop(room_id, None)
+
+    def set_joinable(self, game_type: str, room_id: str, joinable: bool) -> None:
+        # rooms never become joinable again once they started
+        if not joinable:
+            self.joinable.get(game_type, {}).pop(room_id, None)
+
+    def locate(self, game_type: str, room_id: str) -> Optional[str]:
+        return self.rooms.get((game_type, room_id))
+
+    def open_room(self, game_type: str) -> Optional[Tuple[str,str]]:
+        return next(iter(self.joinable.get(game_type, {}).items()), None)
+
+    def report(self, worker: str, online: int) -> None:
+        self.online[worker] = online
+
+    def total_online(self, excluded: str = "") -> int:
+        return sum(online for worker, online in self.online.items() if worker != excluded)
+
+    def clear(self, worker: str) -> None:
+        self.rooms = {key: room_worker for key, room_worker in self.rooms.items() if room_worker != worker}
+        self.joinable = {game_type: OrderedDict((room_id, room_worker) for room_id, room_worker in rooms.items() if room_worker != worker) for game_type, rooms in self.joinable.items()}
+        self.online.pop(worker, None)
+
+    def close(self) -> None:
+        pass
+
+class SQLiteDirectory(Directory):
+    """
+    Directory stored in an SQLite database, shared by the workers running on the same host
+
+    The writes never run on the event loop, where waiting on the lock of another worker would stall every room of the
+    worker. They are queued to a writer thread, which writes them in batches of one transaction. The reads stay on the
+    event loop, since the write-ahead log lets them read while another worker writes, and give up quickly otherwise.
+
+    Attributes:
+        path: path of the database file
+        connection: connection to the database used by the reads, in autocommit mode
+        writes: statements of every write waiting to be written, None to stop the writer
+        writer: thread writing the queued writes
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Constructor
+
+        Args:
+            path: path of the database file, created if it does not exist
+        """
+
+        self.path = path
+        self.connection = sqlite3.connect(path, isolation_level=None, timeout=WRITE_TIMEOUT)
+
+        # the write-ahead log lets the workers read while another one writes
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS rooms (
+                game_type TEXT NOT NULL,
+                room_id TEXT NOT NULL,
+                public INTEGER NOT NULL,
+                joinable INTEGER NOT NULL,
+                worker TEXT NOT NULL,
+                created REAL NOT NULL,
+                PRIMARY KEY (game_type, room_id)
+            )
+        """)
+        self.connection.execute("CREATE INDEX IF NOT EXISTS open_rooms ON rooms (game_type, joinable, created)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS workers (worker TEXT PRIMARY KEY, online INTEGER NOT NULL)")
+
+        # the schema is created before serving, from now on the reads must not wait on the other workers
+        self.connection.execute(f"PRAGMA busy_timeout={int(READ_TIMEOUT*1000)}")
+
+        self.writes: queue.Queue[Optional[List[Statement]]] = queue.Queue()
+        self.writer = threading.Thread(target=self.write, name="directory-writer", daemon=True)
+        self.writer.start()
+
+    def write(self) -> None:
+        """
+        Write the queued writes until closed, every batch of writes queued meanwhile in one transaction
+        """
+
+        connection = sqlite3.connect(self.path, isolation_level=None, timeout=WRITE_TIMEOUT)
+        stopped = False
+
+        while not stopped:
+            batch = [self.writes.get()]
+
+            while not self.writes.empty():
+                batch.append(self.writes.get_nowait())
+
+            if None in batch:
+                stopped = True
+                batch = [statements for statements in batch if statements is not None]
+
+            try:
+                connection.execute("BEGIN IMMEDIATE")
+
+                for statements in batch:
+                    for statement, parameters in statements:
+                        connection.execute(statement, parameters)
+
+                connection.execute("COMMIT")
+            except sqlite3.Error:
+                WRITE_ERRORS.inc()
+
+                if connection.in_transaction:
+                    connection.execute("ROLLBACK")
+
+        connection.close()
+
+    def execute(self, *statements: Statement) -> None:
+        """
+        Queue a write, written in order with the other writes
+
+        Args:
+            statements: statements of the write, with their parameters
+        """
+
+        self.writes.put(list(statements))
+
+    def query(self, statement: str, parameters: tuple) -> Optional[tuple]:
+        """
+        Read a row, without waiting on the other workers for more than the read timeout
+
+        Args:
+            statement: query
+            parameters: parameters of the query
+
+        Returns:
+            the first row, None if there is none or the database stayed locked
+        """
+
+        try:
+            return self.connection.execute(statement, parameters).fetchone()
+        except sqlite3.OperationalError:
+            return None
+
+    def register(self, game_type: str, room_id: str, is_public: bool, worker: str) -> None:
+        self.execute(("INSERT OR REPLACE INTO rooms VALUES (?, ?, ?, ?, ?, ?)", (game_type, room_id, is_public, is_public, worker, time())))
+
+    def unregister(self, game_type: str, room_id: str) -> None:
+        self.execute(("DELETE FROM rooms WHERE game_type = ? AND room_id = ?", (game_type, room_id)))
+
+    def set_joinable(self, game_type: str, room_id: str, joinable: bool) -> None:
+        self.execute(("UPDATE rooms SET joinable = ? WHERE game_type = ? AND room_id = ?", (joinable, game_type, room_id)))
+
+    def locate(self, game_type: str, room_id: str) -> Optional[str]:
+        row = self.query("SELECT worker FROM rooms WHERE game_type = ? AND room_id = ?", (game_type, room_id))
+        return row[0] if row else None
+
+    def open_room(self, game_type: str) -> Optional[Tuple[str,str]]:
+        # only public rooms are ever joinable
+        row = self.query("SELECT room_id, worker FROM rooms WHERE game_type = ? AND joinable = 1 ORDER BY created LIMIT 1", (game_type,))
+        return (row[0], row[1]) if row else None
+
+    def report(self, worker: str, online: int) -> None:
+        self.execute(("INSERT OR REPLACE INTO workers VALUES (?, ?)", (worker, online)))
+
+    def total_online(self, excluded: str = "") -> int:
+        row = self.query("SELECT COALESCE(SUM(online), 0) FROM workers WHERE worker != ?", (excluded,))
+        return row[0] if row else 0
+
+    def clear(self, worker: str) -> None:
+        self.execute(("DELETE FROM rooms WHERE worker = ?", (worker,)), ("DELETE FROM workers WHERE worker = ?", (worker,)))
+
+    def close(self) -> None:
+        self.writes.put(None)
+        self.writer.join()
+
+def get_directory(path: str = "") -> Directory:
+    """
+    Get the directory of the rooms
+
+    Args:
+        path: path of the SQLite database shared by the workers, empty for a directory in memory
+
+    Returns:
+        the directory
+    """
+
+    return SQLiteDirectory(path) if path else MemoryDirectory()
@@ -0,0 +1,43 @@
+import json
+from typing import Dict
+
+# orjson is optional, it encodes several times faster than the standard library when it is installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def encode(message: Dict[object, object]) -> str:
+    """
+    Encode a message into a JSON text frame. Messages are encoded once and the frame is shared by every recipient
+
+    Args:
+        message: a valid JSON representation, whose keys may be integers such as player numbers
+
+    Returns:
+        JSON text of the message
+    """
+
+    if orjson is not None:
+        return orjson.dumps(message, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
+def decode(frame: str) -> object:
+    """
+    Decode a JSON text frame received from a client
+
+    Args:
+        frame: JSON text of the message
+
+    Raises:
+        ValueError: the frame is not valid JSON
+
+    Returns:
+        the decoded message, which may be any JSON value
+    """
+
+    if orjson is not None:
+        return orjson.loads(frame)
+
+    return json.loads(frame)
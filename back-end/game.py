@@ -1,13 +1,48 @@
-from typing import Dict, Optional
+import asyncio
+import metrics
+import settings
+from collections import deque
+from encoding import encode
+from secrets import token_urlsafe
+from typing import Deque, Dict, List, Optional, Tuple, Union
 from fastapi import WebSocket
+from movelog import RoomLog
+from outbox import Outbox
+from pacing import get_pacing
+from protocol import Codec
 from random import shuffle, choice, random
+from ratelimit import TokenBucket
+from time import monotonic, perf_counter
+from tracing import traced
 
 class Player:
 
-    def __init__(self, player: int, nickname: str, connection: Optional[WebSocket]):
+    def __init__(self, player: int, nickname: str, connection: Optional[WebSocket], codec: Optional[Codec] = None, room_id: str = "", token: str = ""):
         self.id = player
         self.nickname = nickname
         self.connection = connection
+        self.codec = codec # binary codec negotiated by the connection, None if it speaks JSON
+        self.last_seen = monotonic() # last time a message was received from the connection, heartbeats included
+        self.outbox: Optional[Outbox] = None # queue of the messages waiting to be sent to the connection
+        self.token = token or f"{room_id}.{token_urlsafe(16)}" # session token used to reclaim the seat, the room ID tells the worker holding it
+        self.away: Optional[float] = None # time the connection dropped, None while connected
+        self.seen = 0 # sequence number of the last broadcast sent before the connection dropped
+        self.release: Optional[asyncio.Task] = None # task freeing the seat once the grace window is over
+        self.bucket: Optional[TokenBucket] = None # rate limit of the events of the connection, None if not limited
+        self.address = "" # IP address of the connection, whose events are also limited across its connections
+
+    def encode(self, message: Dict[str, object]) -> Union[str, bytes]:
+        """
+        Encode a message into a frame of the protocol of the connection
+
+        Args:
+            message: a valid JSON representation
+
+        Returns:
+            binary frame if the connection negotiated the binary protocol, JSON text frame otherwise
+        """
+
+        return self.codec.encode(message) if self.codec else encode(message)
     
 class Game:
     """
@@ -20,6 +55,13 @@ class Game:
         unused_player_numbers: stores the player numbers that are currently assignable
         used_player_numbers: stores the player numbers that are already assigned
         dummy_plug: dummy player pbject
+        pacing: pacing of the dummy plug moves, can be replaced per room
+        created: time the room was created
+        last_activity: last time a player joined or sent a game event
+        sequence: number of messages broadcast so far
+        history: latest broadcast messages with their sequence numbers, replayed to the players that reconnect
+        log: move log of the room, None if the moves are not logged
+        bot_turn: task of the dummy plug playing its turn or answering a rematch, None if it never played
     """
 
     def __init__(self, room_id: str, num_of_players: int) -> None:
@@ -35,34 +77,47 @@ class Game:
         self.room_id = room_id 
         self.started = False
         self.dummy_plug = None
+        self.pacing = get_pacing()
+        self.created = monotonic()
+        self.last_activity = self.created
+        self.sequence = 0
+        self.history: Deque[Tuple[int,Dict[str,object]]] = deque(maxlen=settings.RECONNECT_HISTORY)
+        self.log: Optional[RoomLog] = None
+        self.bot_turn: Optional[asyncio.Task] = None
         self.unused_player_numbers = [i+1 for i in range(num_of_players)]
         self.used_player_numbers = []
 
         shuffle(self.unused_player_numbers) # randomise the order of player numbers 
 
-    async def join(self, websocket: Optional[WebSocket], nickname: str) -> Optional[Player]:
+    async def join(self, websocket: Optional[WebSocket], nickname: str, codec: Optional[Codec] = None) -> Optional[Player]:
         """
         Connect the websocket to the game
 
         Args:
             websocket: instance of WebSocket to be joined
             nickname: nickname of the player
+            codec: binary codec negotiated by the websocket, None if it speaks JSON
 
         Returns:
             player number if successful, 0 otherwise
         """
 
         player = None
+        self.last_activity = monotonic()
         
         if not self.started:
             # take a player number available, assign it, and then take note of it
-            player = Player(self.unused_player_numbers.pop(), nickname, websocket)
+            player = Player(self.unused_player_numbers.pop(), nickname, websocket, codec, self.room_id)
             self.connections.append(player)
 
-            # notify the client of their player number
+            if websocket:
+                self.open_outbox(player)
+
+            # notify the client of their player number, and of the token to reclaim their seat with
             await self.send(player, {
                 "event": "connected",
-                "you": player.id
+                "you": player.id,
+                "token": player.token
             })
 
             self.used_player_numbers.append(player.id)
@@ -74,38 +129,149 @@ class Game:
                 if not player.connection:
                     self.dummy_plug = player
 
+                self.begin_log()
+
                 # notify all players the opponent details e.g. player number, nickname
                 if self.started:
-                    message = {"event": "started"}
-                    for p in self.connections:
-                        message[p.id] = p.nickname
-                    
-                    await self.broadcast(message)
+                    await self.broadcast(self.players())
                     
         return player
 
-    async def send(self, player: Player, message: Dict[str, object]) -> None:
+    def open_outbox(self, player: Player) -> None:
         """
-        Send a message in JSON to the websocket object
+        Start writing to the connection of a player from its own task, so that slow clients do not hold the others back
+
+        Args:
+            player: player whose connection is written to
+        """
+
+        player.outbox = Outbox(player.connection, settings.OUTBOX_SIZE, settings.OUTBOX_POLICY, self.snapshot, player.encode)
+        player.outbox.start()
+
+    def players(self) -> Dict[object, object]:
+        """
+        Get the details of the players of the game as a message
+
+        Returns:
+            a valid JSON representation mapping every player number to its nickname
+        """
+
+        message = {"event": "started"}
+        for p in self.connections:
+            message[p.id] = p.nickname
+
+        return message
+
+    def detach(self, player: Player) -> None:
+        """
+        Keep the seat of a player whose connection dropped, so that they can reclaim it with their token
+
+        Args:
+            player: player whose connection dropped
+        """
+
+        player.connection = None
+        player.away = monotonic()
+        player.seen = self.sequence
+
+        if player.outbox:
+            player.outbox.close()
+            player.outbox = None
+
+    async def reattach(self, player: Player, websocket: WebSocket, codec: Optional[Codec] = None) -> None:
+        """
+        Give a seat back to the player that reconnected, and bring their client up to date
+
+        The client gets the events it missed that are not about the board, then a snapshot of the board, which
+        replaces the moves it missed.
+
+        Args:
+            player: player reclaiming their seat
+            websocket: new connection of the player
+            codec: binary codec negotiated by the websocket, None if it speaks JSON
+        """
+
+        if player.release:
+            player.release.cancel()
+            player.release = None
+
+        player.connection = websocket
+        player.codec = codec
+        player.away = None
+        player.last_seen = self.last_activity = monotonic()
+        self.open_outbox(player)
+
+        await self.send(player, {
+            "event": "connected",
+            "you": player.id,
+            "token": player.token
+        })
+        await self.send(player, self.players())
+
+        for message in self.missed(player.seen):
+            await self.send(player, message)
+
+        state = self.snapshot()
+        if state is not None:
+            await self.send(player, state)
+
+    def missed(self, seen: int) -> List[Dict[str, object]]:
+        """
+        Get the broadcast messages that the snapshot does not replace, since a sequence number
+
+        Args:
+            seen: sequence number of the last message received
+
+        Returns:
+            messages broadcast after it that are still in the history, oldest first
+        """
+
+        return [message for sequence, message in self.history if sequence > seen and message["event"] not in ("move", "state", "started")]
+
+    async def send(self, player: Player, message: Dict[str, object]) -> bool:
+        """
+        Queue a message to be sent to the websocket object in its protocol, without waiting for the client to receive it
 
         Args:
             websocket: recipent for the message to be sent
             message: a valid JSON representation
+
+        Returns:
+            whether the message will be sent
         """
 
-        if player.connection:
-            await player.connection.send_json(message)
+        if not player.outbox:
+            return False
+
+        metrics.MESSAGES_SENT.inc(message["event"])
 
+        return player.outbox.put(message["event"], player.encode(message))
+
+    @traced("broadcast")
     async def broadcast(self, message: Dict[str, object]) -> None:
         """
-        Send a message in JSON to the all currently connected websockets
+        Send a message to the all currently connected websockets, encoding it once per protocol spoken in the room
 
         Args:
             message: a valid JSON representation
         """
 
+        started = perf_counter()
+        self.sequence += 1
+        self.history.append((self.sequence, message))
+        frames = {}
+        recipients = 0
+
         for player in self.connections:
-            await self.send(player, message)
+            if player.outbox:
+                if player.codec not in frames:
+                    frames[player.codec] = player.encode(message)
+
+                player.outbox.put(message["event"], frames[player.codec])
+                recipients += 1
+
+        metrics.MESSAGES_SENT.inc(message["event"], amount=recipients)
+        metrics.BROADCAST.observe(perf_counter() - started)
 
 
     def remove(self, player: Player) -> None:
@@ -120,6 +286,26 @@ class Game:
         self.unused_player_numbers.append(player.id)
         self.used_player_numbers.remove(player.id)
 
+        if player.outbox:
+            player.outbox.close()
+
+    def snapshot(self) -> Optional[Dict[str, object]]:
+        """
+        Get the latest state of the game as a message, so that a client that fell behind can catch up at once
+
+        Returns:
+            a valid JSON representation, or None if the game has no state to catch up with
+        """
+
+        return None
+
+    def begin_log(self) -> None:
+        """
+        Record the start of a game in the move log of the room, for the games whose moves are logged
+        """
+
+        pass
+
 class BoardGame(Game):
     """
     Class used to create all board games
@@ -161,6 +347,29 @@ class BoardGame(Game):
 
         self.board = [[0]*self.dimensions["row"] for _ in range(self.dimensions["col"])]
 
+    def snapshot(self) -> Optional[Dict[str, object]]:
+        """
+        Get the latest state of the board as a message, so that a client that fell behind can catch up at once
+
+        Returns:
+            a valid JSON representation
+        """
+
+        return {
+            "event": "state",
+            "board": [column[:] for column in self.board],
+            "next": self.current_player,
+            "over": self.is_over
+        }
+
+    def begin_log(self) -> None:
+        """
+        Record the start of a game in the move log of the room, if its moves are logged
+        """
+
+        if self.log:
+            self.log.begin(self.current_player, [(player.id, player.nickname, player is self.dummy_plug) for player in self.connections])
+
     def reset_board(self, player: int) -> bool:
         """
             Reset the board if all players voted to reset it
@@ -183,6 +392,7 @@ class BoardGame(Game):
             self.current_player = choice(self.used_player_numbers) # chose a random player as the starting player
             self.vote_reset = set()
             self.is_over = False
+            self.begin_log()
             flag = True
         
         return flag
\ No newline at end of file
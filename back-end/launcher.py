@@ -0,0 +1,64 @@
+import argparse
+import os
+import signal
+import subprocess
+import sys
+from typing import List
+
+def launch(workers: int, host: str, port: int, public_host: str, directory: str, checkpoint: str = "") -> List[subprocess.Popen]:
+    """
+    Start the workers of the server, one uvicorn process per port, sharing the directory of the rooms. Every worker
+    gets BOREDGAMES_BOT_WORKERS bot processes if it is set, or its share of the cores otherwise
+
+    Args:
+        workers: number of worker processes
+        host: interface the workers listen on
+        port: port of the first worker, the others use the following ports
+        public_host: host name the clients reach the workers with, used in the redirects
+        directory: path of the SQLite database shared by the workers as the directory of the rooms
+        checkpoint: path the workers save their rooms to when they shut down, suffixed by the port of every worker,
+            empty to not keep the rooms across restarts
+
+    Returns:
+        processes of the workers
+    """
+
+    urls = [f"ws://{public_host}:{port + i}" for i in range(workers)]
+    processes = []
+
+    # every worker runs its own bot pool, so the cores are shared between the pools rather than each taking them all
+    bot_workers = os.environ.get("BOREDGAMES_BOT_WORKERS") or str(max(1, (os.cpu_count() or 1) // workers))
+
+    for i, url in enumerate(urls):
+        environment = dict(os.environ, BOREDGAMES_WORKER=url, BOREDGAMES_WORKERS=",".join(urls), BOREDGAMES_DIRECTORY=directory, BOREDGAMES_BOT_WORKERS=bot_workers)
+
+        if checkpoint:
+            environment["BOREDGAMES_CHECKPOINT"] = f"{checkpoint}.{port + i}"
+
+        command = [sys.executable, "-m", "uvicorn", "main:app", "--host", host, "--port", str(port + i)]
+        processes.append(subprocess.Popen(command, env=environment, cwd=os.path.dirname(os.path.abspath(__file__))))
+
+    return processes
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the server as several worker processes, with the rooms spread across them", epilog="Every worker runs BOREDGAMES_BOT_WORKERS processes for the bots if it is set, otherwise the CPU count divided by the number of workers, at least 1")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="number of worker processes")
+    parser.add_argument("--host", default="127.0.0.1", help="interface the workers listen on")
+    parser.add_argument("--port", type=int, default=8000, help="port of the first worker, the others use the following ports")
+    parser.add_argument("--public-host", default="localhost", help="host name the clients reach the workers with")
+    parser.add_argument("--directory", default="rooms.db", help="path of the SQLite database shared by the workers")
+    parser.add_argument("--checkpoint", default="", help="path the workers save their rooms to when they shut down, and restore them from")
+    args = parser.parse_args()
+
+    processes = launch(args.workers, args.host, args.port, args.public_host, os.path.abspath(args.directory), os.path.abspath(args.checkpoint) if args.checkpoint else "")
+
+    # stop every worker along with the launcher
+    def stop(signum, frame) -> None:
+        for process in processes:
+            process.send_signal(signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for process in processes:
+        process.wait()
@@ -0,0 +1,591 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+from random import Random
+from time import perf_counter
+from typing import Dict, List, Optional, Union
+from urllib.parse import urlencode
+from uuid import uuid4
+
+# the bots reveal their moves straight away while load tested
+os.environ.setdefault("BOREDGAMES_BOT_PACING", "instant")
+# every simulated client connects from the same address
+os.environ.setdefault("BOREDGAMES_ADDRESS_RATE_LIMIT", "0")
+
+import protocol
+from checkers import Checkers
+from connect4 import Connect4
+from encoding import encode
+from game import BoardGame
+
+GAME_TYPES = ("connect-4", "checkers")
+KINDS = ("public", "private", "bot")
+
+class AsgiWebSocket:
+    """
+    Class used to connect a simulated client to the ASGI application directly, without going through the network
+
+    Attributes:
+        app: ASGI application
+        scope: connection scope given to the application
+        inbox: messages sent by the client to the application
+        outbox: messages sent by the application to the client
+        task: task running the application for this connection
+        subprotocol: subprotocol accepted by the application, None if it speaks JSON
+    """
+
+    def __init__(self, app: object, path: str, query: Dict[str,str], subprotocols: List[str], port: int) -> None:
+        """
+        Constructor
+
+        Args:
+            app: ASGI application
+            path: path of the websocket end-point
+            query: query parameters of the connection
+            subprotocols: subprotocols offered by the client
+            port: port of the client, to tell the connections apart
+        """
+
+        self.app = app
+        self.scope = {
+            "type": "websocket",
+            "asgi": {"version": "3.0"},
+            "scheme": "ws",
+            "path": path,
+            "raw_path": path.encode(),
+            "root_path": "",
+            "query_string": urlencode(query).encode(),
+            "headers": [(b"host", b"loadtest")],
+            "client": ("127.0.0.1", port),
+            "server": ("loadtest", 80),
+            "subprotocols": subprotocols
+        }
+        self.inbox: asyncio.Queue = asyncio.Queue()
+        self.outbox: asyncio.Queue = asyncio.Queue()
+        self.task: Optional[asyncio.Task] = None
+        self.subprotocol: Optional[str] = None
+
+    async def connect(self) -> None:
+        """
+        Open the connection
+
+        Raises:
+            ConnectionRefusedError: the application closed the connection instead of accepting it
+        """
+
+        self.inbox.put_nowait({"type": "websocket.connect"})
+        self.task = asyncio.get_running_loop().create_task(self.app(self.scope, self.inbox.get, self.outbox.put))
+        message = await self.outbox.get()
+
+        if message["type"] != "websocket.accept":
+            raise ConnectionRefusedError("The connection was not accepted")
+
+        self.subprotocol = message.get("subprotocol")
+
+    def send(self, frame: Union[str,bytes]) -> None:
+        """
+        Send a frame to the application
+
+        Args:
+            frame: text or binary frame
+        """
+
+        if isinstance(frame, bytes):
+            self.inbox.put_nowait({"type": "websocket.receive", "bytes": frame})
+        else:
+            self.inbox.put_nowait({"type": "websocket.receive", "text": frame})
+
+    async def receive(self) -> Optional[Union[str,bytes]]:
+        """
+        Receive the next frame of the application
+
+        Returns:
+            text or binary frame, None once the application closed the connection
+        """
+
+        message = await self.outbox.get()
+
+        if message["type"] != "websocket.send":
+            self.outbox.put_nowait(message) # the connection stays closed for the next calls
+            return None
+
+        return message.get("bytes") if message.get("bytes") is not None else message.get("text")
+
+    async def close(self) -> None:
+        """
+        Close the connection, and wait for the application to let go of it
+        """
+
+        self.inbox.put_nowait({"type": "websocket.disconnect", "code": 1000})
+
+        if self.task is not None:
+            try:
+                await asyncio.wait_for(self.task, 5.0)
+            except Exception:
+                pass
+
+class Lifespan:
+    """
+    Class used to run the startup and shutdown handlers of the ASGI application
+
+    Attributes:
+        app: ASGI application
+        inbox: lifespan events sent to the application
+        outbox: lifespan events sent by the application
+        task: task running the lifespan of the application
+    """
+
+    def __init__(self, app: object) -> None:
+        self.app = app
+        self.inbox: asyncio.Queue = asyncio.Queue()
+        self.outbox: asyncio.Queue = asyncio.Queue()
+        self.task: Optional[asyncio.Task] = None
+
+    async def startup(self) -> None:
+        scope = {"type": "lifespan", "asgi": {"version": "3.0"}}
+        self.task = asyncio.get_running_loop().create_task(self.app(scope, self.inbox.get, self.outbox.put))
+        await self.event("lifespan.startup")
+
+    async def shutdown(self) -> None:
+        await self.event("lifespan.shutdown")
+        await self.task
+
+    async def event(self, event: str) -> None:
+        self.inbox.put_nowait({"type": event})
+        message = await self.outbox.get()
+
+        if message["type"] != f"{event}.complete":
+            raise RuntimeError(message.get("message", f"{event} failed"))
+
+class Statistics:
+    """
+    Class used to collect the measures of a load test
+
+    Attributes:
+        started: time the load test started
+        connections: number of connections accepted
+        refused: number of connections refused or redirected
+        games: number of games played to the end
+        moves: number of moves played by the clients
+        errors: number of error events received
+        timeouts: number of clients that waited too long for an event
+        latencies: seconds between a client sending a move and receiving its broadcast
+        lags: seconds the event loop was late in running a task that was due
+        peak_rooms: highest number of live rooms
+        peak_memory: resident memory when the rooms peaked, in bytes
+    """
+
+    def __init__(self) -> None:
+        self.started = perf_counter()
+        self.connections = 0
+        self.refused = 0
+        self.games = 0
+        self.moves = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.latencies: List[float] = []
+        self.lags: List[float] = []
+        self.peak_rooms = 0
+        self.peak_memory = 0
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    """
+    Get a percentile of measures, by the nearest rank
+
+    Args:
+        values: measures
+        fraction: percentile as a fraction, such as 0.99
+
+    Returns:
+        the percentile, None if there are no measures
+    """
+
+    if not values:
+        return None
+
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction*len(ordered)))]
+
+def resident_memory() -> int:
+    """
+    Get the resident memory of the process
+
+    Returns:
+        resident memory in bytes, 0 if it cannot be read on this platform
+    """
+
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1])*os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+class Client:
+    """
+    Class used to simulate a player, which keeps a replica of the board to play random legal moves
+
+    Attributes:
+        app: ASGI application
+        statistics: measures of the load test
+        game_type: type of game played
+        rng: random generator choosing the moves
+        move_delay: mean seconds the client thinks before playing
+        timeout: seconds the client waits for an event before giving up
+        codec: binary codec of the client, None if it speaks JSON
+        replica: board of the game, kept up to date with the moves broadcasted
+        me: player number of the client
+        sent: time the last move was sent, None once its broadcast was received
+    """
+
+    def __init__(self, app: object, statistics: Statistics, game_type: str, rng: Random, move_delay: float, timeout: float, binary: bool) -> None:
+        self.app = app
+        self.statistics = statistics
+        self.game_type = game_type
+        self.rng = rng
+        self.move_delay = move_delay
+        self.timeout = timeout
+        self.codec = protocol.Codec(game_type, server=False) if binary else None
+        self.replica: BoardGame = Connect4("loadtest") if game_type == "connect-4" else Checkers("loadtest")
+        self.replica.started = True
+        self.replica.used_player_numbers = [1, 2]
+        self.me = 0
+        self.sent: Optional[float] = None
+
+    def encode(self, message: Dict[str,object]) -> Union[str,bytes]:
+        return self.codec.encode(message) if self.codec else encode(message)
+
+    def decode(self, frame: Union[str,bytes]) -> Dict[object,object]:
+        return self.codec.decode(frame) if self.codec else json.loads(frame)
+
+    def choose_move(self) -> Dict[str,object]:
+        """
+        Choose a random legal move for the position of the replica
+
+        Returns:
+            the move event
+        """
+
+        if self.game_type == "connect-4":
+            column = self.rng.choice([column for column in range(7) if self.replica.position.can_play(column)])
+            return {"event": "move", "column": column}
+
+        moves = self.replica.all_moves["moves_eat"][self.me] or self.replica.all_moves["moves"][self.me]
+        current_position = self.rng.choice([position for position in moves if moves[position]])
+        next_position = self.rng.choice(moves[current_position])["possible_move"]
+
+        return {"event": "move", "current_position": list(current_position), "next_position": list(next_position)}
+
+    def apply(self, event: Dict[object,object]) -> None:
+        """
+        Play a broadcasted move on the replica
+
+        Args:
+            event: move event
+        """
+
+        player = event["player"]
+        self.replica.current_player = player
+
+        if self.game_type == "connect-4":
+            self.replica.make_move(player, event["x"])
+        else:
+            self.replica.make_move(player, tuple(event["previous_position"]), tuple(event["current_position"]))
+
+    async def play(self, room_id: str, force_start: bool, port: int) -> bool:
+        """
+        Connect to a room, and play until the game is over or the opponent left
+
+        Args:
+            room_id: ID of the private room, empty for a public room
+            force_start: whether to start the game against a bot
+            port: port of the client, to tell the connections apart
+
+        Returns:
+            whether the game was played to the end
+        """
+
+        query = {"nickname": f"load{port}", "room_id": room_id}
+        connection = AsgiWebSocket(self.app, f"/ws/{self.game_type}", query, [protocol.SUBPROTOCOL] if self.codec else [], port)
+
+        try:
+            await connection.connect()
+        except ConnectionRefusedError:
+            self.statistics.refused += 1
+            return False
+
+        self.statistics.connections += 1
+
+        try:
+            while True:
+                try:
+                    frame = await asyncio.wait_for(connection.receive(), self.timeout)
+                except asyncio.TimeoutError:
+                    self.statistics.timeouts += 1
+                    return False
+
+                if frame is None:
+                    return False
+
+                event = self.decode(frame)
+                name = event["event"]
+
+                if name == "connected":
+                    self.me = event["you"]
+
+                    if force_start:
+                        connection.send(self.encode({"event": "force-start"}))
+
+                elif name == "started":
+                    await self.take_turn(connection)
+
+                elif name == "move":
+                    if event["player"] == self.me and self.sent is not None:
+                        self.statistics.latencies.append(perf_counter() - self.sent)
+                        self.sent = None
+
+                    self.apply(event)
+
+                    if not self.replica.is_over:
+                        await self.take_turn(connection)
+
+                elif name == "ping":
+                    connection.send(self.encode({"event": "pong"}))
+
+                elif name == "end":
+                    return True
+
+                elif name == "error":
+                    self.statistics.errors += 1
+                    return False
+
+                elif name in ("disconnected", "redirect"):
+                    return False
+
+        finally:
+            await connection.close()
+
+    async def take_turn(self, connection: AsgiWebSocket) -> None:
+        """
+        Play a move after thinking for a while, if it is the turn of the client
+
+        Args:
+            connection: connection of the client
+        """
+
+        if self.replica.current_player != self.me:
+            return
+
+        if self.move_delay > 0:
+            await asyncio.sleep(self.rng.expovariate(1/self.move_delay))
+
+        self.statistics.moves += 1
+        message = self.choose_move()
+        self.sent = perf_counter()
+        connection.send(self.encode(message))
+
+class LoadTest:
+    """
+    Class used to drive the application with simulated rooms, each playing one game after the other until the end of
+    the load test
+
+    Attributes:
+        app: ASGI application
+        sentinel: sentinel of the application, counting its live rooms
+        statistics: measures of the load test
+        rooms: number of rooms played at the same time
+        duration: seconds the load test lasts
+        connect_rate: new rooms opened per second while ramping up
+        move_delay: mean seconds the clients think before playing
+        timeout: seconds a client waits for an event before giving up
+        game_types: game types played
+        kinds: public, private and bot rooms, repeated by their weight
+        binary: fraction of the clients speaking the binary protocol
+        rng: random generator of the load test
+        ports: next port of a client
+    """
+
+    def __init__(self, app: object, sentinel: object, args: argparse.Namespace) -> None:
+        self.app = app
+        self.sentinel = sentinel
+        self.statistics = Statistics()
+        self.rooms = args.rooms
+        self.duration = args.duration
+        self.connect_rate = args.connect_rate
+        self.move_delay = args.move_delay
+        self.timeout = args.timeout
+        self.game_types = args.games
+        self.kinds = [kind for kind in KINDS for _ in range(getattr(args, kind))]
+        self.binary = args.binary
+        self.rng = Random(args.seed)
+        self.ports = 1024
+
+    def client(self, game_type: str) -> Client:
+        return Client(self.app, self.statistics, game_type, Random(self.rng.random()), self.move_delay, self.timeout, self.rng.random() < self.binary)
+
+    def port(self) -> int:
+        self.ports += 1
+        return self.ports
+
+    async def play_room(self) -> None:
+        """
+        Play one game in a room of a random game type and kind
+        """
+
+        game_type = self.rng.choice(self.game_types)
+        kind = self.rng.choice(self.kinds)
+
+        if kind == "bot":
+            finished = [await self.client(game_type).play(uuid4().hex, True, self.port())]
+        else:
+            room_id = uuid4().hex if kind == "private" else ""
+            finished = await asyncio.gather(
+                self.client(game_type).play(room_id, False, self.port()),
+                self.client(game_type).play(room_id, False, self.port())
+            )
+
+        if any(finished):
+            self.statistics.games += 1
+
+    async def simulate(self, index: int, deadline: float) -> None:
+        """
+        Keep a room busy until the end of the load test
+
+        Args:
+            index: index of the room, which delays its first game while ramping up
+            deadline: time the load test ends
+        """
+
+        await asyncio.sleep(index/self.connect_rate)
+
+        while perf_counter() < deadline:
+            await self.play_room()
+
+    async def monitor(self, interval: float = 0.1) -> None:
+        """
+        Measure the lag of the event loop, and the memory when the live rooms peak, until cancelled
+
+        Args:
+            interval: seconds between two measures
+        """
+
+        loop = asyncio.get_running_loop()
+
+        while True:
+            due = loop.time() + interval
+            await asyncio.sleep(interval)
+            self.statistics.lags.append(max(0.0, loop.time() - due))
+
+            counts = self.sentinel.count_rooms()
+            rooms = sum(counts["public"].values()) + sum(counts["private"].values())
+
+            if rooms > self.statistics.peak_rooms:
+                self.statistics.peak_rooms = rooms
+                self.statistics.peak_memory = resident_memory()
+
+    async def run(self) -> Dict[str,object]:
+        """
+        Run the load test
+
+        Returns:
+            the report, as a valid JSON representation
+        """
+
+        lifespan = Lifespan(self.app)
+        await lifespan.startup()
+
+        baseline = resident_memory()
+        monitor = asyncio.get_running_loop().create_task(self.monitor())
+        self.statistics.started = perf_counter()
+        deadline = self.statistics.started + self.duration
+
+        rooms = [asyncio.get_running_loop().create_task(self.simulate(index, deadline)) for index in range(self.rooms)]
+
+        # the games still being played at the deadline are not waited for
+        await asyncio.wait(rooms, timeout=self.duration + self.timeout)
+        elapsed = perf_counter() - self.statistics.started
+
+        for task in rooms + [monitor]:
+            task.cancel()
+
+        await asyncio.gather(*rooms, monitor, return_exceptions=True)
+        await lifespan.shutdown()
+
+        return self.report(elapsed, baseline)
+
+    def report(self, elapsed: float, baseline: int) -> Dict[str,object]:
+        """
+        Summarise the measures of the load test
+
+        Args:
+            elapsed: seconds the load test lasted
+            baseline: resident memory before the load test, in bytes
+
+        Returns:
+            the report, as a valid JSON representation with the durations in milliseconds
+        """
+
+        statistics = self.statistics
+
+        def milliseconds(values: List[float]) -> Dict[str,Optional[float]]:
+            return {
+                name: None if value is None else round(value*1000, 3)
+                for name, value in (("p50", percentile(values, 0.5)), ("p95", percentile(values, 0.95)), ("p99", percentile(values, 0.99)), ("max", max(values, default=None)))
+            }
+
+        return {
+            "rooms": self.rooms,
+            "elapsed": round(elapsed, 3),
+            "connections": statistics.connections,
+            "connections_per_second": round(statistics.connections/elapsed, 1),
+            "refused": statistics.refused,
+            "games": statistics.games,
+            "moves": statistics.moves,
+            "moves_per_second": round(statistics.moves/elapsed, 1),
+            "errors": statistics.errors,
+            "timeouts": statistics.timeouts,
+            "move_to_broadcast_ms": milliseconds(statistics.latencies),
+            "event_loop_lag_ms": milliseconds(statistics.lags),
+            "peak_rooms": statistics.peak_rooms,
+            # the simulated clients live in the same process, so their replicas are counted along with the rooms
+            "memory_per_room": (statistics.peak_memory - baseline)//statistics.peak_rooms if statistics.peak_rooms and baseline else None
+        }
+
+def weight(value: str) -> int:
+    number = int(value)
+
+    if number < 0:
+        raise argparse.ArgumentTypeError("weights cannot be negative")
+
+    return number
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the server in-process through its ASGI interface, with simulated rooms playing random legal moves")
+    parser.add_argument("--rooms", type=int, default=1000, help="number of rooms played at the same time")
+    parser.add_argument("--duration", type=float, default=60, help="seconds the load test lasts")
+    parser.add_argument("--connect-rate", type=float, default=200, help="new rooms opened per second while ramping up")
+    parser.add_argument("--move-delay", type=float, default=0.5, help="mean seconds the clients think before playing, 0 to play at once")
+    parser.add_argument("--timeout", type=float, default=30, help="seconds a client waits for an event before giving up")
+    parser.add_argument("--games", nargs="+", choices=GAME_TYPES, default=list(GAME_TYPES), help="game types played")
+    parser.add_argument("--public", type=weight, default=2, help="weight of the public rooms")
+    parser.add_argument("--private", type=weight, default=1, help="weight of the private rooms")
+    parser.add_argument("--bot", type=weight, default=1, help="weight of the rooms played against a bot after a force-start")
+    parser.add_argument("--binary", type=float, default=0.0, help="fraction of the clients speaking the binary protocol")
+    parser.add_argument("--seed", type=int, default=2022, help="seed of the random choices of the clients")
+    parser.add_argument("--output", help="path of the JSON file the report is written to")
+    args = parser.parse_args()
+
+    if args.public + args.private + args.bot == 0:
+        parser.error("at least one kind of room needs a weight")
+
+    import main
+
+    report = asyncio.run(LoadTest(main.app, main.sentinel, args).run())
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if report["errors"] else 0)
@@ -1,13 +1,36 @@
 import asyncio
-import json
-from fastapi import FastAPI, WebSocketDisconnect, status, WebSocket
-from game import Game, Player
+import books
+import bot_pool
+import checkpoint
+import checkers_search
+import connect4_search
+import directory
+import metrics
+import movelog
+import protocol
+import ratelimit
+import reaper
+import settings
+import tablebase
+import tracing
+from fastapi import FastAPI, HTTPException, WebSocketDisconnect, status, WebSocket
+from encoding import decode, encode
+from game import BoardGame, Game, Player
 from connect4 import Connect4
 from checkers import Checkers, Piece
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Dict, List, Tuple
+from fastapi.responses import PlainTextResponse
+from collections import OrderedDict
+from directory import Directory, HashRing, Redirect
+from typing import Coroutine, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlencode
+from uuid import uuid4
 from math import floor, ceil
-from random import choice, random
+from profiler import MAX_DURATION, Profiler
+from random import choice
+from secrets import compare_digest
+from threading import get_ident
+from time import monotonic
 
 nicknames = ["John", "Ben", "Shiba", "Tom", "Tim", "Kong Ming", "Joe", "Spiderman", "Mona", "Link", "Sushiboy", "Squidquick", "Your penpal", "call me beep me", "Lebron James", "James Harden", "Curry", "Papa"]
 
@@ -25,22 +48,46 @@ class Sentinel:
     """
         Class used to create an object which provide central management for all rooms
 
+        Every lookup is indexed so that matchmaking does not depend on the number of live rooms: public rooms are
+        stored by their generated room ID, the public rooms that can still be joined are queued in creation order, and
+        private rooms are stored by the room ID chosen by the players.
+
+        When the server runs as several workers, every room lives in the worker its room ID hashes to on the ring, and
+        the directory shared by the workers tells where the rooms live and which public rooms are open. Joins for a
+        room of another worker raise a Redirect to it.
+
         Attributes:
             games: list of all supported game types
-            public_rooms: dictionary mapping all games to a list of all public Game instances
-            private_rooms: dictionary mapping all games to a list of Game instances
+            public_rooms: dictionary mapping all games to a dictionary of all public Game instances by room ID
+            private_rooms: dictionary mapping all games to a dictionary of all private Game instances by room ID
+            joinable_rooms: dictionary mapping all games to the public Game instances waiting for players, oldest first
+            sessions: dictionary mapping the session token of every player to their game type, access permission, room
+                and Player instance
+            directory: directory of the rooms shared by the workers
+            ring: hash ring assigning the room IDs to the workers
+            worker: URL of this worker
     """
 
     games = ["connect-4", "checkers"]
 
-    def __init__(self) -> None:
+    def __init__(self, directory: Directory, ring: HashRing, worker: str) -> None:
         """
         Constructor to instantiate an object of the class
+
+        Args:
+            directory: directory of the rooms shared by the workers
+            ring: hash ring assigning the room IDs to the workers
+            worker: URL of this worker
         """
 
-        # initialise public_rooms and private_rooms
-        self.public_rooms = {game_type: [] for game_type in self.games}
-        self.private_rooms = {game_type: [] for game_type in self.games}
+        # initialise public_rooms, private_rooms and joinable_rooms
+        self.public_rooms: Dict[str,Dict[str,Game]] = {game_type: {} for game_type in self.games}
+        self.private_rooms: Dict[str,Dict[str,Game]] = {game_type: {} for game_type in self.games}
+        self.joinable_rooms: Dict[str,OrderedDict[str,Game]] = {game_type: OrderedDict() for game_type in self.games}
+        self.sessions: Dict[str,Tuple[str,bool,Game,Player]] = {}
+        self.directory = directory
+        self.ring = ring
+        self.worker = worker
     
 
     def get_all_rooms(self) -> Dict[str,List[Tuple[int,str]]]:
@@ -54,14 +101,41 @@ class Sentinel:
         rooms = {}
 
         # cycle through all room ids in every room for every game type in public rooms
-        rooms["public"] = [(i, room.room_id) for game_type in self.public_rooms for i, room in enumerate(self.public_rooms[game_type])]
+        rooms["public"] = [(i, room_id) for game_type in self.public_rooms for i, room_id in enumerate(self.public_rooms[game_type])]
 
-        # cycle through all room ids in every room for every game type in public rooms
-        rooms["private"] = [(i, room.room_id) for game_type in self.public_rooms for i, room in enumerate(self.public_rooms[game_type])]
+        # cycle through all room ids in every room for every game type in private rooms
+        rooms["private"] = [(i, room_id) for game_type in self.private_rooms for i, room_id in enumerate(self.private_rooms[game_type])]
 
         return rooms
 
-    def get_room(self, game_type: str, room_id: str, is_public: bool) -> Game:
+    def count_rooms(self) -> Dict[str,Dict[str,int]]:
+        """
+        Count the rooms of every game type without going through them
+        
+        Returns:
+            dictionary mapping public, private and joinable to the number of rooms of each game type
+        """
+
+        return {
+            "public": {game_type: len(rooms) for game_type, rooms in self.public_rooms.items()},
+            "private": {game_type: len(rooms) for game_type, rooms in self.private_rooms.items()},
+            "joinable": {game_type: len(rooms) for game_type, rooms in self.joinable_rooms.items()}
+        }
+
+    def all_rooms(self) -> Iterator[Tuple[str,bool,Game]]:
+        """
+        Go through every room that is currently being handled
+        
+        Returns:
+            iterator of (game type, whether the room is public, Game instance) tuples
+        """
+
+        for is_public, rooms in ((True, self.public_rooms), (False, self.private_rooms)):
+            for game_type in rooms:
+                for room in rooms[game_type].values():
+                    yield game_type, is_public, room
+
+    def get_room(self, game_type: str, room_id: str, is_public: bool, routed: bool = False) -> Game:
         """
         Get a room that follows a particular criteria which can currently be joined
         
@@ -69,30 +143,43 @@ class Sentinel:
             game_type: type of game the room is for
             room_id: id of the room
             is_public: whether the room is a public or private
+            routed: whether the client was already redirected here, in which case it is not redirected again
+
+        Raises:
+            Redirect: the room lives in another worker
 
         Returns:
             Game instance that is currently joinable
         """ 
 
-        try:
-            if is_public:
-                # search for the first public Game instance that has not started yet
-                chosen_room = next((room for room in self.public_rooms[game_type] if not room.started), None)
-            
-            else:
-                # search for the first private Game instance that matches the input room_id
-                chosen_room = next((room for room in self.private_rooms[game_type] if room.room_id == room_id), None)
-
-                if chosen_room.started:
-                    # make sure the chosen instance is not started yet
-                    raise RuntimeError("Room ID is currently in use")
-        
-        except KeyError:
+        if game_type not in self.games:
             # make sure it is a supported game
             raise RuntimeError("Invalid game-type")
+
+        if is_public:
+            # rooms leave the queue as soon as they start, so the oldest one is waiting for players
+            chosen_room = next(iter(self.joinable_rooms[game_type].values()), None)
+
+            if chosen_room is None and not routed:
+                # another worker may have a public room waiting for players
+                open_room = self.directory.open_room(game_type)
+
+                if open_room is not None and open_room[1] != self.worker:
+                    raise Redirect(open_room[1])
         
-        except AttributeError:
-            pass
+        else:
+            # private rooms live where they were created, or where their room ID hashes to
+            worker = self.directory.locate(game_type, room_id) or self.ring.owner(room_id)
+
+            if worker != self.worker:
+                raise Redirect(worker)
+
+            # look up the private Game instance that matches the input room_id
+            chosen_room = self.private_rooms[game_type].get(room_id)
+
+            if chosen_room is not None and chosen_room.started:
+                # make sure the chosen instance is not started yet
+                raise RuntimeError("Room ID is currently in use")
 
         # create a new room if no available room found
         if chosen_room is None:
@@ -106,13 +193,20 @@ class Sentinel:
         
         Args:
             game_type: type of game the room is for
-            room_id: id of the room
+            room_id: id of the room, replaced by a generated one for public rooms
             is_public: whether the room is a public or private
 
         Returns:
             new Game instance
         """
 
+        # public rooms are not chosen by ID, so give them a unique one to index them by, which hashes to this worker
+        if is_public:
+            room_id = uuid4().hex
+
+            while self.worker in self.ring.workers and self.ring.owner(room_id) != self.worker:
+                room_id = uuid4().hex
+
         # create a new room with appropriate class
         if game_type == "connect-4":
             room = Connect4(room_id)
@@ -121,12 +215,116 @@ class Sentinel:
         
         # add it to the correct dictionary depending on the chosen access permission
         if is_public:
-            self.public_rooms[game_type].append(room)
+            self.public_rooms[game_type][room_id] = room
+            self.joinable_rooms[game_type][room_id] = room
         else:
-            self.private_rooms[game_type].append(room)
+            self.private_rooms[game_type][room_id] = room
+
+        if move_log:
+            room.log = move_log.open(game_type, room_id)
+
+        self.directory.register(game_type, room_id, is_public, self.worker)
         
         return room
 
+    def restore_room(self, game_type: str, room: Game, is_public: bool) -> None:
+        """
+        Add a room restored from a checkpoint, whose players can reclaim their seats with their session tokens
+
+        Args:
+            game_type: type of game the room is for
+            room: restored room
+            is_public: whether the room is a public or private
+        """
+
+        # started rooms are dropped from the joinable ones by update_room, as if they just started
+        if is_public:
+            self.public_rooms[game_type][room.room_id] = room
+            self.joinable_rooms[game_type][room.room_id] = room
+        else:
+            self.private_rooms[game_type][room.room_id] = room
+
+        if move_log:
+            room.log = move_log.open(game_type, room.room_id)
+
+        self.directory.register(game_type, room.room_id, is_public, self.worker)
+        self.update_room(game_type, room)
+
+        for player in room.connections:
+            if player is not room.dummy_plug:
+                self.add_session(game_type, room, is_public, player)
+
+    def update_room(self, game_type: str, room: Game) -> None:
+        """
+        Stop offering a public room to the players looking for one, here and in the other workers, once a player or
+        the bot joined it and it started
+
+        Args:
+            game_type: type of game the room is for
+            room: room that was joined
+        """
+
+        # only public rooms are ever joinable
+        if room.started and self.joinable_rooms[game_type].pop(room.room_id, None) is not None:
+            self.directory.set_joinable(game_type, room.room_id, False)
+
+    def add_session(self, game_type: str, room: Game, is_public: bool, player: Player) -> None:
+        """
+        Remember the session of a player, so that they can reclaim their seat if their connection drops
+
+        Args:
+            game_type: type of game the room is for
+            room: room the player joined
+            is_public: whether the room is a public or private
+            player: player that joined
+        """
+
+        self.sessions[player.token] = (game_type, is_public, room, player)
+
+    def get_session(self, game_type: str, token: str) -> Tuple[bool,Game,Player]:
+        """
+        Get the seat a player left, from their session token
+        
+        Args:
+            game_type: type of game the room is for
+            token: session token given to the player when they joined
+
+        Raises:
+            Redirect: the session lives in another worker
+
+        Returns:
+            tuple containing whether the room is public, the Game instance and the Player instance
+        """
+
+        session = self.sessions.get(token)
+
+        if session is None:
+            # the token starts with the room ID, whose worker holds the session
+            worker = self.directory.locate(game_type, token.rpartition(".")[0])
+
+            if worker is not None and worker != self.worker:
+                raise Redirect(worker)
+
+        if session is None or session[0] != game_type:
+            raise RuntimeError("Session expired")
+
+        _, is_public, room, player = session
+
+        if player.away is None:
+            raise RuntimeError("Session is already connected")
+
+        return is_public, room, player
+
+    def remove_session(self, player: Player) -> None:
+        """
+        Forget the session of a player, whose seat can no longer be reclaimed
+
+        Args:
+            player: player whose session is forgotten
+        """
+
+        self.sessions.pop(player.token, None)
+
     def remove_room(self, game_type: str, room: Game, is_public: bool) -> None:
         """
         Remove a room
@@ -140,17 +338,167 @@ class Sentinel:
         # remove it from the correct dictionary depending on the chosen access permission
         try:
             if is_public:
-                self.public_rooms[game_type].remove(room)
+                del self.public_rooms[game_type][room.room_id]
+                self.joinable_rooms[game_type].pop(room.room_id, None)
             else:
-                self.private_rooms[game_type].remove(room)
+                del self.private_rooms[game_type][room.room_id]
         except KeyError:
             raise RuntimeError("Room does not exist")
 
+        for player in room.connections:
+            self.remove_session(player)
+
+        self.directory.unregister(game_type, room.room_id)
+
+        # the bot of the room does not need to finish thinking
+        bots.cancel(room)
+
+        if room.bot_turn is not None:
+            room.bot_turn.cancel()
+
 
 # instantiate sentinel and app
-sentinel = Sentinel()
+sentinel = Sentinel(directory.get_directory(settings.DIRECTORY), HashRing(settings.WORKERS), settings.WORKER)
 app = FastAPI()
 
+# map the opening books and the endgame tablebase, if they were generated
+connect4_book = books.load_book(settings.CONNECT4_BOOK)
+checkers_book = books.load_book(settings.CHECKERS_BOOK)
+checkers_tablebase = tablebase.load_tablebase(settings.CHECKERS_TABLEBASE)
+
+# worker processes running the search engines of the bots, away from the event loop
+bots = bot_pool.BotPool(settings.BOT_WORKERS, settings.BOT_QUEUE_GRACE, ("connect4_search", "checkers_search"))
+
+@app.on_event("startup")
+def start_bots() -> None:
+    """
+    Start the worker processes of the bots along with the server
+    """
+
+    bots.start()
+
+@app.on_event("shutdown")
+def stop_bots() -> None:
+    """
+    Stop the worker processes of the bots when the server shuts down
+    """
+
+    bots.shutdown()
+
+# limits the events of every connection and every address before they are handled
+limiter = ratelimit.RateLimiter(settings.RATE_LIMIT, settings.RATE_LIMIT_BURST, settings.ADDRESS_RATE_LIMIT, settings.ADDRESS_RATE_LIMIT_BURST, settings.RATE_LIMIT_ADDRESSES, settings.RATE_LIMIT_POLICY)
+
+# append-only log of the moves of every room, written behind the event loop
+move_log = movelog.get_move_log(settings.MOVE_LOG, settings.MOVE_LOG_INTERVAL)
+
+@app.on_event("startup")
+def start_move_log() -> None:
+    """
+    Start writing the move log along with the server
+    """
+
+    if move_log:
+        move_log.start()
+
+@app.on_event("shutdown")
+def stop_move_log() -> None:
+    """
+    Write the moves still buffered when the server shuts down
+    """
+
+    if move_log:
+        move_log.stop()
+
+# reclaim the rooms that are no longer played, and the connections that stopped answering the heartbeats
+room_reaper = reaper.Reaper(sentinel, settings.REAPER_INTERVAL, settings.HEARTBEAT_TIMEOUT, settings.ROOM_IDLE_TIMEOUT, settings.ROOM_FINISHED_TIMEOUT, settings.ROOM_MAX_LIFETIME)
+
+@app.on_event("startup")
+async def start_reaper() -> None:
+    """
+    Start sweeping the rooms along with the server
+    """
+
+    room_reaper.start()
+
+@app.on_event("shutdown")
+async def stop_reaper() -> None:
+    """
+    Stop sweeping the rooms when the server shuts down
+    """
+
+    room_reaper.stop()
+
+@app.on_event("startup")
+async def start_directory() -> None:
+    """
+    Forget the rooms a previous run of this worker left in the directory, and start reporting the players online
+    """
+
+    sentinel.directory.clear(settings.WORKER)
+    asyncio.get_running_loop().create_task(report_online())
+
+@app.on_event("shutdown")
+def stop_directory() -> None:
+    """
+    Finish the writes to the directory still pending when the server shuts down
+    """
+
+    sentinel.directory.close()
+
+@app.on_event("startup")
+async def start_monitor() -> None:
+    """
+    Start measuring the lag of the event loop along with the server
+    """
+
+    asyncio.get_running_loop().create_task(metrics.monitor_event_loop())
+
+@app.on_event("startup")
+async def restore_rooms() -> None:
+    """
+    Restore the rooms of the checkpoint written when the server last shut down, once the directory was cleared
+    """
+
+    global total_online
+
+    if not settings.CHECKPOINT:
+        return
+
+    loop = asyncio.get_running_loop()
+
+    for game_type, is_public, room in checkpoint.restore(settings.CHECKPOINT):
+        sentinel.restore_room(game_type, room, is_public)
+
+        if room.dummy_plug:
+            total_online += 1
+
+        # the players have a while to reconnect before their seats are freed
+        for player in room.connections:
+            if player is not room.dummy_plug:
+                player.release = loop.create_task(release_seat(game_type, room, is_public, player, settings.CHECKPOINT_GRACE))
+
+        # the bot was thinking when the server shut down
+        if room.dummy_plug and room.started and not room.is_over and room.current_player == room.dummy_plug.id:
+            start_bot_turn(room, dummy_make_connect4_move(room) if game_type == "connect-4" else dummy_make_checkers_move(room))
+
+@app.on_event("shutdown")
+def save_rooms() -> None:
+    """
+    Write a checkpoint of every room when the server shuts down, after the connections were closed
+    """
+
+    if settings.CHECKPOINT:
+        checkpoint.save(settings.CHECKPOINT, sentinel.all_rooms())
+
+async def report_online() -> None:
+    """
+    Report the number of players connected to this worker to the directory forever, every interval
+    """
+
+    while True:
+        sentinel.directory.report(settings.WORKER, total_online)
+        await asyncio.sleep(settings.DIRECTORY_INTERVAL)
+
 # CORS whitelisting
 origins = [
     "http://localhost:3000",
@@ -172,14 +520,150 @@ async def get_statistics() -> str:
     Handle GET request to /statistics end-point to show current statistics of the app
 
     Returns:
-        current statistics as a JSON string
+        current statistics as a JSON string, with the players online across every worker and the rooms of this worker
     """
-    
-    global total_online
-    return json.dumps({"total": total_online})
+
+    # the players of the other workers are as of their last report, the players of this worker are counted live
+    return encode({"total": sentinel.directory.total_online(settings.WORKER) + total_online, "rooms": sentinel.count_rooms()})
+
+def room_states() -> Dict[Tuple[str,...],int]:
+    """
+    Count the rooms of this worker by game type and state, for the metrics
+
+    Returns:
+        dictionary mapping (game type, state) to the number of rooms, where the state is waiting, playing or finished
+    """
+
+    rooms = {(game_type, state): 0 for game_type in sentinel.games for state in ("waiting", "playing", "finished")}
+
+    for game_type, _, room in sentinel.all_rooms():
+        state = "finished" if room.is_over else "playing" if room.started else "waiting"
+        rooms[game_type, state] += 1
+
+    return rooms
+
+def bot_ratio() -> Dict[Tuple[str,...],float]:
+    """
+    Get the share of the started rooms of every game type where a player faces the dummy plug, for the metrics
+
+    Returns:
+        dictionary mapping (game type,) to the ratio of rooms with a dummy plug, 0 when no room started
+    """
+
+    started = {game_type: 0 for game_type in sentinel.games}
+    against_bot = dict(started)
+
+    for game_type, _, room in sentinel.all_rooms():
+        if room.started:
+            started[game_type] += 1
+            against_bot[game_type] += room.dummy_plug is not None
+
+    return {(game_type,): against_bot[game_type]/started[game_type] if started[game_type] else 0 for game_type in sentinel.games}
+
+metrics.REGISTRY.register(metrics.Gauge("boredgames_players_online", "Players connected to this worker", (), lambda: {(): total_online}))
+metrics.REGISTRY.register(metrics.Gauge("boredgames_rooms", "Rooms of this worker by game type and state", ("game", "state"), room_states))
+metrics.REGISTRY.register(metrics.Gauge("boredgames_dummy_plug_ratio", "Share of the started rooms played against the dummy plug", ("game",), bot_ratio))
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics() -> PlainTextResponse:
+    """
+    Handle GET request to /metrics end-point to expose the metrics of this worker to Prometheus
+
+    Returns:
+        the metrics in the Prometheus text format
+    """
+
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+def check_admin(token: str) -> None:
+    """
+    Make sure a request to an admin end-point comes from an administrator
+
+    Args:
+        token: token sent with the request
+
+    Raises:
+        HTTPException: the admin end-points are disabled, or the token is wrong
+    """
+
+    if not settings.ADMIN_TOKEN or not compare_digest(token, settings.ADMIN_TOKEN):
+        raise HTTPException(status.HTTP_403_FORBIDDEN, "Forbidden")
+
+profiling = False # whether a profile is being captured, only one can be captured at a time
+
+@app.get("/admin/profile", response_class=PlainTextResponse)
+async def get_profile(token: str = "", seconds: float = 10, interval: float = 0.005) -> PlainTextResponse:
+    """
+    Handle GET request to /admin/profile end-point to capture a sampled CPU profile of the event loop of this worker
+
+    Args:
+        token: admin token
+        seconds: duration of the profile, up to a minute
+        interval: seconds between two samples
+
+    Returns:
+        the profile in the collapsed stack format, for flamegraph.pl or speedscope
+    """
+
+    global profiling
+    check_admin(token)
+
+    if profiling:
+        raise HTTPException(status.HTTP_409_CONFLICT, "A profile is already being captured")
+
+    profiling = True
+    sampler = Profiler(get_ident(), interval) # the end-point runs in the thread of the event loop
+    sampler.start()
+
+    try:
+        await asyncio.sleep(min(max(seconds, 0), MAX_DURATION))
+    finally:
+        profile = sampler.stop()
+        profiling = False
+
+    return PlainTextResponse(profile)
+
+@app.get("/admin/traces")
+async def get_traces(token: str = "", limit: int = 1000) -> List[Dict[str, object]]:
+    """
+    Handle GET request to /admin/traces end-point to show the latest spans traced in this worker
+
+    Args:
+        token: admin token
+        limit: maximum number of spans
+
+    Returns:
+        the spans, oldest first, whose parent and trace IDs link them into trees
+    """
+
+    check_admin(token)
+
+    return tracing.tracer.recent(limit)
+
+@app.post("/admin/tracing")
+async def set_tracing(token: str = "", enabled: bool = True, sample_rate: float = -1) -> Dict[str, object]:
+    """
+    Handle POST request to /admin/tracing end-point to switch tracing on or off in this worker, without restarting it
+
+    Args:
+        token: admin token
+        enabled: whether spans are recorded
+        sample_rate: fraction of the events traced, unchanged if negative
+
+    Returns:
+        the tracing settings now in use
+    """
+
+    check_admin(token)
+
+    tracing.tracer.enabled = enabled
+    if sample_rate >= 0:
+        tracing.tracer.sample_rate = min(sample_rate, 1.0)
+
+    return {"enabled": tracing.tracer.enabled, "sample_rate": tracing.tracer.sample_rate}
 
 @app.websocket("/ws/{game_type}")
-async def join_room(websocket: WebSocket, game_type: str, nickname: str, room_id: str = "") -> None:
+async def join_room(websocket: WebSocket, game_type: str, nickname: str, room_id: str = "", token: str = "", routed: bool = False) -> None:
     """
     Handle ws request to /ws/ end-points to allow connection to games
 
@@ -188,15 +672,45 @@ async def join_room(websocket: WebSocket, game_type: str, nickname: str, room_id
         game_type: type of game the client wants to connect to
         nickname: nickname the websocket client is using
         room_id: room ID of the room the client wants to connect to
+        token: session token of the seat the client wants to reclaim after its connection dropped
+        routed: whether the client was redirected by another worker
     """
 
     global total_online
     is_public = room_id == "" # if room_id is empty, then it is a public game
+    player = None
+    address = (websocket.scope.get("client") or ("",))[0]
+
+    if not limiter.connect(address):
+        # the address is opening connections faster than its rate limit, refuse before doing anything for it
+        metrics.CONNECTIONS_LIMITED.inc()
+        await websocket.close(status.WS_1008_POLICY_VIOLATION)
+        return
 
-    await websocket.accept() # acccept the incoming websocket connection
+    # clients offering the binary subprotocol get binary frames, the others keep speaking JSON
+    codec = protocol.negotiate(game_type, websocket.scope.get("subprotocols", []))
+    await websocket.accept(subprotocol=protocol.SUBPROTOCOL if codec else None) # acccept the incoming websocket connection
 
     try:
-        game = sentinel.get_room(game_type, room_id, is_public) # get an available game from sentinel
+        if token:
+            is_public, game, player = sentinel.get_session(game_type, token) # get the seat the client left
+        else:
+            game = sentinel.get_room(game_type, room_id, is_public, routed) # get an available game from sentinel
+
+    except Redirect as redirect:
+        # the room lives in another worker, tell the client where to connect instead
+        query = {"nickname": nickname, "room_id": room_id, "token": token, "routed": "true"}
+        message = {
+            "event": "redirect",
+            "url": f"{redirect.worker}/ws/{game_type}?{urlencode(query)}"
+        }
+
+        if codec:
+            await websocket.send_bytes(codec.encode(message))
+        else:
+            await websocket.send_text(encode(message))
+
+        await websocket.close(status.WS_1000_NORMAL_CLOSURE)
     
     except RuntimeError as e:
         # if any runtime error raised, close the connection
@@ -205,9 +719,19 @@ async def join_room(websocket: WebSocket, game_type: str, nickname: str, room_id
     else:
 
         try:
-            player = await game.join(websocket, nickname) # join the game and be assigned a player number
+            if player:
+                await game.reattach(player, websocket, codec) # take the seat back and catch up with the game
+            else:
+                player = await game.join(websocket, nickname, codec) # join the game and be assigned a player number
+
+                if player:
+                    sentinel.add_session(game_type, game, is_public, player)
+                    sentinel.update_room(game_type, game)
+
             if player:
                 total_online += 1 # increment total number of connections by 1
+                player.bucket = limiter.bucket()
+                player.address = address
                 
                 # choose the correct method to handle each game
                 if game_type == "connect-4":
@@ -219,25 +743,138 @@ async def join_room(websocket: WebSocket, game_type: str, nickname: str, room_id
             # if the websocket connection drops, handle the cleanup
 
             total_online -= 1 # decrement total number of connections by 1
-            game.remove(player) # remove the websocket/player from the game
-            
-            if game.dummy_plug.id:
-                total_online -= 1
-
-            # broadcast the disconnection
-            await game.broadcast({
-                "event": "disconnected",
-                "message": f"{nickname} (opponent) disconnected"
-            })
-            
-            # if all connections in the game is lost, remove the room
-            if len(game.connections) == 0 or game.dummy_plug.id:
-                try:
-                    sentinel.remove_room(game_type, game, is_public)
-                except RuntimeError:
-                    pass
 
-async def predict_next_connect4_move(game: Connect4):
+            if game.started and not game.unused_player_numbers and player.token in sentinel.sessions:
+                # keep the seat for a while if there is still an opponent, a brief network blip should not end the game
+                game.detach(player)
+                player.release = asyncio.get_running_loop().create_task(release_seat(game_type, game, is_public, player))
+            else:
+                await leave_room(game_type, game, is_public, player)
+
+async def release_seat(game_type: str, game: Game, is_public: bool, player: Player, grace: float = settings.RECONNECT_GRACE) -> None:
+    """
+    Free the seat of a player that did not reconnect within the grace window
+
+    Args:
+        game_type: type of game the room is for
+        game: room the player left
+        is_public: whether the room is a public or private
+        player: player whose connection dropped
+        grace: seconds the seat is kept
+    """
+
+    await asyncio.sleep(grace)
+
+    player.release = None
+    await leave_room(game_type, game, is_public, player)
+
+async def leave_room(game_type: str, game: Game, is_public: bool, player: Player) -> None:
+    """
+    Remove a player from their room for good, and remove the room once nobody is left to play in it
+
+    Args:
+        game_type: type of game the room is for
+        game: room the player left
+        is_public: whether the room is a public or private
+        player: player that left
+    """
+
+    global total_online
+
+    sentinel.remove_session(player)
+
+    if player not in game.connections:
+        # the seat was already freed
+        return
+
+    game.remove(player) # remove the websocket/player from the game
+    
+    if game.dummy_plug:
+        total_online -= 1
+
+    # broadcast the disconnection
+    await game.broadcast({
+        "event": "disconnected",
+        "message": f"{player.nickname} (opponent) disconnected"
+    })
+    
+    # if all connections in the game is lost, remove the room
+    if len(game.connections) == 0 or game.dummy_plug:
+        try:
+            sentinel.remove_room(game_type, game, is_public)
+        except RuntimeError:
+            pass
+
+async def receive(player: Player, game_type: str) -> Dict[str, object]:
+    """
+    Receive the next event of a player, in the protocol its connection negotiated. Frames over the rate limits are
+    rejected before being decoded, and frames that cannot be decoded into an event are dropped without an answer, so
+    a flooding client costs as little as possible to the other players
+
+    Args:
+        player: player whose event is received
+        game_type: type of game the player is playing
+
+    Raises:
+        WebSocketDisconnect: the connection dropped, or was closed for being over the rate limits
+
+    Returns:
+        a valid JSON representation of the event
+    """
+
+    while True:
+        message = await player.connection.receive()
+
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", status.WS_1000_NORMAL_CLOSURE))
+
+        scope = limiter.check(player.bucket, player.address)
+
+        if scope:
+            metrics.MESSAGES_LIMITED.inc(scope, limiter.policy)
+
+            if limiter.policy == ratelimit.CLOSE:
+                await player.connection.close(status.WS_1008_POLICY_VIOLATION)
+                raise WebSocketDisconnect(status.WS_1008_POLICY_VIOLATION)
+
+            continue
+
+        received = decode_event(player, message, game_type)
+
+        if received is None:
+            metrics.MESSAGES_MALFORMED.inc()
+            continue
+
+        metrics.MESSAGES_RECEIVED.inc(metrics.received_event(received["event"]))
+
+        return received
+
+def decode_event(player: Player, message: Dict[str, object], game_type: str) -> Optional[Dict[str, object]]:
+    """
+    Decode a frame received from a player
+
+    Args:
+        player: player who sent the frame
+        message: ASGI message of the frame
+        game_type: type of game the player is playing
+
+    Returns:
+        a valid JSON representation of the event, None if the frame is not an event of the protocol of the connection,
+        or lacks a field its handler reads
+    """
+
+    try:
+        received = player.codec.decode(message["bytes"]) if player.codec else decode(message["text"])
+    except (KeyError, TypeError, ValueError, RuntimeError):
+        return None
+
+    if not isinstance(received, dict) or not isinstance(received.get("event"), str):
+        return None
+
+    return received if protocol.is_valid_event(game_type, received) else None
+
+@tracing.traced("connect-4.predict")
+def predict_next_connect4_move(game: Connect4) -> int:
     """
         used by the bot to generate the next connect 4 move. Implementation is bizzare but that's what makes it good
         NOTE: Actually stronger than me, I keep losing to it
@@ -250,7 +887,6 @@ async def predict_next_connect4_move(game: Connect4):
     opponent = 1 if game.dummy_plug.id == 2 else 2
     
     for col in range(game.dimensions["col"]):
-        await asyncio.sleep(0.2)
         for i in reversed(range(game.dimensions["row"])):
             if game.board[col][i] == 0:
                 rank = 0
@@ -266,7 +902,6 @@ async def predict_next_connect4_move(game: Connect4):
                     except IndexError:
                         pass
                 else:
-                    await asyncio.sleep(0.4)
                     return col
 
                 # prefer not putting on the corner if it is the bottom piece
@@ -276,7 +911,6 @@ async def predict_next_connect4_move(game: Connect4):
                 n = game.count_all_consecutive(opponent, col,i)
                 
                 if n >= 3:
-                    await asyncio.sleep(0.4)
                     return col
                 
                 if rank != -100:
@@ -290,13 +924,13 @@ async def predict_next_connect4_move(game: Connect4):
                 break
 
     lst = moves[max(moves.keys())]
-    await asyncio.sleep(random()*1.2)
 
     if len(lst) == 1:
         return lst[0]
     else:
         return lst[choice([floor(len(lst)/2),ceil(len(lst)/2)])]
 
+@tracing.traced("connect-4.bot_move")
 async def dummy_make_connect4_move(game: Connect4) -> None:
     """
         allow the dummy plug to make a connect 4 move
@@ -304,10 +938,30 @@ async def dummy_make_connect4_move(game: Connect4) -> None:
         Args:
             game: the instance of connect 4 game the move should be calculated against
     """
-    next_move = await predict_next_connect4_move(game)
+    started = game.pacing.now()
+    next_move = books.probe_connect4(connect4_book, game)
+
+    if next_move is None and settings.CONNECT4_ENGINE == "negamax":
+        try:
+            next_move = await bots.compute(game, connect4_search.think, connect4_search.snapshot(game), settings.CONNECT4_TIME_LIMIT, settings.CONNECT4_NODE_LIMIT)
+        except bot_pool.JobCancelled:
+            return
+
+        # the workers are overloaded, so play the best move at depth 1 rather than keep the player waiting
+        if next_move is None:
+            next_move = connect4_search.best_move(game, 0, 0, 1)
+    elif next_move is None:
+        next_move = predict_next_connect4_move(game)
+
+    # reveal the move once the bot looks like it has been thinking
+    thought = game.pacing.now()
+    await game.pacing.reveal("connect-4", started)
+    metrics.BOT_THINK.observe(thought - started, "connect-4")
+    metrics.BOT_PACING.observe(game.pacing.now() - thought, "connect-4")
 
     # make a new move with the receieved event
-    winner, coords = game.make_move(game.dummy_plug.id,next_move)
+    with metrics.MAKE_MOVE.time("connect-4"):
+        winner, coords = game.make_move(game.dummy_plug.id,next_move)
     
     # broadcast the move to all players
     await game.broadcast({
@@ -325,6 +979,56 @@ async def dummy_make_connect4_move(game: Connect4) -> None:
             "player": winner
         })
 
+def start_bot_turn(game: Game, turn: Coroutine) -> None:
+    """
+    Run a turn of the dummy plug as a task of its room, so that the handler of the player goes back to receiving
+    events straight away instead of waiting for the bot to think and reveal its move. The task is cancelled when the
+    room is removed
+
+    Args:
+        game: room of the dummy plug
+        turn: coroutine playing the turn
+    """
+
+    game.bot_turn = asyncio.get_running_loop().create_task(turn)
+
+async def dummy_answer_rematch(game_type: str, game: BoardGame, success: bool) -> None:
+    """
+    Let the dummy plug answer the rematch vote of a player after a pause, and make the first move if it is its turn
+
+    Args:
+        game_type: type of game of the room
+        game: room of the dummy plug
+        success: whether the vote reset the board, otherwise the dummy plug leaves
+    """
+
+    await game.pacing.wait("rematch")
+
+    if not success:
+        # broadcast the disconnection
+        await game.broadcast({
+            "event": "disconnected",
+            "message": f"{game.dummy_plug.nickname} (opponent) disconnected"
+        })
+        return
+
+    # broadcast that the rematch is happening
+    message = {
+        "event": "rematch",
+        "player": game.current_player
+    }
+
+    if game_type == "checkers":
+        message["moves"] = game.legal_moves()
+
+    await game.broadcast(message)
+
+    if game.current_player == game.dummy_plug.id:
+        if game_type == "connect-4":
+            await dummy_make_connect4_move(game)
+        else:
+            await dummy_make_checkers_move(game)
+
 async def join_connect4(game: Connect4, player: Player):
     """
     Handle connect 4 games
@@ -339,8 +1043,17 @@ async def join_connect4(game: Connect4, player: Player):
     while True:
 
         # recieve a new event from the websocket
-        received = await player.connection.receive_json()
+        received = await receive(player, "connect-4")
+        player.last_seen = monotonic()
+        span = tracing.span("connect-4.event", event=received.get("event"), room=game.room_id).start()
+
         try:
+            # heartbeats keep the connection alive, but only game events keep the room active
+            if received["event"] == "pong":
+                continue
+
+            game.last_activity = player.last_seen
+
             if received["event"] == "force-start":
                 if not game.started:
                     
@@ -349,15 +1062,17 @@ async def join_connect4(game: Connect4, player: Player):
                     ok = await game.join(None, get_next_name())
                     if ok:
                         total_online += 1
+                        sentinel.update_room("connect-4", game)
                         
                         if game.started and game.current_player == game.dummy_plug.id:
-                            await dummy_make_connect4_move(game)
+                            start_bot_turn(game, dummy_make_connect4_move(game))
 
             elif received["event"] == "move" and not game.is_over:
                 column = received["column"]
                 
                 # make a new move with the receieved event
-                winner, coords = game.make_move(player.id, column)
+                with metrics.MAKE_MOVE.time("connect-4"):
+                    winner, coords = game.make_move(player.id, column)
                 
                 # broadcast the move to all players
                 await game.broadcast({
@@ -375,31 +1090,22 @@ async def join_connect4(game: Connect4, player: Player):
                         "player": winner
                     })
                 
-                elif game.dummy_plug.id:
-                    await dummy_make_connect4_move(game)
+                elif game.dummy_plug:
+                    start_bot_turn(game, dummy_make_connect4_move(game))
 
             elif received["event"] == "rematch" and game.is_over:
                 success = game.reset_board(player.id) # cast their vote to reset the board
 
+                # the dummy plug answers the vote after a pause, without holding the handler
+                if game.dummy_plug:
+                    start_bot_turn(game, dummy_answer_rematch("connect-4", game, success))
+
                 # broadcast that the rematch is happening
-                if success:
-                    if game.dummy_plug.id:
-                        await asyncio.sleep(random()*4)
+                elif success:
                     await game.broadcast({
                         "event": "rematch",
                         "player": game.current_player
                     })
-
-                    if game.current_player == game.dummy_plug.id:
-                        await dummy_make_connect4_move(game)
-                elif game.dummy_plug.id:
-                    await asyncio.sleep(random()*4)
-                    
-                    # broadcast the disconnection
-                    await game.broadcast({
-                        "event": "disconnected",
-                        "message": f"{game.dummy_plug.id} (opponent) disconnected"
-                    })
             else:
                 # message the client that the event is not valid 
                 await game.send(player, {
@@ -414,7 +1120,11 @@ async def join_connect4(game: Connect4, player: Player):
                 "message": str(e)
         })
 
-async def predict_next_checkers_move(game: Checkers) -> Tuple[Tuple[int,int],Tuple[int,int]]:
+        finally:
+            span.end()
+
+@tracing.traced("checkers.predict")
+def predict_next_checkers_move(game: Checkers) -> Tuple[Tuple[int,int],Tuple[int,int]]:
     """
         used by the bot to generate the next checkers move. Implementation is bizzare but that's what makes it good
         NOTE: Actually stronger than me, I keep losing to it
@@ -428,7 +1138,6 @@ async def predict_next_checkers_move(game: Checkers) -> Tuple[Tuple[int,int],Tup
     if game.all_moves["moves_eat"][game.dummy_plug.id]:
         
         for starting_position in game.all_moves["moves_eat"][game.dummy_plug.id]:
-            await asyncio.sleep(0.2)
             rank = 1
 
             piece = game.board[starting_position[0]][starting_position[1]]
@@ -480,8 +1189,6 @@ async def predict_next_checkers_move(game: Checkers) -> Tuple[Tuple[int,int],Tup
     
     else:
         for starting_position in game.all_moves["moves"][game.dummy_plug.id]:
-            await asyncio.sleep(0.2)
-            
             piece = game.board[starting_position[0]][starting_position[1]]
             
             for move in game.all_moves["moves"][game.dummy_plug.id][starting_position]:
@@ -521,10 +1228,10 @@ async def predict_next_checkers_move(game: Checkers) -> Tuple[Tuple[int,int],Tup
 
                 moves[rank].append((starting_position, move["possible_move"]))
     
-    await asyncio.sleep(random()*2)
     lst = moves[max(moves.keys())]
     return choice(lst)
 
+@tracing.traced("checkers.bot_move")
 async def dummy_make_checkers_move(game: Checkers) -> None:
     """
         allow the dummy plug to make a checkers move
@@ -532,11 +1239,36 @@ async def dummy_make_checkers_move(game: Checkers) -> None:
         Args:
             game: the instance of connect 4 game the move should be calculated against
     """
-    starting_position, next_position = await predict_next_checkers_move(game)
+    started = game.pacing.now()
+    move = books.probe_checkers(checkers_book, game)
+
+    # play the endgames straight from the tablebase
+    if move is None and checkers_tablebase:
+        move = checkers_tablebase.best_move(game)
+
+    if move is None and settings.CHECKERS_ENGINE == "alphabeta":
+        try:
+            move = await bots.compute(game, checkers_search.think, checkers_search.snapshot(game), settings.CHECKERS_TIME_LIMIT, settings.CHECKERS_NODE_LIMIT)
+        except bot_pool.JobCancelled:
+            return
+
+        # the workers are overloaded, so play the best move at depth 1 rather than keep the player waiting
+        if move is None:
+            move = checkers_search.best_move(game, 0, 0, 1)
+    elif move is None:
+        move = predict_next_checkers_move(game)
+
+    # reveal the move once the bot looks like it has been thinking
+    thought = game.pacing.now()
+    await game.pacing.reveal("checkers", started)
+    metrics.BOT_THINK.observe(thought - started, "checkers")
+    metrics.BOT_PACING.observe(game.pacing.now() - thought, "checkers")
+    starting_position, next_position = move
 
     #get the resulting move, and add a new JSON key event
-    result, winner = game.make_move(game.dummy_plug.id, starting_position, next_position)
-    result.update({"event": "move"})
+    with metrics.MAKE_MOVE.time("checkers"):
+        result, winner = game.make_move(game.dummy_plug.id, starting_position, next_position)
+    result.update({"event": "move", "moves": game.legal_moves()})
 
     # broadcast the move to all players
     await game.broadcast(result)
@@ -566,9 +1298,17 @@ async def join_checkers(game: Checkers, player: Player) -> None:
     while True:
 
         # recieve a new event from the websocket
-        received = await player.connection.receive_json()
+        received = await receive(player, "checkers")
+        player.last_seen = monotonic()
+        span = tracing.span("checkers.event", event=received.get("event"), room=game.room_id).start()
         
         try:
+            # heartbeats keep the connection alive, but only game events keep the room active
+            if received["event"] == "pong":
+                continue
+
+            game.last_activity = player.last_seen
+
             if received["event"] == "force-start":
                 if not game.started:
                     
@@ -577,15 +1317,17 @@ async def join_checkers(game: Checkers, player: Player) -> None:
                     ok = await game.join(None, get_next_name())
                     if ok:
                         total_online += 1
+                        sentinel.update_room("checkers", game)
                         
                         if game.started and game.current_player == game.dummy_plug.id:
-                            await dummy_make_checkers_move(game)
+                            start_bot_turn(game, dummy_make_checkers_move(game))
             
             elif received["event"] == "move" and not game.is_over:
                 
                 #get the resulting move, and add a new JSON key event
-                result, winner = game.make_move(player.id, tuple(received["current_position"]), tuple(received["next_position"]))
-                result.update({"event": "move"})
+                with metrics.MAKE_MOVE.time("checkers"):
+                    result, winner = game.make_move(player.id, tuple(received["current_position"]), tuple(received["next_position"]))
+                result.update({"event": "move", "moves": game.legal_moves()})
 
                 # broadcast the move to all players
                 await game.broadcast(result)
@@ -597,30 +1339,22 @@ async def join_checkers(game: Checkers, player: Player) -> None:
                         "player": winner
                     })
                 
-                elif game.current_player == game.dummy_plug.id:
-                    await dummy_make_checkers_move(game)
+                elif game.dummy_plug and game.current_player == game.dummy_plug.id:
+                    start_bot_turn(game, dummy_make_checkers_move(game))
 
             elif received["event"] == "rematch" and game.is_over:
                 success = game.reset_board(player.id) # cast their vote to reset the board
 
+                # the dummy plug answers the vote after a pause, without holding the handler
+                if game.dummy_plug:
+                    start_bot_turn(game, dummy_answer_rematch("checkers", game, success))
+
                 # broadcast that the rematch is happening
-                if success:
-                    if game.dummy_plug.id:
-                        await asyncio.sleep(random()*4)
+                elif success:
                     await game.broadcast({
                         "event": "rematch",
-                        "player": game.current_player
-                    })
-
-                    if game.current_player == game.dummy_plug.id:
-                        await dummy_make_checkers_move(game)
-                elif game.dummy_plug.id:
-                    await asyncio.sleep(random()*4)
-                    
-                    # broadcast the disconnection
-                    await game.broadcast({
-                        "event": "disconnected",
-                        "message": f"{game.dummy_plug.nickname} (opponent) disconnected"
+                        "player": game.current_player,
+                        "moves": game.legal_moves()
                     })
             elif received["event"] == "help" and not game.is_over:
                 result = game.get_possible_moves(player.id, tuple(received["current_position"]))
@@ -641,4 +1375,7 @@ async def join_checkers(game: Checkers, player: Player) -> None:
             await game.send(player, {
                 "event": "error",
                 "message": str(e)
-        })
\ No newline at end of file
+        })
+
+        finally:
+            span.end()
@@ -0,0 +1,314 @@
+import asyncio
+from bisect import bisect_left
+from time import perf_counter
+from typing import Callable, Dict, Iterator, List, Tuple
+
+# upper bounds of the latency buckets in seconds, from a tenth of a millisecond to several seconds
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# events the clients can send, any other event is counted as invalid so that clients cannot create new series
+RECEIVED_EVENTS = ("force-start", "move", "rematch", "help", "pong")
+
+Labels = Tuple[str,...]
+
+def escape(value: str) -> str:
+    """
+    Escape a label value for the Prometheus text format
+
+    Args:
+        value: label value
+
+    Returns:
+        the escaped value
+    """
+
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace("\"", "\\\"")
+
+def format_labels(names: Labels, values: Labels, extra: str = "") -> str:
+    """
+    Format the labels of a sample
+
+    Args:
+        names: names of the labels
+        values: values of the labels, in the same order
+        extra: already formatted label appended to the others, such as the bucket bound of a histogram
+
+    Returns:
+        the labels between braces, or an empty string if there are none
+    """
+
+    pairs = [f'{name}="{escape(str(value))}"' for name, value in zip(names, values)]
+
+    if extra:
+        pairs.append(extra)
+
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def format_value(value: float) -> str:
+    """
+    Format the value of a sample
+
+    Args:
+        value: value of the sample
+
+    Returns:
+        the value, without a decimal point for whole numbers
+    """
+
+    if value == float("inf"):
+        return "+Inf"
+
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Metric:
+    """
+    Base class of the metrics, which are created once at import time and updated in place
+
+    Attributes:
+        name: name of the metric
+        help: description of the metric
+        labels: names of the labels of the metric
+        kind: type of the metric in the Prometheus text format
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Labels = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+
+    def samples(self) -> Iterator[str]:
+        """
+        Go through the samples of the metric
+
+        Returns:
+            iterator of the lines of the samples in the Prometheus text format
+        """
+
+        raise NotImplementedError
+
+    def render(self) -> str:
+        """
+        Render the metric in the Prometheus text format
+
+        Returns:
+            the help, type and samples of the metric
+        """
+
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+
+        return "\n".join(lines)
+
+class Counter(Metric):
+    """
+    Metric counting events, such as messages sent
+
+    Attributes:
+        values: dictionary mapping the label values to their count
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Labels = ()) -> None:
+        super().__init__(name, help, labels)
+        self.values: Dict[Labels,float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        """
+        Increment the count of a series
+
+        Args:
+            labels: values of the labels of the series
+            amount: amount to be added
+        """
+
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self) -> Iterator[str]:
+        for labels, value in self.values.items():
+            yield f"{self.name}{format_labels(self.labels, labels)} {format_value(value)}"
+
+class Gauge(Metric):
+    """
+    Metric whose values are read from the state of the server when the metrics are scraped, so that keeping them up to
+    date costs nothing
+
+    Attributes:
+        function: function returning a dictionary mapping the label values to their current value
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Labels, function: Callable[[],Dict[Labels,float]]) -> None:
+        super().__init__(name, help, labels)
+        self.function = function
+
+    def samples(self) -> Iterator[str]:
+        for labels, value in self.function().items():
+            yield f"{self.name}{format_labels(self.labels, labels)} {format_value(value)}"
+
+class Histogram(Metric):
+    """
+    Metric counting observations, such as latencies, in buckets
+
+    Observing only finds the bucket with a binary search and increments it, the buckets are made cumulative when the
+    metrics are scraped.
+
+    Attributes:
+        buckets: upper bounds of the buckets, in increasing order
+        values: dictionary mapping the label values to the counts of every bucket, followed by the count of the
+            observations above the last bound, and to the sum of the observations
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Labels = (), buckets: Tuple[float,...] = LATENCY_BUCKETS) -> None:
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+        self.values: Dict[Labels,Tuple[List[int],List[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        """
+        Record an observation
+
+        Args:
+            value: observed value
+            labels: values of the labels of the series
+        """
+
+        series = self.values.get(labels)
+
+        if series is None:
+            series = self.values[labels] = ([0]*(len(self.buckets) + 1), [0.0])
+
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1][0] += value
+
+    def time(self, *labels: str) -> "Timer":
+        """
+        Time a block of code
+
+        Args:
+            labels: values of the labels of the series
+
+        Returns:
+            context manager observing the time spent in the block
+        """
+
+        return Timer(self, labels)
+
+    def samples(self) -> Iterator[str]:
+        for labels, (counts, total) in self.values.items():
+            cumulative = 0
+
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + format_value(bound) + '"'
+                yield f"{self.name}_bucket{format_labels(self.labels, labels, le)} {cumulative}"
+
+            yield f"{self.name}_sum{format_labels(self.labels, labels)} {format_value(total[0])}"
+            yield f"{self.name}_count{format_labels(self.labels, labels)} {cumulative}"
+
+class Timer:
+    """
+    Context manager observing the time spent in a block of code into a histogram
+
+    Attributes:
+        histogram: histogram the time is observed into
+        labels: values of the labels of the series
+        started: time the block started
+    """
+
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram: Histogram, labels: Labels) -> None:
+        self.histogram = histogram
+        self.labels = labels
+        self.started = 0.0
+
+    def __enter__(self) -> "Timer":
+        self.started = perf_counter()
+        return self
+
+    def __exit__(self, *exception: object) -> None:
+        self.histogram.observe(perf_counter() - self.started, *self.labels)
+
+class Registry:
+    """
+    Class used to collect the metrics exposed by the server
+
+    Attributes:
+        metrics: registered metrics, in the order they are rendered
+    """
+
+    def __init__(self) -> None:
+        self.metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        """
+        Register a metric
+
+        Args:
+            metric: metric to be exposed
+
+        Returns:
+            the metric
+        """
+
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """
+        Render every metric in the Prometheus text format
+
+        Returns:
+            the text exposed by the /metrics end-point
+        """
+
+        return "\n".join(metric.render() for metric in self.metrics) + "\n"
+
+REGISTRY = Registry()
+
+MAKE_MOVE = REGISTRY.register(Histogram("boredgames_make_move_seconds", "Time taken to validate and play a move", ("game",)))
+BOT_THINK = REGISTRY.register(Histogram("boredgames_bot_think_seconds", "Time taken by the bots to choose their moves", ("game",)))
+BOT_PACING = REGISTRY.register(Histogram("boredgames_bot_pacing_seconds", "Time the bots waited after choosing their moves, before revealing them", ("game",)))
+BROADCAST = REGISTRY.register(Histogram("boredgames_broadcast_seconds", "Time taken to encode a broadcast and queue it for every player of a room"))
+SEND = REGISTRY.register(Histogram("boredgames_send_seconds", "Time taken to write a message to a websocket"))
+EVENT_LOOP_LAG = REGISTRY.register(Histogram("boredgames_event_loop_lag_seconds", "Delay of the event loop in running a task that was due"))
+MESSAGES_RECEIVED = REGISTRY.register(Counter("boredgames_messages_received_total", "Messages received from the clients", ("event",)))
+MESSAGES_SENT = REGISTRY.register(Counter("boredgames_messages_sent_total", "Messages queued to be sent to the clients", ("event",)))
+MESSAGES_DROPPED = REGISTRY.register(Counter("boredgames_messages_dropped_total", "Messages dropped or coalesced because a client fell behind", ("policy",)))
+MESSAGES_LIMITED = REGISTRY.register(Counter("boredgames_messages_limited_total", "Messages rejected for being over the rate limits", ("scope", "policy")))
+MESSAGES_MALFORMED = REGISTRY.register(Counter("boredgames_messages_malformed_total", "Frames dropped because they could not be decoded into an event"))
+CONNECTIONS_LIMITED = REGISTRY.register(Counter("boredgames_connections_limited_total", "Connections refused for being over the rate limit of their address"))
+
+def received_event(event: object) -> str:
+    """
+    Get the label of an event received from a client
+
+    Args:
+        event: event name sent by the client
+
+    Returns:
+        the event name if it is a known event, "invalid" otherwise
+    """
+
+    return event if event in RECEIVED_EVENTS else "invalid"
+
+async def monitor_event_loop(interval: float = 0.5) -> None:
+    """
+    Measure the lag of the event loop forever, as the delay in waking up from a sleep of a known duration
+
+    Args:
+        interval: seconds between two measures
+    """
+
+    loop = asyncio.get_running_loop()
+
+    while True:
+        due = loop.time() + interval
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, loop.time() - due))
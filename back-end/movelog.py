@@ -0,0 +1,413 @@
+import argparse
+import json
+import metrics
+import os
+import struct
+import threading
+from time import monotonic, time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+# a log starts with a header, then every game of the room is a GAME record followed by its MOVE records, and an END
+# record if it was played to the end
+MAGIC = b"BGML"
+VERSION = 1
+GAME = 0
+MOVE = 1
+END = 2
+
+GAME_TYPES = ("connect-4", "checkers")
+MOVE_SIZES = {"connect-4": 1, "checkers": 2} # bytes of a move, a column or the squares a piece moved from and to
+
+HEADER = struct.Struct("<4sBBH") # magic, version, game type, length of the room ID
+GAME_RECORD = struct.Struct("<BdBB") # kind, start timestamp, first player, number of players
+PLAYER = struct.Struct("<BBH") # player number, whether it is a bot, length of the nickname
+MOVE_RECORD = struct.Struct("<BBI") # kind, player number, milliseconds since the game started
+END_RECORD = struct.Struct("<BB") # kind, winner
+
+LOG_ERRORS = metrics.REGISTRY.register(metrics.Counter("boredgames_move_log_errors_total", "Batches of moves that could not be written to the move log"))
+
+class MoveLog:
+    """
+    Class used to append the moves of every room to its own log file, written behind the event loop
+
+    Records are only packed and buffered on the event loop. A background thread appends the buffered records to the
+    files in batches, every interval, so that the move path never waits on the disk.
+
+    Attributes:
+        directory: directory of the log files
+        interval: seconds between two batches
+        pending: dictionary mapping the path of every log with buffered records to its header and the records
+        lock: lock guarding the buffered records
+        stopped: set once the writer should stop
+        thread: background thread writing the batches, None when not writing
+    """
+
+    def __init__(self, directory: str, interval: float) -> None:
+        """
+        Constructor
+
+        Args:
+            directory: directory of the log files, created if it does not exist
+            interval: seconds between two batches
+        """
+
+        self.directory = directory
+        self.interval = interval
+        self.pending: Dict[str,Tuple[bytes,bytearray]] = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+        os.makedirs(directory, exist_ok=True)
+
+    def open(self, game_type: str, room_id: str) -> "RoomLog":
+        """
+        Open the log of a room, which appends to the log of a previous room with the same room ID
+
+        Args:
+            game_type: type of game the room is for
+            room_id: ID of the room
+
+        Returns:
+            log the room records its games into
+        """
+
+        return RoomLog(self, game_type, room_id, log_path(self.directory, game_type, room_id))
+
+    def append(self, path: str, header: bytes, record: bytes) -> None:
+        """
+        Buffer a record until the next batch
+
+        Args:
+            path: path of the log file
+            header: header written first if the file is new
+            record: packed record
+        """
+
+        with self.lock:
+            entry = self.pending.get(path)
+
+            if entry is None:
+                entry = self.pending[path] = (header, bytearray())
+
+            entry[1].extend(record)
+
+    def start(self) -> None:
+        """
+        Start writing the batches in the background
+        """
+
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, name="move-log", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop writing in the background, and write the records still buffered
+        """
+
+        self.stopped.set()
+
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+        self.flush()
+
+    def run(self) -> None:
+        """
+        Write the buffered records every interval until stopped
+        """
+
+        while not self.stopped.wait(self.interval):
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Append the buffered records to their files
+        """
+
+        with self.lock:
+            pending, self.pending = self.pending, {}
+
+        for path, (header, records) in pending.items():
+            try:
+                with open(path, "ab") as log:
+                    if log.tell() == 0:
+                        log.write(header)
+
+                    log.write(records)
+            except OSError:
+                LOG_ERRORS.inc()
+
+class RoomLog:
+    """
+    Class used to record the games of a room, called by the board games as they are played
+
+    Attributes:
+        move_log: move log buffering the records
+        game_type: type of game the room is for
+        path: path of the log file
+        header: header of the log file
+        started: time the current game started
+    """
+
+    def __init__(self, move_log: MoveLog, game_type: str, room_id: str, path: str) -> None:
+        room = room_id.encode()
+
+        self.move_log = move_log
+        self.game_type = game_type
+        self.path = path
+        self.header = HEADER.pack(MAGIC, VERSION, GAME_TYPES.index(game_type), len(room)) + room
+        self.started = monotonic()
+
+    def begin(self, first: int, players: List[Tuple[int,str,bool]]) -> None:
+        """
+        Record the start of a game
+
+        Args:
+            first: player number moving first
+            players: player number, nickname and whether it is a bot of every player
+        """
+
+        self.started = monotonic()
+        record = bytearray(GAME_RECORD.pack(GAME, time(), first, len(players)))
+
+        for player, nickname, is_bot in players:
+            name = nickname.encode()[:0xFFFF]
+            record += PLAYER.pack(player, is_bot, len(name)) + name
+
+        self.move_log.append(self.path, self.header, record)
+
+    def move(self, player: int, *move: object) -> None:
+        """
+        Record a move
+
+        Args:
+            player: player number making the move
+            move: column of connect 4, or current and next positions of checkers
+        """
+
+        elapsed = min(int((monotonic() - self.started)*1000), 0xFFFFFFFF)
+        record = MOVE_RECORD.pack(MOVE, player, elapsed)
+
+        if self.game_type == "connect-4":
+            record += bytes(move)
+        else:
+            record += bytes(x*8 + y for x, y in move)
+
+        self.move_log.append(self.path, self.header, record)
+
+    def end(self, winner: int) -> None:
+        """
+        Record the end of a game
+
+        Args:
+            winner: player number of the winner, 3 for a draw
+        """
+
+        self.move_log.append(self.path, self.header, END_RECORD.pack(END, winner))
+
+class LoggedGame:
+    """
+    Class used to describe a game read from a log
+
+    Attributes:
+        game_type: type of game played
+        room_id: ID of the room
+        timestamp: wall clock time the game started
+        first: player number moving first
+        players: player number, nickname and whether it is a bot of every player
+        moves: player number, milliseconds since the game started, and move of every move, the move being a column of
+            connect 4, or the current and next positions of checkers
+        winner: player number of the winner, 3 for a draw, None if the game was not played to the end
+    """
+
+    def __init__(self, game_type: str, room_id: str, timestamp: float, first: int, players: List[Tuple[int,str,bool]]) -> None:
+        self.game_type = game_type
+        self.room_id = room_id
+        self.timestamp = timestamp
+        self.first = first
+        self.players = players
+        self.moves: List[Tuple[int,int,tuple]] = []
+        self.winner: Optional[int] = None
+
+    def to_dict(self) -> Dict[str,object]:
+        """
+        Get the game as a valid JSON representation
+
+        Returns:
+            the game, with its moves in order
+        """
+
+        return {
+            "game_type": self.game_type,
+            "room_id": self.room_id,
+            "timestamp": self.timestamp,
+            "first": self.first,
+            "players": [{"player": player, "nickname": nickname, "bot": is_bot} for player, nickname, is_bot in self.players],
+            "moves": [{"player": player, "ms": elapsed, "move": move} for player, elapsed, move in self.moves],
+            "winner": self.winner
+        }
+
+def log_path(directory: str, game_type: str, room_id: str) -> str:
+    """
+    Get the path of the log of a room
+
+    Args:
+        directory: directory of the log files
+        game_type: type of game the room is for
+        room_id: ID of the room, escaped since private room IDs are chosen by the players
+
+    Returns:
+        path of the log file
+    """
+
+    return os.path.join(directory, f"{game_type}-{quote(room_id, safe='')}.bgml")
+
+def read_log(path: str) -> List[LoggedGame]:
+    """
+    Read every game of a log
+
+    Args:
+        path: path of the log file
+
+    Raises:
+        ValueError: the file is not a move log
+
+    Returns:
+        the games, oldest first, the last one possibly cut short by a batch still being written
+    """
+
+    with open(path, "rb") as log:
+        data = log.read()
+
+    if len(data) < HEADER.size:
+        raise ValueError("Not a move log")
+
+    magic, version, game_type, length = HEADER.unpack_from(data)
+
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a move log")
+
+    game_type = GAME_TYPES[game_type]
+    offset = HEADER.size
+    room_id = data[offset:offset + length].decode()
+    offset += length
+    move_size = MOVE_SIZES[game_type]
+    games: List[LoggedGame] = []
+
+    try:
+        while offset < len(data):
+            kind = data[offset]
+
+            if kind == GAME:
+                _, timestamp, first, count = GAME_RECORD.unpack_from(data, offset)
+                offset += GAME_RECORD.size
+                players = []
+
+                for _ in range(count):
+                    player, is_bot, length = PLAYER.unpack_from(data, offset)
+                    offset += PLAYER.size
+                    players.append((player, data[offset:offset + length].decode(), bool(is_bot)))
+                    offset += length
+
+                games.append(LoggedGame(game_type, room_id, timestamp, first, players))
+
+            elif kind == MOVE:
+                _, player, elapsed = MOVE_RECORD.unpack_from(data, offset)
+                offset += MOVE_RECORD.size
+                squares = data[offset:offset + move_size]
+                offset += move_size
+
+                if len(squares) < move_size:
+                    break
+
+                move = (squares[0],) if game_type == "connect-4" else tuple(divmod(square, 8) for square in squares)
+                games[-1].moves.append((player, elapsed, move))
+
+            elif kind == END:
+                games[-1].winner = END_RECORD.unpack_from(data, offset)[1]
+                offset += END_RECORD.size
+
+            else:
+                raise ValueError(f"Unknown record {kind} at offset {offset}")
+
+    except struct.error:
+        # the last record was cut short
+        pass
+
+    return games
+
+def replay(logged: LoggedGame, ply: Optional[int] = None) -> object:
+    """
+    Rebuild the position of a logged game
+
+    Args:
+        logged: game read from a log
+        ply: number of moves to be played, all of them if None
+
+    Raises:
+        RuntimeError: a move of the log is not valid in the rebuilt position
+
+    Returns:
+        the Connect4 or Checkers instance after the moves
+    """
+
+    # imported here since the board games record their moves with this module
+    from checkers import Checkers
+    from connect4 import Connect4
+
+    game = Connect4(logged.room_id) if logged.game_type == "connect-4" else Checkers(logged.room_id)
+    game.started = True
+    game.used_player_numbers = [player for player, _, _ in logged.players]
+    game.unused_player_numbers = []
+    game.current_player = logged.first
+
+    for player, _, move in logged.moves[:ply]:
+        game.make_move(player, *move)
+
+    return game
+
+def get_move_log(directory: str, interval: float) -> Optional[MoveLog]:
+    """
+    Get the move log of the server
+
+    Args:
+        directory: directory of the log files, empty to not log the moves
+        interval: seconds between two batches
+
+    Returns:
+        the move log, None if the moves are not logged
+    """
+
+    return MoveLog(directory, interval) if directory else None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Read the games of a move log, and rebuild their positions")
+    parser.add_argument("path", help="path of the log file")
+    parser.add_argument("--game", type=int, help="index of the game to be rebuilt, the games are listed if not given")
+    parser.add_argument("--ply", type=int, help="number of moves to be played, all of them if not given")
+    parser.add_argument("--json", action="store_true", help="print every game as a line of JSON instead")
+    args = parser.parse_args()
+
+    games = read_log(args.path)
+
+    if args.json:
+        for logged in games:
+            print(json.dumps(logged.to_dict()))
+
+    elif args.game is None:
+        for index, logged in enumerate(games):
+            players = ", ".join(f"{player}: {nickname}{' (bot)' if is_bot else ''}" for player, nickname, is_bot in logged.players)
+            print(f"{index:4} {logged.timestamp:.0f} {len(logged.moves):4} moves, winner {logged.winner}, {players}")
+
+    else:
+        logged = games[args.game]
+        game = replay(logged, args.ply)
+
+        for player, elapsed, move in logged.moves[:args.ply]:
+            print(f"{elapsed/1000:9.3f}s player {player}: {move}")
+
+        print(json.dumps(game.snapshot()))
@@ -0,0 +1,217 @@
+import asyncio
+import metrics
+from collections import deque
+from fastapi import WebSocket, status
+from time import perf_counter
+from typing import Callable, Deque, Dict, Optional, Tuple, Union
+
+# what happens to a message sent to a connection whose queue is full
+DROP = "drop" # the message is dropped
+COALESCE = "coalesce" # the queued moves are replaced by a snapshot of the latest state of the game
+DISCONNECT = "disconnect" # the connection is closed, the client is too slow to keep playing
+
+POLICIES = (DROP, COALESCE, DISCONNECT)
+
+# events describing the board, which a snapshot of the state replaces; the other events are never coalesced
+BOARD_EVENTS = ("move", "state")
+
+class Outbox:
+    """
+    Class used to send the messages of a connection from its own writer task
+
+    Sending only appends to a bounded queue and never waits on the socket, so a slow or stalled client cannot delay
+    the other players of its room, nor the handler that made the move. When the queue is full the policy decides
+    what to do with the client. Messages are queued as encoded frames, text for JSON and bytes for the binary
+    protocol, so a broadcast encodes its message once for all the recipients speaking the same protocol. Every frame
+    is queued along with the name of its event, so that coalescing only replaces the frames describing the board.
+
+    Attributes:
+        connection: websocket the messages are sent to
+        size: maximum number of messages waiting to be sent
+        policy: what happens when the queue is full, one of DROP, COALESCE or DISCONNECT
+        snapshot: function returning the latest state of the game as a message, used by the COALESCE policy
+        encode: function encoding a message into a frame of the protocol of the connection
+        messages: events and encoded messages waiting to be sent, oldest first
+        closed: whether the connection stopped accepting messages
+        dropped: number of messages dropped or coalesced so far
+        task: writer task, None until the outbox is started
+    """
+
+    def __init__(self, connection: WebSocket, size: int, policy: str, snapshot: Callable[[],Optional[Dict[str,object]]], encode: Callable[[Dict[str,object]],Union[str,bytes]]) -> None:
+        """
+        Constructor
+
+        Args:
+            connection: websocket the messages are sent to
+            size: maximum number of messages waiting to be sent
+            policy: what happens when the queue is full, one of DROP, COALESCE or DISCONNECT
+            snapshot: function returning the latest state of the game as a message, or None if there is no state
+            encode: function encoding a message into a frame of the protocol of the connection
+        """
+
+        if policy not in POLICIES:
+            raise RuntimeError(f"Invalid outbox policy {policy}")
+
+        self.connection = connection
+        self.size = size
+        self.policy = policy
+        self.snapshot = snapshot
+        self.encode = encode
+        self.messages: Deque[Tuple[str,Union[str,bytes]]] = deque()
+        self.closed = False
+        self.dropped = 0
+        self.task: Optional[asyncio.Task] = None
+        self.ready = asyncio.Event() # set while there are messages to be sent
+        self.idle = asyncio.Event() # set while every message has been sent
+        self.idle.set()
+
+    def start(self) -> None:
+        """
+        Start the writer task
+        """
+
+        if self.task is None:
+            self.task = asyncio.get_running_loop().create_task(self.run())
+
+    def put(self, event: str, message: Union[str,bytes]) -> bool:
+        """
+        Queue a message without waiting for it to be sent
+
+        Args:
+            event: name of the event of the message
+            message: message encoded in the protocol of the connection
+
+        Returns:
+            whether the message will be sent
+        """
+
+        if self.closed:
+            return False
+
+        if len(self.messages) >= self.size:
+            return self.overflow(event, message)
+
+        self.messages.append((event, message))
+        self.ready.set()
+        self.idle.clear()
+
+        return True
+
+    def overflow(self, event: str, message: Union[str,bytes]) -> bool:
+        """
+        Apply the policy to a message sent while the queue is full
+
+        Args:
+            event: name of the event of the message
+            message: encoded message that did not fit in the queue
+
+        Returns:
+            whether the message, or a state including it, will be sent
+        """
+
+        if self.policy == COALESCE:
+            state = self.snapshot()
+
+            if state is not None:
+                # the state already includes every queued move, so only the other events are kept, in order, before it
+                kept = deque(queued for queued in self.messages if queued[0] not in BOARD_EVENTS)
+
+                if event not in BOARD_EVENTS:
+                    kept.append((event, message))
+
+                if len(kept) >= self.size:
+                    # the queue is full of events a state cannot replace, the client is too slow to keep playing
+                    return self.drop_connection()
+
+                coalesced = len(self.messages) + 1 - len(kept)
+                self.dropped += coalesced
+                metrics.MESSAGES_DROPPED.inc(self.policy, amount=coalesced)
+                kept.append((state["event"], self.encode(state)))
+                self.messages = kept
+                return True
+
+            # without a state to catch up with, make room by dropping the oldest message
+            self.dropped += 1
+            metrics.MESSAGES_DROPPED.inc(self.policy)
+            self.messages.popleft()
+            self.messages.append((event, message))
+            return True
+
+        if self.policy == DISCONNECT:
+            return self.drop_connection()
+
+        self.dropped += 1
+        metrics.MESSAGES_DROPPED.inc(self.policy)
+        return False
+
+    async def run(self) -> None:
+        """
+        Send the queued messages one after another, for as long as the connection accepts them
+        """
+
+        while True:
+            if not self.messages:
+                self.ready.clear()
+                self.idle.set()
+                await self.ready.wait()
+                continue
+
+            _, message = self.messages.popleft()
+
+            try:
+                started = perf_counter()
+
+                if isinstance(message, str):
+                    await self.connection.send_text(message)
+                else:
+                    await self.connection.send_bytes(message)
+
+                metrics.SEND.observe(perf_counter() - started)
+            except Exception:
+                # the connection is gone, the handler of the player cleans up once it notices
+                self.closed = True
+                self.messages.clear()
+                self.idle.set()
+                return
+
+    def drop_connection(self) -> bool:
+        """
+        Stop sending messages to a client that cannot keep up, and close its connection
+
+        Returns:
+            False, the message that overflowed will not be sent
+        """
+
+        self.close()
+        asyncio.get_running_loop().create_task(self.disconnect())
+        return False
+
+    async def drain(self) -> None:
+        """
+        Wait until every queued message has been sent
+        """
+
+        await self.idle.wait()
+
+    async def disconnect(self) -> None:
+        """
+        Close a connection that is too slow to keep up with its room
+        """
+
+        try:
+            await self.connection.close(status.WS_1008_POLICY_VIOLATION)
+        except Exception:
+            pass
+
+    def close(self) -> None:
+        """
+        Stop sending messages, and drop the ones still queued
+        """
+
+        self.closed = True
+        self.messages.clear()
+        self.idle.set()
+
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
@@ -0,0 +1,106 @@
+import asyncio
+import settings
+from random import random
+from typing import Dict, Tuple
+
+# target delays of the bots in seconds, as (minimum, spread) so that every delay is drawn from minimum + [0, spread)
+HUMAN_DELAYS = {
+    "connect-4": (0.4, 1.2),
+    "checkers": (0.4, 2.0),
+    "rematch": (0.0, 4.0),
+}
+
+class Pacing:
+    """
+    Class used to make the bots look like they are thinking
+
+    The move of a bot is always computed first, then revealed once its target delay has passed. The time spent
+    computing counts towards the delay, so slow searches are not made slower, and pacing never holds a worker.
+
+    Attributes:
+        name: name of the pacing
+        delays: dictionary mapping kinds of actions to the (minimum, spread) of their target delay
+    """
+
+    def __init__(self, name: str, delays: Dict[str,Tuple[float,float]]) -> None:
+        """
+        Constructor
+
+        Args:
+            name: name of the pacing
+            delays: dictionary mapping kinds of actions to the (minimum, spread) of their target delay,
+                actions missing from it are revealed straight away
+        """
+
+        self.name = name
+        self.delays = delays
+
+    def delay(self, kind: str) -> float:
+        """
+        Draw the target delay of an action
+
+        Args:
+            kind: kind of action, either a game type or "rematch"
+
+        Returns:
+            number of seconds the action should appear to take
+        """
+
+        minimum, spread = self.delays.get(kind, (0.0, 0.0))
+        return minimum + random()*spread
+
+    @staticmethod
+    def now() -> float:
+        """
+        Get the time an action started, to be given to reveal()
+
+        Returns:
+            current time of the event loop
+        """
+
+        return asyncio.get_running_loop().time()
+
+    async def reveal(self, kind: str, started: float) -> None:
+        """
+        Wait until the target delay of an action has passed since it started
+
+        Args:
+            kind: kind of action, either a game type or "rematch"
+            started: time the action started, as returned by now()
+        """
+
+        remaining = started + self.delay(kind) - self.now()
+
+        if remaining > 0:
+            await asyncio.sleep(remaining)
+
+    async def wait(self, kind: str) -> None:
+        """
+        Wait for the whole target delay of an action that needs no computation
+
+        Args:
+            kind: kind of action, either a game type or "rematch"
+        """
+
+        await self.reveal(kind, self.now())
+
+HUMAN = Pacing("human", HUMAN_DELAYS)
+INSTANT = Pacing("instant", {}) # for load tests, self-play and benchmarks
+
+PACINGS = {pacing.name: pacing for pacing in (HUMAN, INSTANT)}
+
+def get_pacing(name: str = "") -> Pacing:
+    """
+    Get a pacing by name
+
+    Args:
+        name: name of the pacing, the BOREDGAMES_BOT_PACING setting if empty
+
+    Returns:
+        the Pacing instance
+    """
+
+    try:
+        return PACINGS[name or settings.BOT_PACING]
+    except KeyError:
+        raise RuntimeError(f"Invalid bot pacing {name or settings.BOT_PACING}")
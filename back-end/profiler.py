@@ -0,0 +1,111 @@
+import sys
+import threading
+from collections import Counter
+from time import sleep
+from types import FrameType
+from typing import Optional
+
+MAX_DURATION = 60.0 # longest profile that can be captured, in seconds
+MIN_INTERVAL = 0.001 # shortest interval between two samples, in seconds
+
+class Profiler:
+    """
+    Class used to capture a sampled CPU profile of a thread of the running process, without restarting it
+
+    A background thread reads the stack of the profiled thread at a fixed interval. The stacks are counted and returned
+    in the collapsed stack format, one "root;caller;callee count" line per stack, read by flamegraph.pl and speedscope.
+
+    Attributes:
+        thread_id: identifier of the profiled thread
+        interval: seconds between two samples
+        stacks: number of samples of every stack
+        samples: total number of samples
+        stopped: set once sampling should stop
+        thread: background thread taking the samples, None when not sampling
+    """
+
+    def __init__(self, thread_id: int, interval: float) -> None:
+        """
+        Constructor
+
+        Args:
+            thread_id: identifier of the profiled thread
+            interval: seconds between two samples
+        """
+
+        self.thread_id = thread_id
+        self.interval = max(interval, MIN_INTERVAL)
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.stopped = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """
+        Start sampling in the background
+        """
+
+        self.thread = threading.Thread(target=self.run, name="profiler", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> str:
+        """
+        Stop sampling
+
+        Returns:
+            the profile in the collapsed stack format
+        """
+
+        self.stopped.set()
+
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+        return self.collapsed()
+
+    def run(self) -> None:
+        """
+        Sample the stack of the profiled thread until stopped
+        """
+
+        while not self.stopped.is_set():
+            frame = sys._current_frames().get(self.thread_id)
+
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+                self.samples += 1
+
+            del frame
+            sleep(self.interval)
+
+    def collapsed(self) -> str:
+        """
+        Format the samples in the collapsed stack format
+
+        Returns:
+            one line per stack, with its frames from the root to the leaf separated by semicolons and its number of
+            samples, most sampled first
+        """
+
+        return "".join(f"{stack} {samples}\n" for stack, samples in self.stacks.most_common())
+
+def collapse(frame: FrameType) -> str:
+    """
+    Describe a stack in the collapsed stack format
+
+    Args:
+        frame: innermost frame of the stack
+
+    Returns:
+        the functions of the stack from the root to the leaf, separated by semicolons
+    """
+
+    names = []
+
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})".replace(";", ":"))
+        frame = frame.f_back
+
+    return ";".join(reversed(names))
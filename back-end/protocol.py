@@ -0,0 +1,296 @@
+import struct
+from typing import Callable, Dict, List, Optional, Tuple
+
+# websocket subprotocol negotiated by the clients that want binary frames instead of JSON
+SUBPROTOCOL = "boredgames.binary.v1"
+
+# kinds of fields, every frame is an opcode byte followed by its fields in the order of the tables below
+U8 = "u8" # unsigned byte
+BOOL = "bool" # byte, 0 or 1
+POSITION = "position" # (x, y) as 2 bytes
+OPTIONAL_POSITION = "optional position" # (x, y) as 2 bytes, or 0xFF 0xFF for None
+TEXT = "text" # length as 2 bytes, then UTF-8
+MOVES = "moves" # number of moves as a byte, then the possible_move of every {"possible_move": (x, y)} as 2 bytes
+CELLS = "cells" # number of columns and rows as 2 bytes, then the cells column by column as 1 byte each
+PIECES = "pieces" # number of pieces as a byte, then every [x, y, owner, is king] as 4 bytes
+LEGAL_MOVES = "legal moves" # number of moves as a byte, then every (x, y, next x, next y) as 4 bytes
+
+NONE_POSITION = 0xFF
+
+Field = Tuple[object,str]
+Event = Tuple[int,str,Tuple[Field,...]]
+
+# events sent by the server to the clients of both games, as (opcode, event, fields)
+SERVER_EVENTS: Tuple[Event,...] = (
+    (1, "connected", (("you", U8), ("token", TEXT))),
+    (4, "end", (("player", U8),)),
+    (6, "error", (("message", TEXT),)),
+    (7, "disconnected", (("message", TEXT),)),
+    (8, "ping", ()),
+    (11, "redirect", (("url", TEXT),)),
+)
+
+# events sent by the clients to the server in both games
+CLIENT_EVENTS: Tuple[Event,...] = (
+    (64, "force-start", ()),
+    (66, "rematch", ()),
+    (67, "pong", ()),
+)
+
+# events whose fields depend on the game, the checkers events that start a turn carry the legal moves of the player
+# to move last, so that clients reading only the fields they know can ignore them
+GAME_SERVER_EVENTS: Dict[str,Tuple[Event,...]] = {
+    "connect-4": (
+        (2, "started", ((1, TEXT), (2, TEXT))),
+        (3, "move", (("x", U8), ("y", U8), ("player", U8), ("next", U8))),
+        (5, "rematch", (("player", U8),)),
+        (9, "state", (("board", CELLS), ("next", U8), ("over", BOOL))),
+    ),
+    "checkers": (
+        (2, "started", ((1, TEXT), (2, TEXT), ("moves", LEGAL_MOVES))),
+        (3, "move", (("previous_position", POSITION), ("current_position", POSITION), ("player", U8), ("next", U8), ("eaten", OPTIONAL_POSITION), ("king", BOOL), ("moves", LEGAL_MOVES))),
+        (5, "rematch", (("player", U8), ("moves", LEGAL_MOVES))),
+        (9, "state", (("pieces", PIECES), ("next", U8), ("over", BOOL), ("pending", OPTIONAL_POSITION), ("moves", LEGAL_MOVES))),
+        (10, "answer", (("moves", MOVES),)),
+    ),
+}
+
+GAME_CLIENT_EVENTS: Dict[str,Tuple[Event,...]] = {
+    "connect-4": (
+        (65, "move", (("column", U8),)),
+    ),
+    "checkers": (
+        (65, "move", (("current_position", POSITION), ("next_position", POSITION))),
+        (68, "help", (("current_position", POSITION),)),
+    ),
+}
+
+def is_column(value: object) -> bool:
+    return type(value) is int and 0 <= value < 7
+
+def is_square(value: object) -> bool:
+    return isinstance(value, (list, tuple)) and len(value) == 2 and all(type(coordinate) is int and 0 <= coordinate < 8 for coordinate in value)
+
+# checks of the fields read by the handlers from the events of the clients, in both protocols, by game and event
+CLIENT_FIELDS: Dict[str,Dict[str,Dict[str,Callable[[object],bool]]]] = {
+    "connect-4": {
+        "move": {"column": is_column},
+    },
+    "checkers": {
+        "move": {"current_position": is_square, "next_position": is_square},
+        "help": {"current_position": is_square},
+    },
+}
+
+def is_valid_event(game_type: str, message: Dict[str,object]) -> bool:
+    """
+    Check that an event of a client has every field its handler reads, of the right type
+
+    Args:
+        game_type: type of game the client is playing
+        message: a valid JSON representation of the event, whose event is a string
+
+    Returns:
+        whether the event can be handled
+    """
+
+    fields = CLIENT_FIELDS[game_type].get(message["event"], {})
+    return all(check(message.get(name)) for name, check in fields.items())
+
+TEXT_LENGTH = struct.Struct(">H")
+
+def write_u8(frame: bytearray, value: int) -> None:
+    frame.append(value)
+
+def read_u8(frame: bytes, offset: int) -> Tuple[int,int]:
+    return frame[offset], offset + 1
+
+def write_bool(frame: bytearray, value: bool) -> None:
+    frame.append(1 if value else 0)
+
+def read_bool(frame: bytes, offset: int) -> Tuple[bool,int]:
+    return frame[offset] != 0, offset + 1
+
+def write_position(frame: bytearray, value: Tuple[int,int]) -> None:
+    frame += bytes(value)
+
+def read_position(frame: bytes, offset: int) -> Tuple[Tuple[int,int],int]:
+    return (frame[offset], frame[offset + 1]), offset + 2
+
+def write_optional_position(frame: bytearray, value: Optional[Tuple[int,int]]) -> None:
+    frame += bytes(value) if value else bytes((NONE_POSITION, NONE_POSITION))
+
+def read_optional_position(frame: bytes, offset: int) -> Tuple[Optional[Tuple[int,int]],int]:
+    position, offset = read_position(frame, offset)
+    return (None if position[0] == NONE_POSITION else position), offset
+
+def write_text(frame: bytearray, value: str) -> None:
+    encoded = value.encode()
+    frame += TEXT_LENGTH.pack(len(encoded)) + encoded
+
+def read_text(frame: bytes, offset: int) -> Tuple[str,int]:
+    (length,) = TEXT_LENGTH.unpack_from(frame, offset)
+    offset += TEXT_LENGTH.size
+    return bytes(frame[offset:offset + length]).decode(), offset + length
+
+def write_moves(frame: bytearray, value: List[Dict[str,Tuple[int,int]]]) -> None:
+    frame.append(len(value))
+    for move in value:
+        frame += bytes(move["possible_move"])
+
+def read_moves(frame: bytes, offset: int) -> Tuple[List[Dict[str,Tuple[int,int]]],int]:
+    count = frame[offset]
+    moves = [{"possible_move": (frame[offset + 1 + 2*i], frame[offset + 2 + 2*i])} for i in range(count)]
+    return moves, offset + 1 + 2*count
+
+def write_cells(frame: bytearray, value: List[List[int]]) -> None:
+    frame += bytes((len(value), len(value[0])))
+    for column in value:
+        frame += bytes(column)
+
+def read_cells(frame: bytes, offset: int) -> Tuple[List[List[int]],int]:
+    cols, rows = frame[offset], frame[offset + 1]
+    offset += 2
+    return [list(frame[offset + col*rows:offset + (col + 1)*rows]) for col in range(cols)], offset + cols*rows
+
+def write_pieces(frame: bytearray, value: List[List[object]]) -> None:
+    frame.append(len(value))
+    for x, y, owner, is_king in value:
+        frame += bytes((x, y, owner, 1 if is_king else 0))
+
+def read_pieces(frame: bytes, offset: int) -> Tuple[List[List[object]],int]:
+    count = frame[offset]
+    pieces = [[frame[i], frame[i + 1], frame[i + 2], frame[i + 3] != 0] for i in range(offset + 1, offset + 1 + 4*count, 4)]
+    return pieces, offset + 1 + 4*count
+
+def write_legal_moves(frame: bytearray, value: List[Tuple[int,int,int,int]]) -> None:
+    frame.append(len(value))
+    for move in value:
+        frame += bytes(move)
+
+def read_legal_moves(frame: bytes, offset: int) -> Tuple[List[Tuple[int,int,int,int]],int]:
+    count = frame[offset]
+    moves = [(frame[i], frame[i + 1], frame[i + 2], frame[i + 3]) for i in range(offset + 1, offset + 1 + 4*count, 4)]
+    return moves, offset + 1 + 4*count
+
+# writer and reader of every kind of field
+KINDS: Dict[str,Tuple[Callable,Callable]] = {
+    U8: (write_u8, read_u8),
+    BOOL: (write_bool, read_bool),
+    POSITION: (write_position, read_position),
+    OPTIONAL_POSITION: (write_optional_position, read_optional_position),
+    TEXT: (write_text, read_text),
+    MOVES: (write_moves, read_moves),
+    CELLS: (write_cells, read_cells),
+    PIECES: (write_pieces, read_pieces),
+    LEGAL_MOVES: (write_legal_moves, read_legal_moves),
+}
+
+class Codec:
+    """
+    Class used to convert the messages of a game to and from binary frames
+
+    Every frame is an opcode byte followed by fixed layout fields, as described by the event tables of the module.
+    The same tables are used in both directions, so a codec of the server and a codec of a client always agree.
+
+    Attributes:
+        game_type: type of game the codec is for
+        encoders: dictionary mapping the events that are encoded to their (opcode, fields)
+        decoders: dictionary mapping the opcodes that are decoded to their (event, fields)
+    """
+
+    def __init__(self, game_type: str, server: bool = True) -> None:
+        """
+        Constructor
+
+        Args:
+            game_type: type of game the codec is for
+            server: whether the codec encodes the events of the server and decodes the events of the clients,
+                or the other way around
+
+        Raises:
+            RuntimeError: the game type is not supported
+        """
+
+        if game_type not in GAME_SERVER_EVENTS:
+            raise RuntimeError("Invalid game-type")
+
+        self.game_type = game_type
+        server_events = SERVER_EVENTS + GAME_SERVER_EVENTS[game_type]
+        client_events = CLIENT_EVENTS + GAME_CLIENT_EVENTS[game_type]
+        sent, received = (server_events, client_events) if server else (client_events, server_events)
+
+        self.encoders = {event: (opcode, fields) for opcode, event, fields in sent}
+        self.decoders = {opcode: (event, fields) for opcode, event, fields in received}
+
+    def encode(self, message: Dict[object,object]) -> bytes:
+        """
+        Encode a message into a binary frame
+
+        Args:
+            message: a valid JSON representation of an event of the table
+
+        Raises:
+            RuntimeError: the event cannot be encoded
+
+        Returns:
+            the binary frame
+        """
+
+        try:
+            opcode, fields = self.encoders[message["event"]]
+        except KeyError:
+            raise RuntimeError(f"Event {message.get('event')} cannot be encoded")
+
+        frame = bytearray((opcode,))
+        for name, kind in fields:
+            KINDS[kind][0](frame, message.get(name))
+
+        return bytes(frame)
+
+    def decode(self, frame: bytes) -> Dict[object,object]:
+        """
+        Decode a binary frame into a message
+
+        Args:
+            frame: the binary frame
+
+        Raises:
+            RuntimeError: the frame is not a valid event
+
+        Returns:
+            a valid JSON representation of the event
+        """
+
+        try:
+            event, fields = self.decoders[frame[0]]
+            message = {"event": event}
+            offset = 1
+
+            for name, kind in fields:
+                message[name], offset = KINDS[kind][1](frame, offset)
+
+        except (KeyError, IndexError, struct.error, UnicodeDecodeError):
+            raise RuntimeError("invalid event")
+
+        return message
+
+# codecs used by the server, one per game type
+CODECS = {game_type: Codec(game_type) for game_type in GAME_SERVER_EVENTS}
+
+def negotiate(game_type: str, subprotocols: List[str]) -> Optional[Codec]:
+    """
+    Choose the codec of a connection from the subprotocols offered by the client
+
+    Args:
+        game_type: type of game the client wants to connect to
+        subprotocols: subprotocols offered by the client, in order of preference
+
+    Returns:
+        the codec of the game if the client offered the binary subprotocol, None to keep speaking JSON
+    """
+
+    if SUBPROTOCOL in subprotocols:
+        return CODECS.get(game_type)
+
+    return None
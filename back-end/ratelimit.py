@@ -0,0 +1,166 @@
+from collections import OrderedDict
+from time import monotonic
+from typing import Optional
+
+# what happens to an event over the rate limits
+DROP = "drop" # the event is dropped without an answer
+CLOSE = "close" # the connection is closed
+
+POLICIES = (DROP, CLOSE)
+
+# scopes of the rate limits, used as the labels of the rejected events
+CONNECTION = "connection"
+ADDRESS = "address"
+
+class TokenBucket:
+    """
+    Class used to limit the rate of the events of a client. Every event takes a token, and the tokens are refilled
+    at a constant rate up to the burst, so a client can send a short burst but not more than the rate over time
+
+    Attributes:
+        rate: tokens refilled per second
+        burst: maximum number of tokens
+        tokens: tokens left
+        updated: last time the tokens were refilled
+    """
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = monotonic()
+
+    def take(self, now: float) -> bool:
+        """
+        Take a token for an event
+
+        Args:
+            now: current monotonic time
+
+        Returns:
+            whether there was a token left, False if the event is over the rate
+        """
+
+        tokens = min(self.burst, self.tokens + (now - self.updated)*self.rate)
+        self.updated = now
+
+        if tokens < 1:
+            self.tokens = tokens
+            return False
+
+        self.tokens = tokens - 1
+        return True
+
+class RateLimiter:
+    """
+    Class used to limit the events of every connection, and of every address across all its connections
+
+    Checking an event only refills and takes from two buckets, so a flooding client is rejected for the price of a few
+    arithmetic operations, before its frames are decoded or handled.
+
+    Attributes:
+        rate: events per second allowed on a connection, 0 for no limit
+        burst: events a connection can send at once
+        address_rate: events per second allowed from an address, connection attempts included, 0 for no limit
+        address_burst: events an address can send at once
+        size: maximum number of addresses tracked, the least recently seen ones are forgotten first
+        policy: what happens to an event over the limits, one of DROP or CLOSE
+        addresses: ordered dictionary mapping the addresses to their buckets, least recently seen first
+    """
+
+    def __init__(self, rate: float, burst: float, address_rate: float, address_burst: float, size: int, policy: str) -> None:
+        """
+        Constructor
+
+        Args:
+            rate: events per second allowed on a connection, 0 for no limit
+            burst: events a connection can send at once
+            address_rate: events per second allowed from an address, 0 for no limit
+            address_burst: events an address can send at once
+            size: maximum number of addresses tracked
+            policy: what happens to an event over the limits, one of DROP or CLOSE
+
+        Raises:
+            ValueError: the policy is unknown
+        """
+
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown rate limit policy {policy}")
+
+        self.rate = rate
+        self.burst = burst
+        self.address_rate = address_rate
+        self.address_burst = address_burst
+        self.size = size
+        self.policy = policy
+        self.addresses: OrderedDict[str,TokenBucket] = OrderedDict()
+
+    def bucket(self) -> Optional[TokenBucket]:
+        """
+        Create the bucket of a new connection
+
+        Returns:
+            the bucket, None if the connections are not limited
+        """
+
+        return TokenBucket(self.rate, self.burst) if self.rate > 0 else None
+
+    def address_bucket(self, address: str) -> TokenBucket:
+        """
+        Get the bucket of an address, created full if the address is not tracked
+
+        Args:
+            address: IP address of the client
+
+        Returns:
+            the bucket shared by every connection from the address
+        """
+
+        bucket = self.addresses.get(address)
+
+        if bucket is None:
+            bucket = self.addresses[address] = TokenBucket(self.address_rate, self.address_burst)
+
+            if len(self.addresses) > self.size:
+                self.addresses.popitem(last=False)
+        else:
+            self.addresses.move_to_end(address)
+
+        return bucket
+
+    def connect(self, address: str) -> bool:
+        """
+        Check a connection attempt from an address
+
+        Args:
+            address: IP address of the client
+
+        Returns:
+            whether the connection is allowed
+        """
+
+        return self.address_rate <= 0 or self.address_bucket(address).take(monotonic())
+
+    def check(self, bucket: Optional[TokenBucket], address: str) -> Optional[str]:
+        """
+        Check an event received on a connection
+
+        Args:
+            bucket: bucket of the connection, None if the connections are not limited
+            address: IP address of the client
+
+        Returns:
+            None if the event is allowed, otherwise the scope of the limit it is over, CONNECTION or ADDRESS
+        """
+
+        now = monotonic()
+
+        if bucket is not None and not bucket.take(now):
+            return CONNECTION
+
+        if self.address_rate > 0 and not self.address_bucket(address).take(now):
+            return ADDRESS
+
+        return None
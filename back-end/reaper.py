@@ -0,0 +1,187 @@
+import asyncio
+from fastapi import status
+from game import BoardGame, Player
+from time import monotonic
+from typing import List, Optional, Tuple
+
+PING = {"event": "ping"}
+SEND_TIMEOUT = 5.0 # seconds the queued messages and the closing handshake of a connection can take before giving up
+
+class Reaper:
+    """
+    Class used to reclaim the rooms that are no longer played, along with their boards and pieces
+
+    Rooms are normally removed by the websocket handlers when a player disconnects, which misses half-open sockets,
+    handlers that failed, and players that simply walk away. On a timer the reaper sends a heartbeat to every
+    connection, closes the ones that stopped answering, and evicts the expired rooms from the sentinel in bulk.
+
+    Attributes:
+        sentinel: sentinel managing the rooms
+        interval: seconds between two sweeps
+        heartbeat_timeout: seconds a connection can go without sending anything before it is closed
+        idle_timeout: seconds a room can go without any game event before it is evicted
+        finished_timeout: seconds a finished game can wait for a rematch before it is evicted
+        max_lifetime: seconds a room can exist before it is evicted
+        evicted: number of rooms evicted so far
+        closed: number of connections closed for missing their heartbeats so far
+        task: task running the sweeps, None when the reaper is stopped
+    """
+
+    def __init__(self, sentinel: object, interval: float, heartbeat_timeout: float, idle_timeout: float, finished_timeout: float, max_lifetime: float) -> None:
+        """
+        Constructor
+
+        Args:
+            sentinel: sentinel managing the rooms
+            interval: seconds between two sweeps
+            heartbeat_timeout: seconds a connection can go without sending anything before it is closed
+            idle_timeout: seconds a room can go without any game event before it is evicted
+            finished_timeout: seconds a finished game can wait for a rematch before it is evicted
+            max_lifetime: seconds a room can exist before it is evicted
+        """
+
+        self.sentinel = sentinel
+        self.interval = interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.idle_timeout = idle_timeout
+        self.finished_timeout = finished_timeout
+        self.max_lifetime = max_lifetime
+        self.evicted = 0
+        self.closed = 0
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """
+        Start sweeping the rooms in the background
+        """
+
+        if self.task is None:
+            self.task = asyncio.get_running_loop().create_task(self.run())
+
+    def stop(self) -> None:
+        """
+        Stop sweeping the rooms
+        """
+
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def run(self) -> None:
+        """
+        Sweep the rooms forever, every interval
+        """
+
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.sweep()
+
+    def is_expired(self, room: BoardGame, now: float) -> bool:
+        """
+        Check whether a room should be evicted
+
+        Args:
+            room: room to be checked
+            now: current time
+
+        Returns:
+            whether the room has no connected or reconnecting player left, or has gone over one of its limits
+        """
+
+        # players whose connection dropped keep the room alive while they can still reclaim their seat
+        if not any(player.connection or player.away is not None for player in room.connections):
+            return True
+
+        if now - room.created > self.max_lifetime:
+            return True
+
+        idle = now - room.last_activity
+        return idle > self.idle_timeout or (room.is_over and idle > self.finished_timeout)
+
+    async def sweep(self) -> List[BoardGame]:
+        """
+        Evict the expired rooms, and send the heartbeats to the connections of the other rooms
+
+        Returns:
+            rooms that were evicted
+        """
+
+        now = monotonic()
+        expired: List[Tuple[str,bool,BoardGame]] = []
+        heartbeats = []
+
+        for game_type, is_public, room in self.sentinel.all_rooms():
+            if self.is_expired(room, now):
+                expired.append((game_type, is_public, room))
+            else:
+                heartbeats.extend(self.heartbeat(room, player, now) for player in room.connections if player.connection)
+
+        # remove every expired room before awaiting any socket, so none of them can be joined in the meantime
+        for game_type, is_public, room in expired:
+            try:
+                self.sentinel.remove_room(game_type, room, is_public)
+            except RuntimeError:
+                pass
+
+        self.evicted += len(expired)
+
+        await asyncio.gather(*heartbeats, *(self.close_room(room) for _, _, room in expired))
+
+        return [room for _, _, room in expired]
+
+    async def heartbeat(self, room: BoardGame, player: Player, now: float) -> None:
+        """
+        Ping a connection, or close it if it stopped answering
+
+        Args:
+            room: room the player is in
+            player: player to be pinged
+            now: current time
+        """
+
+        if now - player.last_seen > self.heartbeat_timeout:
+            self.closed += 1
+            await self.close(player)
+        elif not await room.send(player, PING):
+            # the writer of the connection already failed, its handler removes the player once it notices
+            await self.close(player)
+
+    async def close_room(self, room: BoardGame) -> None:
+        """
+        Tell the players of an evicted room that it expired, and close their connections
+
+        Args:
+            room: room that was evicted
+        """
+
+        for player in room.connections:
+            await room.send(player, {
+                "event": "disconnected",
+                "message": "The room has expired"
+            })
+
+        await asyncio.gather(*(self.close(player) for player in room.connections if player.connection))
+
+    async def close(self, player: Player) -> None:
+        """
+        Close the connection of a player once its queued messages are sent, which makes its handler clean the
+        player up
+
+        Args:
+            player: player whose connection is closed
+        """
+
+        try:
+            if player.outbox:
+                await asyncio.wait_for(player.outbox.drain(), SEND_TIMEOUT)
+        except asyncio.TimeoutError:
+            pass
+
+        try:
+            await asyncio.wait_for(player.connection.close(status.WS_1001_GOING_AWAY), SEND_TIMEOUT)
+        except Exception:
+            pass
+
+        # stop the writer even if the handler of the player is no longer there to remove it
+        if player.outbox:
+            player.outbox.close()
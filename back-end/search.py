@@ -0,0 +1,34 @@
+class SearchTimeout(Exception):
+    """
+    Raised inside the search when the time or node budget has been used up
+    """
+
+class SearchResult:
+    """
+    Class used to report the outcome of a search
+
+    Attributes:
+        move: best move found
+        score: score of the best move from the point of view of the player to move
+        depth: depth of the deepest completed iteration
+        nodes: number of positions visited
+        elapsed: time spent searching in seconds
+    """
+
+    def __init__(self, move: object, score: int, depth: int, nodes: int, elapsed: float) -> None:
+        self.move = move
+        self.score = score
+        self.depth = depth
+        self.nodes = nodes
+        self.elapsed = elapsed
+
+    @property
+    def nodes_per_second(self) -> float:
+        """
+        Get the search speed
+
+        Returns:
+            number of positions visited per second
+        """
+
+        return self.nodes / self.elapsed if self.elapsed > 0 else 0.0
@@ -0,0 +1,433 @@
+import argparse
+import json
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+from math import log10, sqrt
+from time import perf_counter
+from typing import Dict, List, Optional, Tuple
+
+import checkers_search
+import connect4_search
+from checkers import Checkers
+from connect4 import Connect4
+from game import BoardGame, Player
+
+GAME_TYPES = ("connect-4", "checkers")
+ENGINES = ("random", "heuristic", "search")
+NODE_LIMIT = 20000 # default budget of the searches, in nodes so that the games are the same on every machine
+OPENING_PLIES = {"connect-4": 2, "checkers": 4} # random moves played before the bots take over, so that games differ
+MAX_PLIES = {"connect-4": 42, "checkers": 200} # games still going after this many moves are drawn
+Z = 1.96 # 95% confidence intervals
+
+class Bot:
+    """
+    Class used to describe a bot taking part in self-play, from a specification such as "search:nodes=50000"
+
+    The engines are "random", "heuristic" for the predict_next_*_move functions of the server, and "search" for the
+    negamax search of connect 4 and the alpha-beta search of checkers. Searches take "nodes", "time" and "depth" budgets.
+
+    Attributes:
+        spec: specification of the bot, which names it in the reports
+        engine: engine choosing the moves
+        node_limit: maximum number of positions a search can visit, 0 for unlimited
+        time_limit: maximum number of seconds a search can take, 0 for unlimited
+        depth: maximum depth of a search, 0 for the default of the engine
+        table: transposition table of the bot, fresh for every game so that games do not depend on each other
+    """
+
+    def __init__(self, spec: str) -> None:
+        """
+        Constructor
+
+        Args:
+            spec: specification of the bot, an engine optionally followed by a colon and comma separated budgets
+
+        Raises:
+            ValueError: the specification is not valid
+        """
+
+        self.spec = spec
+        self.engine, _, options = spec.partition(":")
+        self.node_limit = NODE_LIMIT
+        self.time_limit = 0.0
+        self.depth = 0
+        self.table = None
+
+        if self.engine not in ENGINES:
+            raise ValueError(f"Unknown engine {self.engine}")
+
+        for option in filter(None, options.split(",")):
+            key, _, value = option.partition("=")
+
+            if key == "nodes":
+                self.node_limit = int(value)
+            elif key == "time":
+                self.time_limit = float(value)
+            elif key == "depth":
+                self.depth = int(value)
+            else:
+                raise ValueError(f"Unknown budget {key}")
+
+    def new_game(self, game_type: str) -> None:
+        """
+        Forget what was learnt in the previous game
+
+        Args:
+            game_type: type of game about to be played
+        """
+
+        if self.engine == "search":
+            self.table = connect4_search.TranspositionTable() if game_type == "connect-4" else checkers_search.TranspositionTable()
+
+    def choose(self, game: BoardGame, rng: random.Random) -> Tuple[object,int]:
+        """
+        Choose the move of the player to move
+
+        Args:
+            game: the instance of the board game
+            rng: random generator of the game
+
+        Returns:
+            tuple containing the move, and the number of positions visited to choose it
+        """
+
+        if self.engine == "random":
+            return rng.choice(legal_moves(game)), 0
+
+        if self.engine == "heuristic":
+            # the heuristics live in the server, which is only imported by the processes that need them
+            from main import predict_next_checkers_move, predict_next_connect4_move
+
+            game.dummy_plug = Player(game.current_player, self.spec, None)
+
+            if isinstance(game, Connect4):
+                return predict_next_connect4_move(game), 0
+
+            return predict_next_checkers_move(game), 0
+
+        if isinstance(game, Connect4):
+            searcher = connect4_search.Searcher(game.position, game.current_player, self.time_limit, self.node_limit, self.table, game.evaluator)
+            result = searcher.search(self.depth or connect4_search.MAX_MOVES)
+        else:
+            searcher = checkers_search.Searcher(game.position, game.current_player, checkers_search.pending_piece(game), self.time_limit, self.node_limit, self.table)
+            result = searcher.search(self.depth or checkers_search.MAX_DEPTH)
+
+        return result.move, result.nodes
+
+def legal_moves(game: BoardGame) -> List[object]:
+    """
+    Get the moves the player to move can play
+
+    Args:
+        game: the instance of the board game
+
+    Returns:
+        columns of connect 4, or (current position, next position) of checkers, captures being compulsory
+    """
+
+    if isinstance(game, Connect4):
+        return [column for column in range(game.dimensions["col"]) if game.position.can_play(column)]
+
+    moves = game.all_moves["moves_eat"][game.current_player] or game.all_moves["moves"][game.current_player]
+    return [(current_position, move["possible_move"]) for current_position in moves for move in moves[current_position]]
+
+def play(game: BoardGame, move: object) -> int:
+    """
+    Play a move for the player to move
+
+    Args:
+        game: the instance of the board game
+        move: column of connect 4, or (current position, next position) of checkers
+
+    Returns:
+        the winner, 3 for a draw, 0 if the game goes on
+    """
+
+    if isinstance(game, Connect4):
+        winner, _ = game.make_move(game.current_player, move)
+    else:
+        _, winner = game.make_move(game.current_player, *move)
+
+    return winner
+
+def play_game(game_type: str, specs: Tuple[str,str], seed: int) -> Dict[str,object]:
+    """
+    Play a game between two bots, the same way for a given seed. Run by the processes of the pool
+
+    Args:
+        game_type: type of game played
+        specs: specifications of the bots playing as player 1 and player 2
+        seed: seed of the game, choosing the opening and the random choices of the bots
+
+    Returns:
+        the winner, 3 for a draw, the number of moves, and the moves, nodes and seconds of thinking of every bot
+    """
+
+    rng = random.Random(seed)
+    random.seed(seed) # the heuristics use the global random generator
+    bots = {1: Bot(specs[0]), 2: Bot(specs[1])}
+
+    for bot in bots.values():
+        bot.new_game(game_type)
+
+    game = Connect4("selfplay") if game_type == "connect-4" else Checkers("selfplay")
+    game.started = True
+    game.used_player_numbers = [1, 2]
+    game.current_player = 1
+
+    stats = {player: {"moves": 0, "nodes": 0, "seconds": 0.0} for player in bots}
+    winner = 0
+    plies = 0
+
+    while not winner and plies < MAX_PLIES[game_type]:
+        player = game.current_player
+
+        if plies < OPENING_PLIES[game_type]:
+            move = rng.choice(legal_moves(game))
+        else:
+            started = perf_counter()
+            move, nodes = bots[player].choose(game, rng)
+            stats[player]["seconds"] += perf_counter() - started
+            stats[player]["nodes"] += nodes
+            stats[player]["moves"] += 1
+
+        winner = play(game, move)
+        plies += 1
+
+    return {"winner": winner or 3, "plies": plies, "players": stats}
+
+class Match:
+    """
+    Class used to add up the games between two bots of one game type
+
+    Attributes:
+        game_type: type of game played
+        first: specification of the first bot
+        second: specification of the second bot
+        wins: games won by the first bot
+        draws: drawn games
+        losses: games lost by the first bot
+    """
+
+    def __init__(self, game_type: str, first: str, second: str) -> None:
+        self.game_type = game_type
+        self.first = first
+        self.second = second
+        self.wins = 0
+        self.draws = 0
+        self.losses = 0
+
+    def add(self, result: float) -> None:
+        """
+        Record a game
+
+        Args:
+            result: score of the first bot, 1 for a win, 0.5 for a draw and 0 for a loss
+        """
+
+        if result == 1:
+            self.wins += 1
+        elif result == 0:
+            self.losses += 1
+        else:
+            self.draws += 1
+
+    def to_dict(self) -> Dict[str,object]:
+        """
+        Get the match as a report
+
+        Returns:
+            a valid JSON representation of the match, with the Elo difference of the first bot over the second and its
+            95% confidence interval
+        """
+
+        games = self.wins + self.draws + self.losses
+        low, difference, high = elo_interval(self.wins, self.draws, self.losses)
+
+        return {
+            "game_type": self.game_type,
+            "first": self.first,
+            "second": self.second,
+            "games": games,
+            "wins": self.wins,
+            "draws": self.draws,
+            "losses": self.losses,
+            "score": (self.wins + self.draws/2)/games if games else None,
+            "elo": difference,
+            "elo_low": low,
+            "elo_high": high
+        }
+
+def elo(score: float) -> float:
+    """
+    Convert a score into an Elo difference
+
+    Args:
+        score: average score, strictly between 0 and 1
+
+    Returns:
+        the Elo difference
+    """
+
+    return -400*log10(1/score - 1)
+
+def elo_interval(wins: int, draws: int, losses: int) -> Tuple[Optional[float],Optional[float],Optional[float]]:
+    """
+    Estimate an Elo difference from the results of games, with its confidence interval from the normal approximation of
+    the average score
+
+    Args:
+        wins: games won
+        draws: games drawn
+        losses: games lost
+
+    Returns:
+        tuple containing the low end of the interval, the estimate and the high end, rounded to a tenth, all None if no
+        game was played
+    """
+
+    games = wins + draws + losses
+
+    if not games:
+        return None, None, None
+
+    score = (wins + draws/2)/games
+    deviation = sqrt(max(0.0, (wins + draws/4)/games - score**2)/games)
+
+    # a clean sweep has no finite Elo, so keep the scores half a game away from it
+    floor, ceiling = 0.5/games, 1 - 0.5/games
+    clamp = lambda value: min(max(value, floor), ceiling)
+
+    return tuple(round(elo(clamp(value)), 1) for value in (score - Z*deviation, score, score + Z*deviation))
+
+def schedule(game_types: List[str], specs: List[str], games: int, seed: int) -> List[Tuple[str,Tuple[str,str],int]]:
+    """
+    List the games to be played. Every pair of bots plays every opening twice, once with each colour
+
+    Args:
+        game_types: types of game played
+        specs: specifications of the bots
+        games: number of games of every pair of bots and game type
+        seed: seed of the first game, the next games use the following seeds
+
+    Returns:
+        list of (game type, specifications of player 1 and player 2, seed) tuples
+    """
+
+    jobs = []
+
+    for game_type in game_types:
+        for first, second in combinations(specs, 2):
+            for index in range(games):
+                opening = seed + index//2
+                jobs.append((game_type, (first, second) if index % 2 == 0 else (second, first), opening))
+
+    return jobs
+
+def run(game_types: List[str], specs: List[str], games: int, seed: int, workers: int) -> Dict[str,object]:
+    """
+    Play every game across the cores and summarise them
+
+    Args:
+        game_types: types of game played
+        specs: specifications of the bots
+        games: number of games of every pair of bots and game type
+        seed: seed of the first game
+        workers: number of processes playing the games
+
+    Returns:
+        the report, as a valid JSON representation
+    """
+
+    jobs = schedule(game_types, specs, games, seed)
+    matches = {(game_type, first, second): Match(game_type, first, second) for game_type in game_types for first, second in combinations(specs, 2)}
+    bots = {(game_type, spec): {"moves": 0, "nodes": 0, "seconds": 0.0} for game_type in game_types for spec in specs}
+    plies = 0
+    started = perf_counter()
+
+    with ProcessPoolExecutor(workers) as pool:
+        results = pool.map(play_game, *zip(*jobs), chunksize=max(1, len(jobs)//(workers*8)))
+
+        for (game_type, players, _), result in zip(jobs, results):
+            plies += result["plies"]
+
+            for player, spec in zip((1, 2), players):
+                for key, value in result["players"][player].items():
+                    bots[game_type, spec][key] += value
+
+            # matches are kept from the point of view of the bot listed first
+            first, second = players if (game_type, *players) in matches else players[::-1]
+            score = {3: 0.5, players.index(first) + 1: 1.0}.get(result["winner"], 0.0)
+            matches[game_type, first, second].add(score)
+
+    elapsed = perf_counter() - started
+
+    return {
+        "games": len(jobs),
+        "elapsed": round(elapsed, 3),
+        "games_per_second": round(len(jobs)/elapsed, 2),
+        "moves_per_second": round(plies/elapsed, 1),
+        "workers": workers,
+        "seed": seed,
+        "bots": [
+            {
+                "game_type": game_type,
+                "bot": spec,
+                "moves": stats["moves"],
+                "think_ms": round(stats["seconds"]/stats["moves"]*1000, 3) if stats["moves"] else None,
+                "nodes_per_second": round(stats["nodes"]/stats["seconds"]) if stats["seconds"] else 0
+            }
+            for (game_type, spec), stats in bots.items()
+        ],
+        "matches": [match.to_dict() for match in matches.values()]
+    }
+
+def print_report(report: Dict[str,object]) -> None:
+    """
+    Print a report as tables
+
+    Args:
+        report: report returned by run()
+    """
+
+    print(f"{report['games']} games in {report['elapsed']}s, {report['games_per_second']} games/s, {report['moves_per_second']} moves/s on {report['workers']} workers")
+    print()
+    print(f"{'game':10} {'bot':32} {'moves':>8} {'think ms':>10} {'nodes/s':>10}")
+
+    for bot in report["bots"]:
+        print(f"{bot['game_type']:10} {bot['bot']:32} {bot['moves']:8} {bot['think_ms'] or 0:10.3f} {bot['nodes_per_second']:10}")
+
+    print()
+    print(f"{'game':10} {'match':48} {'+/=/-':>14} {'elo':>8} {'95% interval':>18}")
+
+    for match in report["matches"]:
+        results = f"{match['wins']}/{match['draws']}/{match['losses']}"
+        print(f"{match['game_type']:10} {match['first'] + ' vs ' + match['second']:48} {results:>14} {match['elo']:8} [{match['elo_low']}, {match['elo_high']}]")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play headless games between bots across every core, and estimate their relative strength")
+    parser.add_argument("bots", nargs="+", help="specifications of the bots, such as heuristic, random or search:nodes=50000,depth=8")
+    parser.add_argument("--games", type=int, default=1000, help="number of games of every pair of bots and game type")
+    parser.add_argument("--game-types", nargs="+", choices=GAME_TYPES, default=list(GAME_TYPES), help="game types played")
+    parser.add_argument("--seed", type=int, default=2022, help="seed of the first game")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="number of processes playing the games")
+    parser.add_argument("--output", help="path of the JSON file the report is written to")
+    args = parser.parse_args()
+
+    if len(set(args.bots)) < 2:
+        parser.error("at least two different bots are needed")
+
+    try:
+        for spec in args.bots:
+            Bot(spec)
+    except ValueError as e:
+        parser.error(str(e))
+
+    report = run(args.game_types, list(dict.fromkeys(args.bots)), args.games, args.seed, args.workers)
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
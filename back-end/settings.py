@@ -0,0 +1,94 @@
+import os
+
+# settings of the back-end, read from the environment so that every deployment can tune them without code changes
+
+# engine used by the connect 4 bot: "negamax" for the search engine, "heuristic" for the original one ply heuristic
+CONNECT4_ENGINE = os.environ.get("BOREDGAMES_CONNECT4_ENGINE", "negamax")
+
+# think-time budget of the connect 4 search engine in seconds, and optional node budget (0 means unlimited)
+CONNECT4_TIME_LIMIT = float(os.environ.get("BOREDGAMES_CONNECT4_TIME_LIMIT", "0.25"))
+CONNECT4_NODE_LIMIT = int(os.environ.get("BOREDGAMES_CONNECT4_NODE_LIMIT", "0"))
+
+# opening books generated offline with books.py, the bots play without searching when a position is found
+BOOKS_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "books")
+CONNECT4_BOOK = os.environ.get("BOREDGAMES_CONNECT4_BOOK", os.path.join(BOOKS_DIRECTORY, "connect-4.book"))
+CHECKERS_BOOK = os.environ.get("BOREDGAMES_CHECKERS_BOOK", os.path.join(BOOKS_DIRECTORY, "checkers.book"))
+
+# engine used by the checkers bot: "alphabeta" for the search engine, "heuristic" for the original one ply heuristic
+CHECKERS_ENGINE = os.environ.get("BOREDGAMES_CHECKERS_ENGINE", "heuristic")
+
+# think-time budget of the checkers search engine in seconds, and optional node budget (0 means unlimited)
+CHECKERS_TIME_LIMIT = float(os.environ.get("BOREDGAMES_CHECKERS_TIME_LIMIT", "0.5"))
+CHECKERS_NODE_LIMIT = int(os.environ.get("BOREDGAMES_CHECKERS_NODE_LIMIT", "0"))
+
+# checkers endgame tablebase generated offline with tablebase.py, the bot plays from it once few pieces are left
+CHECKERS_TABLEBASE = os.environ.get("BOREDGAMES_CHECKERS_TABLEBASE", os.path.join(BOOKS_DIRECTORY, "checkers-endgame.tb"))
+
+# number of worker processes computing the moves of the bot search engines, 0 for one per CPU
+BOT_WORKERS = int(os.environ.get("BOREDGAMES_BOT_WORKERS", "0"))
+
+# seconds a bot move may wait for a free worker on top of its think-time, before the bot falls back to a shallow search
+BOT_QUEUE_GRACE = float(os.environ.get("BOREDGAMES_BOT_QUEUE_GRACE", "1.0"))
+
+# pacing of the bot moves: "human" reveals moves after a random thinking delay, "instant" reveals them straight away
+BOT_PACING = os.environ.get("BOREDGAMES_BOT_PACING", "human")
+
+# seconds between two sweeps of the room reaper, which also sends the heartbeats to every connection
+REAPER_INTERVAL = float(os.environ.get("BOREDGAMES_REAPER_INTERVAL", "20"))
+
+# seconds a connection can go without answering the heartbeats before it is closed
+HEARTBEAT_TIMEOUT = float(os.environ.get("BOREDGAMES_HEARTBEAT_TIMEOUT", "60"))
+
+# seconds a room can go without any game event, once finished, and in total, before it is evicted
+ROOM_IDLE_TIMEOUT = float(os.environ.get("BOREDGAMES_ROOM_IDLE_TIMEOUT", "900"))
+ROOM_FINISHED_TIMEOUT = float(os.environ.get("BOREDGAMES_ROOM_FINISHED_TIMEOUT", "300"))
+ROOM_MAX_LIFETIME = float(os.environ.get("BOREDGAMES_ROOM_MAX_LIFETIME", "21600"))
+
+# maximum number of messages waiting to be sent to a connection, and what happens to a client that falls further behind:
+# "drop" drops the messages, "coalesce" replaces the queued moves by the latest state of the game, "disconnect" closes the connection
+OUTBOX_SIZE = int(os.environ.get("BOREDGAMES_OUTBOX_SIZE", "64"))
+OUTBOX_POLICY = os.environ.get("BOREDGAMES_OUTBOX_POLICY", "coalesce")
+
+# seconds a player whose connection dropped keeps their seat, and number of recent events kept to replay once they reconnect
+RECONNECT_GRACE = float(os.environ.get("BOREDGAMES_RECONNECT_GRACE", "30"))
+RECONNECT_HISTORY = int(os.environ.get("BOREDGAMES_RECONNECT_HISTORY", "64"))
+
+# URL of this worker and of every worker of the deployment, e.g. "ws://localhost:8001", rooms are spread across the
+# workers by consistent hashing of their room ID, and joins for a room of another worker are redirected to it
+WORKER = os.environ.get("BOREDGAMES_WORKER", "")
+WORKERS = [worker for worker in os.environ.get("BOREDGAMES_WORKERS", WORKER).split(",") if worker] or [WORKER]
+
+# SQLite database shared by the workers as the directory of the rooms, empty to keep the directory in memory
+DIRECTORY = os.environ.get("BOREDGAMES_DIRECTORY", "")
+
+# seconds between two reports of the number of players connected to this worker
+DIRECTORY_INTERVAL = float(os.environ.get("BOREDGAMES_DIRECTORY_INTERVAL", "5"))
+
+# whether the handlers, engine calls and broadcasts are traced, the fraction of the events traced, and the number of
+# finished spans kept, tracing can also be switched on at runtime from the admin end-points
+TRACING = os.environ.get("BOREDGAMES_TRACING", "false") == "true"
+TRACING_SAMPLE_RATE = float(os.environ.get("BOREDGAMES_TRACING_SAMPLE_RATE", "1.0"))
+TRACING_BUFFER = int(os.environ.get("BOREDGAMES_TRACING_BUFFER", "10000"))
+
+# token required by the admin end-points, which are disabled when it is empty
+ADMIN_TOKEN = os.environ.get("BOREDGAMES_ADMIN_TOKEN", "")
+
+# directory the moves of every room are logged into, replayable with movelog.py, empty to not log the moves, and
+# seconds between two batches of moves written to the disk
+MOVE_LOG = os.environ.get("BOREDGAMES_MOVE_LOG", "")
+MOVE_LOG_INTERVAL = float(os.environ.get("BOREDGAMES_MOVE_LOG_INTERVAL", "1"))
+
+# file the rooms are saved to when the server shuts down and restored from when it starts, empty to not keep the rooms
+# across restarts, and seconds the players of the restored rooms have to reconnect
+CHECKPOINT = os.environ.get("BOREDGAMES_CHECKPOINT", "")
+CHECKPOINT_GRACE = float(os.environ.get("BOREDGAMES_CHECKPOINT_GRACE", "60"))
+
+# events per second a connection can send and the events it can send at once, the same for every IP address across its
+# connections, connection attempts included (0 means unlimited), the number of addresses tracked, and what happens to
+# the events over the limits: "drop" drops them without an answer, "close" closes the connection
+RATE_LIMIT = float(os.environ.get("BOREDGAMES_RATE_LIMIT", "10"))
+RATE_LIMIT_BURST = float(os.environ.get("BOREDGAMES_RATE_LIMIT_BURST", "20"))
+ADDRESS_RATE_LIMIT = float(os.environ.get("BOREDGAMES_ADDRESS_RATE_LIMIT", "100"))
+ADDRESS_RATE_LIMIT_BURST = float(os.environ.get("BOREDGAMES_ADDRESS_RATE_LIMIT_BURST", "200"))
+RATE_LIMIT_ADDRESSES = int(os.environ.get("BOREDGAMES_RATE_LIMIT_ADDRESSES", "100000"))
+RATE_LIMIT_POLICY = os.environ.get("BOREDGAMES_RATE_LIMIT_POLICY", "drop")
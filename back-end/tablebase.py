@@ -0,0 +1,635 @@
+import argparse
+import heapq
+import mmap
+import os
+import struct
+from array import array
+from checkers import Checkers, CheckersPosition, FULL, SQUARE_INDEXES, SQUARES
+from itertools import combinations
+from math import comb
+from typing import Callable, Dict, List, Optional, Tuple
+
+# header of a tablebase file: magic, version, maximum number of pieces, number of slices
+HEADER = struct.Struct("<4sHHI")
+# directory entry of a slice: men and kings of the player to move, men and kings of the opponent, offset of the values
+SLICE = struct.Struct("<BBBBQ")
+MAGIC = b"BGTB"
+VERSION = 1
+
+# squares every group of pieces can stand on, seen from the player to move who moves up the board:
+# men never stand on their crowning row, so the player's men use squares 0-27 and the opponent's men squares 4-31
+GROUP_OFFSETS = (0, 0, 4, 0)
+GROUP_SQUARES = (28, 32, 28, 32)
+
+# a value is stored in one byte: 0 for a draw, d for a win in d plies, and LOSS + d for a loss in d plies
+LOSS = 128
+MAX_DISTANCE = 127
+
+# 180 degrees rotation of the board maps square i to square 31 - i, which reverses the bits of a bitboard
+REVERSED_BYTES = bytes(int(f"{byte:08b}"[::-1], 2) for byte in range(256))
+
+Signature = Tuple[int,int,int,int]
+Lookup = Callable[[CheckersPosition, int], Optional[int]]
+
+def rotate(bitboard: int) -> int:
+    """
+    Rotate a checkers bitboard by 180 degrees
+
+    Args:
+        bitboard: bitboard to be rotated
+
+    Returns:
+        rotated bitboard
+    """
+
+    return (REVERSED_BYTES[bitboard & 0xFF] << 24 | REVERSED_BYTES[bitboard >> 8 & 0xFF] << 16
+            | REVERSED_BYTES[bitboard >> 16 & 0xFF] << 8 | REVERSED_BYTES[bitboard >> 24])
+
+def popcount(bitboard: int) -> int:
+    return bin(bitboard).count("1")
+
+def normalise(position: CheckersPosition, player: int) -> Tuple[int,int,int,int]:
+    """
+    Get the bitboards of a position as seen by the player to move, rotating the board for player 2
+
+    Args:
+        position: position to be normalised
+        player: player number to move
+
+    Returns:
+        the men and kings of the player to move, then the men and kings of the opponent
+    """
+
+    if player == 1:
+        return (position.men[1], position.kings[1], position.men[2], position.kings[2])
+
+    return (rotate(position.men[2]), rotate(position.kings[2]), rotate(position.men[1]), rotate(position.kings[1]))
+
+def slice_size(signature: Signature) -> int:
+    """
+    Get the number of values stored for a slice, including the unused ones where pieces overlap
+
+    Args:
+        signature: men and kings of the player to move, then men and kings of the opponent
+
+    Returns:
+        number of values of the slice
+    """
+
+    size = 1
+    for squares, count in zip(GROUP_SQUARES, signature):
+        size *= comb(squares, count)
+
+    return size
+
+def rank(bitboard: int, offset: int) -> int:
+    """
+    Rank the squares of a group of pieces in the combinatorial number system
+
+    Args:
+        bitboard: bitboard of the group
+        offset: first square the group can stand on
+
+    Returns:
+        rank of the group among all the groups of the same size
+    """
+
+    result, i = 0, 1
+    while bitboard:
+        bit = bitboard & -bitboard
+        bitboard ^= bit
+        result += comb(bit.bit_length() - 1 - offset, i)
+        i += 1
+
+    return result
+
+def index(groups: Tuple[int,int,int,int], signature: Signature) -> int:
+    """
+    Get the index of a normalised position in its slice
+
+    Args:
+        groups: normalised bitboards, as returned by normalise
+        signature: number of pieces of every group
+
+    Returns:
+        index of the value of the position
+    """
+
+    result = 0
+    for bitboard, offset, squares, count in zip(groups, GROUP_OFFSETS, GROUP_SQUARES, signature):
+        result = result * comb(squares, count) + rank(bitboard, offset)
+
+    return result
+
+def signature_of(groups: Tuple[int,int,int,int]) -> Signature:
+    return tuple(popcount(bitboard) for bitboard in groups)
+
+def encode(value: int) -> int:
+    """
+    Encode a value in one byte
+
+    Args:
+        value: positive distance for a win, negative distance for a loss, 0 for a draw
+
+    Returns:
+        encoded byte
+    """
+
+    if abs(value) > MAX_DISTANCE:
+        raise ValueError(f"Distance {abs(value)} does not fit in the tablebase")
+
+    return value if value >= 0 else LOSS - value
+
+def decode(byte: int) -> int:
+    """
+    Decode a value stored in one byte
+
+    Args:
+        byte: encoded byte
+
+    Returns:
+        positive distance for a win, negative distance for a loss, 0 for a draw
+    """
+
+    return byte if byte < LOSS else LOSS - byte
+
+def negate(value: int) -> int:
+    """
+    Convert the value of a position for the opponent to the value of the move leading to it for the player
+
+    Args:
+        value: value of the position for the opponent
+
+    Returns:
+        value of the move for the player
+    """
+
+    return -value - 1 if value > 0 else -value + 1 if value < 0 else 0
+
+def extend(value: int) -> int:
+    """
+    Add the ply of a move to a value when the same player keeps playing
+
+    Args:
+        value: value of the position for the player
+
+    Returns:
+        value of the move for the player
+    """
+
+    return value + 1 if value > 0 else value - 1 if value < 0 else 0
+
+def better(value: int, other: Optional[int]) -> bool:
+    """
+    Check if a value is better than another one for the player: faster wins, then draws, then slower losses
+
+    Args:
+        value: value to be compared
+        other: current best value, None if there is none
+
+    Returns:
+        True if value is better than other, False otherwise
+    """
+
+    if other is None:
+        return True
+    if (value > 0) != (other > 0):
+        return value > 0
+    if value > 0:
+        return value < other
+    if (value == 0) != (other == 0):
+        return value == 0
+    return value < other if value < 0 and other < 0 else False
+
+def outcome(position: CheckersPosition, player: int) -> Optional[int]:
+    """
+    Check if the game is over after a player moved. As in Checkers.make_move, the game ends as soon as any player
+    cannot move: the other player wins, or it is a draw if neither can move
+
+    Args:
+        position: position after the move
+        player: player number who moved
+
+    Returns:
+        value of the move for the player if the game is over, None otherwise
+    """
+
+    can_move, opponent_can_move = position.has_moves(player), position.has_moves(3 - player)
+
+    if can_move and opponent_can_move:
+        return None
+    if can_move:
+        return 1
+    if opponent_can_move:
+        return -1
+    return 0
+
+def move_value(position: CheckersPosition, player: int, move: Tuple[int,int,int], lookup: Lookup) -> Optional[int]:
+    """
+    Get the value of a move for the player, following the multi-jump rules of Checkers.make_move
+
+    Args:
+        position: position before the move
+        player: player number making the move
+        move: (starting square, landing square, captured square) tuple
+        lookup: function returning the value of a position for the player to move, None if it is unknown
+
+    Returns:
+        value of the move for the player, None if it is unknown
+    """
+
+    start, end, captured = move
+    child = position.copy()
+    child.move(player, start, end, captured)
+
+    value = outcome(child, player)
+    if value is not None:
+        return value
+
+    if captured >= 0:
+        # the piece keeps capturing, otherwise the player keeps capturing with any piece
+        if child.can_capture(player, 1 << end):
+            value = continuation_value(child, player, end, lookup)
+            return None if value is None else extend(value)
+
+        if child.can_capture(player):
+            value = lookup(child, player)
+            return None if value is None else extend(value)
+
+    value = lookup(child, 3 - player)
+    return None if value is None else negate(value)
+
+def continuation_value(position: CheckersPosition, player: int, pending: int, lookup: Lookup) -> Optional[int]:
+    """
+    Get the value of a position where a piece has to continue a multi-jump
+
+    Args:
+        position: position to be valued
+        player: player number to move
+        pending: square of the piece that has to keep capturing
+        lookup: function returning the value of a position for the player to move, None if it is unknown
+
+    Returns:
+        value of the position for the player, None if it is unknown
+    """
+
+    best = None
+
+    for move in position.captures(player, 1 << pending):
+        value = move_value(position, player, move, lookup)
+        if value is None:
+            return None
+        if better(value, best):
+            best = value
+
+    return best
+
+class Tablebase:
+    """
+    Class used to probe a memory-mapped endgame tablebase file
+
+    The file is a header, a directory of slices, then one byte per position of every slice. A slice holds all the
+    positions with the same number of men and kings for the player to move and the opponent. Positions are always
+    seen by the player to move, so the board is rotated when player 2 is to move.
+
+    Attributes:
+        path: path of the tablebase file
+        max_pieces: maximum number of pieces of the positions in the tablebase
+        offsets: dictionary mapping slice signatures to the offset of their values
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Constructor to map a tablebase file into memory
+
+        Args:
+            path: path of the tablebase file
+        """
+
+        self.path = path
+
+        with open(path, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.max_pieces, count = HEADER.unpack_from(self.map, 0)
+
+        if magic != MAGIC or version != VERSION:
+            self.map.close()
+            raise RuntimeError(f"{path} is not a valid tablebase")
+
+        self.offsets: Dict[Signature,int] = {}
+        for i in range(count):
+            *signature, offset = SLICE.unpack_from(self.map, HEADER.size + i * SLICE.size)
+            self.offsets[tuple(signature)] = offset
+
+    def probe(self, position: CheckersPosition, player: int) -> Optional[int]:
+        """
+        Get the value of a position for the player to move, assuming no multi-jump is pending
+
+        Args:
+            position: position to be probed
+            player: player number to move
+
+        Returns:
+            positive distance for a win, negative distance for a loss, 0 for a draw, None if the position is not covered
+        """
+
+        groups = normalise(position, player)
+        signature = signature_of(groups)
+        offset = self.offsets.get(signature)
+
+        if offset is None:
+            return None
+
+        return decode(self.map[offset + index(groups, signature)])
+
+    def best_move(self, game: Checkers) -> Optional[Tuple[Tuple[int,int],Tuple[int,int]]]:
+        """
+        Get the move with the best value for the player to move in a checkers game
+
+        Args:
+            game: the instance of checkers game
+
+        Returns:
+            tuple containing the starting position and the next position, or None if the position is not covered
+        """
+
+        position, player = game.position, game.current_player
+
+        if popcount(position.pieces(1) | position.pieces(2)) > self.max_pieces:
+            return None
+
+        # the moves the game currently allows, which accounts for a pending multi-jump
+        eats = game.all_moves["moves_eat"][player]
+        only = sum(1 << SQUARE_INDEXES[square] for square in eats) if eats else FULL
+        moves = position.captures(player, only) or position.quiet_moves(player)
+
+        best, best_value = None, None
+
+        for move in moves:
+            value = move_value(position, player, move, self.probe)
+            if value is None:
+                return None
+            if better(value, best_value):
+                best, best_value = move, value
+
+        if best is None:
+            return None
+
+        return (SQUARES[best[0]], SQUARES[best[1]])
+
+    def close(self) -> None:
+        """
+        Unmap the tablebase file
+        """
+
+        self.map.close()
+
+def load_tablebase(path: str) -> Optional[Tablebase]:
+    """
+    Map a tablebase file if it exists
+
+    Args:
+        path: path of the tablebase file
+
+    Returns:
+        Tablebase instance, or None if there is no tablebase at the path
+    """
+
+    if not os.path.isfile(path):
+        return None
+
+    return Tablebase(path)
+
+def group_combinations(group: int, count: int) -> List[Tuple[int,int]]:
+    """
+    Enumerate all the placements of a group of pieces
+
+    Args:
+        group: index of the group (men and kings of the player to move, then of the opponent)
+        count: number of pieces in the group
+
+    Returns:
+        list of (bitboard, rank) tuples
+    """
+
+    offset = GROUP_OFFSETS[group]
+    placements = []
+
+    for squares in combinations(range(offset, offset + GROUP_SQUARES[group]), count):
+        bitboard = sum(1 << square for square in squares)
+        placements.append((bitboard, rank(bitboard, offset)))
+
+    return placements
+
+def slice_positions(signature: Signature):
+    """
+    Enumerate the valid positions of a slice
+
+    Args:
+        signature: men and kings of the player to move, then men and kings of the opponent
+
+    Yields:
+        (index, normalised bitboards) tuples
+    """
+
+    placements = [group_combinations(group, count) for group, count in enumerate(signature)]
+    sizes = [comb(squares, count) for squares, count in zip(GROUP_SQUARES, signature)]
+
+    for men, men_rank in placements[0]:
+        for kings, kings_rank in placements[1]:
+            if men & kings:
+                continue
+            for opponent_men, opponent_men_rank in placements[2]:
+                if (men | kings) & opponent_men:
+                    continue
+                for opponent_kings, opponent_kings_rank in placements[3]:
+                    if (men | kings | opponent_men) & opponent_kings:
+                        continue
+
+                    i = ((men_rank * sizes[1] + kings_rank) * sizes[2] + opponent_men_rank) * sizes[3] + opponent_kings_rank
+                    yield (i, (men, kings, opponent_men, opponent_kings))
+
+def solve(signatures: List[Signature], lookup: Lookup) -> Dict[Signature,bytearray]:
+    """
+    Solve slices by retrograde analysis. The slices have to be closed under quiet moves, i.e. a slice and its
+    mirror, and every position reached by a capture or a crowning move has to be known by lookup.
+
+    Values start from the moves whose result is already known (game over, captures, crowning) and are propagated
+    backwards through the quiet moves in order of distance: a position is won as soon as one move reaches a lost
+    position, and lost once every move reaches a won position. Positions never reached this way are draws.
+
+    Args:
+        signatures: signatures of the slices to be solved together
+        lookup: function returning the value of a position outside of the slices
+
+    Returns:
+        dictionary mapping the signatures to their encoded values
+    """
+
+    bases, total = {}, 0
+    for signature in signatures:
+        bases[signature] = total
+        total += slice_size(signature)
+
+    external: List[Optional[int]] = [None] * total # best value of the moves leaving the slices
+    pending = array("i", bytes(4 * total)) # number of quiet moves whose value is still unknown
+    longest = array("i", bytes(4 * total)) # longest win of the opponent among the quiet moves
+    active = bytearray(total)
+    edges_from, edges_to = array("I"), array("I")
+
+    for signature in signatures:
+        base = bases[signature]
+
+        for i, (men, kings, opponent_men, opponent_kings) in slice_positions(signature):
+            position = CheckersPosition()
+            position.men = [0, men, opponent_men]
+            position.kings = [0, kings, opponent_kings]
+
+            # the game ends before such positions can be reached
+            if not position.has_moves(1) or not position.has_moves(2):
+                continue
+
+            node = base + i
+            active[node] = 1
+            captures = position.captures(1)
+
+            for move in captures or position.quiet_moves(1):
+                start, end, captured = move
+
+                # a quiet move that does not crown stays in the slices, unless it ends the game
+                if not captures and (position.kings[1] >> start & 1 or end < 28):
+                    child = position.copy()
+                    child.move(1, start, end)
+
+                    if outcome(child, 1) is None:
+                        groups = normalise(child, 2)
+                        edges_from.append(node)
+                        edges_to.append(bases[signature_of(groups)] + index(groups, signature_of(groups)))
+                        pending[node] += 1
+                        continue
+
+                value = move_value(position, 1, move, lookup)
+                if better(value, external[node]):
+                    external[node] = value
+
+    # reverse the quiet moves so that every position knows the positions leading to it
+    starts = array("I", bytes(4 * (total + 1)))
+    for node in edges_to:
+        starts[node + 1] += 1
+    for node in range(total):
+        starts[node + 1] += starts[node]
+
+    predecessors = array("I", bytes(4 * len(edges_to)))
+    filled = array("I", starts[:-1])
+    for source, target in zip(edges_from, edges_to):
+        predecessors[filled[target]] = source
+        filled[target] += 1
+
+    values: List[Optional[int]] = [None] * total
+    heap = []
+
+    for node in range(total):
+        if not active[node]:
+            continue
+
+        value = external[node]
+
+        if value is not None and value > 0:
+            heapq.heappush(heap, (value, node))
+        elif not pending[node]:
+            if value == 0:
+                values[node] = 0
+            else:
+                heapq.heappush(heap, (-value, node))
+
+    while heap:
+        distance, node = heapq.heappop(heap)
+        if values[node] is not None:
+            continue
+
+        # a position is pushed as a loss only when all its moves are known and none of them wins
+        won = external[node] is not None and external[node] > 0 or pending[node] > 0
+        values[node] = distance if won else -distance
+
+        for predecessor in predecessors[starts[node]:starts[node + 1]]:
+            if values[predecessor] is not None:
+                continue
+
+            if not won:
+                heapq.heappush(heap, (distance + 1, predecessor))
+                continue
+
+            pending[predecessor] -= 1
+            longest[predecessor] = max(longest[predecessor], distance)
+
+            if pending[predecessor] == 0:
+                value = external[predecessor]
+                if value is not None and value > 0:
+                    continue
+                elif value == 0:
+                    values[predecessor] = 0
+                else:
+                    heapq.heappush(heap, (max(longest[predecessor] + 1, -value if value else 0), predecessor))
+
+    return {signature: bytearray(encode(value or 0) for value in values[bases[signature]:bases[signature] + slice_size(signature)]) for signature in signatures}
+
+def generate(max_pieces: int, path: str) -> None:
+    """
+    Generate a tablebase file with every position of up to max_pieces pieces
+
+    Args:
+        max_pieces: maximum number of pieces of the positions
+        path: path of the tablebase file
+    """
+
+    signatures = [
+        (men, kings, opponent_men, opponent_kings)
+        for men in range(max_pieces) for kings in range(max_pieces) for opponent_men in range(max_pieces) for opponent_kings in range(max_pieces)
+        if 0 < men + kings and 0 < opponent_men + opponent_kings and men + kings + opponent_men + opponent_kings <= max_pieces
+    ]
+
+    # captures lead to fewer pieces, and crowning to more kings, so those slices are solved first
+    signatures.sort(key=lambda signature: (sum(signature), -(signature[1] + signature[3])))
+
+    solved: Dict[Signature,bytearray] = {}
+
+    def lookup(position: CheckersPosition, player: int) -> Optional[int]:
+        groups = normalise(position, player)
+        signature = signature_of(groups)
+        return decode(solved[signature][index(groups, signature)]) if signature in solved else None
+
+    for signature in signatures:
+        if signature in solved:
+            continue
+
+        # a quiet move hands the turn to the opponent, so a slice is solved along with its mirror
+        mirror = (signature[2], signature[3], signature[0], signature[1])
+        solved.update(solve(sorted({signature, mirror}), lookup))
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    temporary = f"{path}.tmp"
+
+    with open(temporary, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, max_pieces, len(solved)))
+
+        offset = HEADER.size + SLICE.size * len(solved)
+        for signature in signatures:
+            file.write(SLICE.pack(*signature, offset))
+            offset += len(solved[signature])
+
+        for signature in signatures:
+            file.write(solved[signature])
+
+    os.replace(temporary, path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate the checkers endgame tablebase")
+    parser.add_argument("output", help="path of the tablebase file")
+    parser.add_argument("--pieces", type=int, default=4, help="maximum number of pieces on the board")
+    args = parser.parse_args()
+
+    generate(args.pieces, args.output)
@@ -0,0 +1,239 @@
+import asyncio
+import settings
+from collections import deque
+from contextvars import ContextVar
+from functools import wraps
+from itertools import count
+from random import random
+from time import perf_counter, time
+from typing import Callable, Deque, Dict, List, Optional
+
+class Tracer:
+    """
+    Class used to record the spans of the work done by the server, such as the events of the players, the engine calls
+    and the broadcasts
+
+    Tracing is off unless enabled in the settings or by an administrator at runtime. A fraction of the root spans are
+    sampled, and the spans started inside them are recorded along with them, so that the cost stays bounded.
+
+    Attributes:
+        enabled: whether spans are recorded
+        sample_rate: fraction of the root spans that are recorded
+        spans: latest finished spans, oldest first
+    """
+
+    def __init__(self, enabled: bool, sample_rate: float, size: int) -> None:
+        """
+        Constructor
+
+        Args:
+            enabled: whether spans are recorded
+            sample_rate: fraction of the root spans that are recorded
+            size: maximum number of finished spans kept
+        """
+
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.spans: Deque["Span"] = deque(maxlen=size)
+
+    def span(self, name: str, **attributes: object) -> "Span":
+        """
+        Start a span, as a child of the current span if there is one
+
+        Args:
+            name: name of the span
+            attributes: details of the span, such as the event or the game type
+
+        Returns:
+            the span to be ended, or a span doing nothing if it is not recorded
+        """
+
+        if not self.enabled:
+            return NO_SPAN
+
+        parent = current.get()
+
+        if parent is None:
+            # a new root decides whether the whole tree of spans is recorded
+            return Span(self, name, attributes, None, random() < self.sample_rate)
+
+        if not parent.sampled:
+            return NO_SPAN
+
+        return Span(self, name, attributes, parent, True)
+
+    def recent(self, limit: int = 1000) -> List[Dict[str,object]]:
+        """
+        Get the latest finished spans
+
+        Args:
+            limit: maximum number of spans
+
+        Returns:
+            valid JSON representations of the spans, oldest first
+        """
+
+        spans = list(self.spans)[-limit:] if limit > 0 else []
+        return [span.to_dict() for span in spans]
+
+class Span:
+    """
+    Class used to time a piece of work, used as a context manager or with start() and end()
+
+    Attributes:
+        tracer: tracer recording the span
+        name: name of the span
+        attributes: details of the span
+        trace: ID of the root span of the tree
+        id: ID of the span
+        parent: ID of the parent span, None for a root span
+        sampled: whether the span is recorded
+        timestamp: wall clock time the span started
+        started: time the span started
+        duration: seconds the span took, None until it ends
+        token: token restoring the previous current span once the span ends
+    """
+
+    __slots__ = ("tracer", "name", "attributes", "trace", "id", "parent", "sampled", "timestamp", "started", "duration", "token")
+
+    def __init__(self, tracer: Tracer, name: str, attributes: Dict[str,object], parent: Optional["Span"], sampled: bool) -> None:
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.id = next(ids)
+        self.trace = parent.trace if parent else self.id
+        self.parent = parent.id if parent else None
+        self.sampled = sampled
+        self.timestamp = 0.0
+        self.started = 0.0
+        self.duration: Optional[float] = None
+        self.token = None
+
+    def start(self) -> "Span":
+        """
+        Start timing, and make the span the parent of the spans started until it ends
+
+        Returns:
+            the span
+        """
+
+        self.token = current.set(self)
+
+        if self.sampled:
+            self.timestamp = time()
+            self.started = perf_counter()
+
+        return self
+
+    def end(self) -> None:
+        """
+        Stop timing, and record the span if it is sampled
+        """
+
+        if self.token is None:
+            return
+
+        current.reset(self.token)
+        self.token = None
+
+        if self.sampled:
+            self.duration = perf_counter() - self.started
+            self.tracer.spans.append(self)
+
+    def __enter__(self) -> "Span":
+        return self.start()
+
+    def __exit__(self, *exception: object) -> None:
+        self.end()
+
+    def to_dict(self) -> Dict[str,object]:
+        """
+        Get the span as a message
+
+        Returns:
+            a valid JSON representation of the span, with its timestamp and duration in seconds
+        """
+
+        return {
+            "trace": self.trace,
+            "id": self.id,
+            "parent": self.parent,
+            "name": self.name,
+            "timestamp": self.timestamp,
+            "duration": self.duration,
+            "attributes": {key: str(value) for key, value in self.attributes.items()}
+        }
+
+class NoSpan:
+    """
+    Span doing nothing, returned when tracing is off or the span is not sampled
+    """
+
+    __slots__ = ()
+
+    def start(self) -> "NoSpan":
+        return self
+
+    def end(self) -> None:
+        pass
+
+    def __enter__(self) -> "NoSpan":
+        return self
+
+    def __exit__(self, *exception: object) -> None:
+        pass
+
+NO_SPAN = NoSpan()
+
+ids = count(1)
+current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+tracer = Tracer(settings.TRACING, settings.TRACING_SAMPLE_RATE, settings.TRACING_BUFFER)
+
+def span(name: str, **attributes: object) -> Span:
+    """
+    Start a span with the tracer of the server
+
+    Args:
+        name: name of the span
+        attributes: details of the span
+
+    Returns:
+        the span to be ended, or a span doing nothing if it is not recorded
+    """
+
+    return tracer.span(name, **attributes)
+
+def traced(name: str) -> Callable[[Callable],Callable]:
+    """
+    Decorator recording every call of a function, or of a coroutine function, in a span
+
+    Args:
+        name: name of the spans
+
+    Returns:
+        the decorator
+    """
+
+    def decorator(function: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(function):
+            @wraps(function)
+            async def wrapper(*args, **kwargs):
+                if not tracer.enabled:
+                    return await function(*args, **kwargs)
+
+                with tracer.span(name):
+                    return await function(*args, **kwargs)
+
+        else:
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                if not tracer.enabled:
+                    return function(*args, **kwargs)
+
+                with tracer.span(name):
+                    return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
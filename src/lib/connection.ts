@@ -0,0 +1,72 @@
+// URL of the worker the clients connect to first, the others are reached through redirects
+export const SERVER = import.meta.env.VITE_SERVER_URL || "ws://localhost:8000"
+
+// seconds the server keeps the seat of a player whose connection dropped, BOREDGAMES_RECONNECT_GRACE on the server
+export const RECONNECT_GRACE = Number(import.meta.env.VITE_RECONNECT_GRACE || 30)
+
+// seconds between two attempts to reconnect
+const RECONNECT_DELAY = 1
+
+// open a websocket to a game end-point, and follow the redirect to another worker if the room lives there.
+// opened is called with every websocket opened, the last one being the one of the game, and closed once the
+// websocket of the game closes for good. If the connection drops, the seat is reclaimed by reconnecting with the
+// session token of the player, for as long as the server keeps it
+export function connect(url: string, opened: (socket: WebSocket) => void, closed: (event: CloseEvent) => void) {
+    let token = ""
+    let lost = 0 // time the connection of the game dropped, 0 while it is connected
+    let over = false // whether the opponent left or the room expired, there is no seat to reclaim then
+
+    function open(target: string, reconnecting: boolean) {
+        let socket = new WebSocket(target)
+        let redirected = false
+
+        socket.addEventListener("message", (event) => {
+            let received = JSON.parse(event.data)
+            if (received.event == "redirect") {
+                redirected = true
+                open(received.url, reconnecting)
+            }
+            else if (received.event == "connected") {
+                token = received.token
+                lost = 0
+            }
+            else if (received.event == "disconnected") {
+                over = true
+            }
+        })
+        socket.addEventListener("close", (event) => {
+            if (redirected) {
+                return
+            }
+
+            // a normal closure is the player leaving, otherwise the connection dropped and the seat is still kept
+            if (event.code == 1000 || token == "" || over) {
+                closed(event)
+                return
+            }
+
+            if (lost == 0) {
+                lost = Date.now()
+            }
+
+            if (Date.now() - lost > RECONNECT_GRACE*1000) {
+                closed(event)
+                return
+            }
+
+            let reconnect = new URL(url)
+            reconnect.searchParams.set("token", token)
+            setTimeout(() => open(reconnect.toString(), true), RECONNECT_DELAY*1000)
+        })
+
+        // keep the game on screen while reconnecting, until the new websocket is there to catch up with it
+        if (reconnecting) {
+            socket.addEventListener("open", () => opened(socket))
+        }
+        else {
+            opened(socket)
+        }
+    }
+
+    open(url, false)
+}